@@ -0,0 +1,191 @@
+# native packs
+import gc
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import warnings
+import multiprocessing
+from typing import List, Optional
+# installed packs
+import spacy
+from spacy.matcher import PhraseMatcher
+# my packs
+from skillNer_custom.skill_extractor_class import SkillExtractor
+from skillNer_custom.skill_db_view import write_skill_db
+from skillNer_custom.preload import freeze, post_fork, memory_usage
+from benchmarks.run import load_nlp, load_skill_db
+from benchmarks.synthetic import make_corpus
+
+
+# extractor built by the parent in the preload mode
+_PRELOADED = None
+
+
+def _build(args, skills_db_path: Optional[str]) -> SkillExtractor:
+    nlp = load_nlp(args.model)
+    skills_db, _ = load_skill_db(skills_db_path or args.skills_db, args.n_skills, args.seed)
+    return SkillExtractor(nlp, skills_db, PhraseMatcher, fuzzy_func=args.fuzzy)
+
+
+def _worker(args, skills_db_path, results, done):
+    """A worker: builds its extractor (or uses the preloaded one), annotates a corpus
+    and reports its memory once every worker is alive"""
+
+    if _PRELOADED is None:
+        skill_extractor = _build(args, skills_db_path)
+    else:
+        post_fork()
+        skill_extractor = _PRELOADED
+
+    # the objects read while annotating are the ones un-shared by refcount writes
+    corpus = make_corpus(skill_extractor.skills_db, n_docs=args.n_docs, n_words=200, seed=args.seed)
+    list(skill_extractor.annotate_batch(corpus))
+    # a collection, as in a long-running worker
+    gc.collect()
+
+    results.put(memory_usage())
+    # memory shared with the other workers is only divided while they are alive
+    done.wait()
+
+
+def _write_skdb(args, path: str):
+    skills_db, _ = load_skill_db(args.skills_db, args.n_skills, args.seed)
+    write_skill_db(dict(skills_db.items()), path)
+
+
+def _run_in_child(target, *args):
+    # the parent does not hold what the child loads
+    process = multiprocessing.get_context("fork").Process(target=target, args=args)
+    process.start()
+    process.join()
+
+
+def bench_workers(
+    args,
+    preload: bool,
+    skills_db_path: Optional[str] = None
+) -> dict:
+    """Memory of `args.workers` forked workers, each building its extractor
+    or sharing the one preloaded by the parent"""
+
+    global _PRELOADED
+
+    context = multiprocessing.get_context("fork")
+    if preload:
+        gc.disable()
+        _PRELOADED = _build(args, skills_db_path)
+        freeze()
+
+    results = context.Queue()
+    done = context.Event()
+    processes = [
+        context.Process(target=_worker, args=(args, skills_db_path, results, done))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    workers = [results.get() for _ in processes]
+    parent = memory_usage()
+    done.set()
+    for process in processes:
+        process.join()
+
+    if preload:
+        _PRELOADED = None
+        gc.unfreeze()
+        gc.enable()
+        gc.collect()
+
+    return {
+        "worker_rss_mb": sum(worker["rss_mb"] for worker in workers) / len(workers),
+        "worker_pss_mb": sum(worker["pss_mb"] for worker in workers) / len(workers),
+        "worker_private_mb": sum(worker["private_mb"] for worker in workers) / len(workers),
+        # the parent holds the preloaded extractor
+        "total_pss_mb": sum(worker["pss_mb"] for worker in workers) + parent["pss_mb"],
+    }
+
+
+def run(args) -> dict:
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "spacy": spacy.__version__,
+            "model": args.model,
+            "skills_db": args.skills_db or f"synthetic:{args.n_skills}:{args.seed}",
+            "workers": args.workers,
+            "fuzzy": args.fuzzy,
+        },
+    }
+
+    # workers building their own extractor first: the parent holds nothing yet
+    print(f"{args.workers} workers building their own extractor ...")
+    results["per_worker"] = bench_workers(args, preload=False)
+    print(f"{args.workers} workers forked from a preloaded extractor ...")
+    results["preload"] = bench_workers(args, preload=True)
+
+    if args.skdb:
+        with tempfile.TemporaryDirectory() as path:
+            skills_db_path = f"{path}/skills_db.skdb"
+            _run_in_child(_write_skdb, args, skills_db_path)
+            print(f"{args.workers} workers forked from a preloaded extractor, memory-mapped db ...")
+            results["preload_skdb"] = bench_workers(args, preload=True, skills_db_path=skills_db_path)
+
+    return results
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.memory",
+        description="Memory of worker processes building their own SkillExtractor "
+        "against workers sharing a preloaded one (Linux)."
+    )
+    parser.add_argument("-o", "--output", help="where to save the results (json)")
+    parser.add_argument("--model", default="blank:en",
+                        help="spacy model name or path, or blank:<lang>, by default blank:en")
+    parser.add_argument("--skills-db", help="skill db file, by default SKILL_DB if found offline, "
+                        "otherwise a synthetic db generated from TOKEN_DIST")
+    parser.add_argument("--n-skills", type=int, default=5000, help="size of the synthetic skill db")
+    parser.add_argument("--workers", type=int, default=4, help="number of worker processes")
+    parser.add_argument("--n-docs", type=int, default=50, help="documents annotated by each worker")
+    parser.add_argument("--skdb", action="store_true",
+                        help="also preload with the skill db as a memory-mapped SkillDBView")
+    parser.add_argument("--fuzzy", action="store_true", help="enable the fuzzy phrase matcher")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Examples
+    --------
+    $ python -m benchmarks.memory --workers 8 --fuzzy --skdb -o memory.json
+    """
+
+    args = get_parser().parse_args(argv)
+
+    # similarity warnings of pipelines without vectors
+    warnings.filterwarnings("ignore", message=r"\[W00[78]\]")
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=2)
+        print(f"results saved in {args.output}")
+
+    for mode, result in results.items():
+        if mode == "meta":
+            continue
+        print(
+            f"{mode:>12}: worker RSS {result['worker_rss_mb']:.1f} MB, "
+            f"PSS {result['worker_pss_mb']:.1f} MB, private {result['worker_private_mb']:.1f} MB, "
+            f"total PSS {result['total_pss_mb']:.1f} MB"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
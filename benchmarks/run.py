@@ -0,0 +1,470 @@
+# native packs
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import warnings
+import tracemalloc
+from typing import List, Optional
+# installed packs
+import spacy
+from spacy.matcher import PhraseMatcher
+# my packs
+from skillNer_custom.db_registry import DBRegistry
+from skillNer_custom.matcher_class import Matchers
+from skillNer_custom.fuzzy_matcher import FuzzyPhraseMatcher
+from skillNer_custom.skill_extractor_class import SkillExtractor
+from skillNer_custom.profiler import Profiler
+from skillNer_custom.pipe_pruning import pruning_report
+from skillNer_custom.corpus_store import CorpusStore
+from skillNer_custom.chunking import DocumentChunker, MATCH_TYPES
+from benchmarks.synthetic import make_skill_db, make_corpus
+
+
+# metrics where a higher value is better, all other metrics are times
+HIGHER_IS_BETTER = ("docs_per_sec", "speedup")
+# metrics saved but too noisy (or not a performance) to be compared
+NOT_COMPARED = ("p99_ms", "n_docs")
+
+
+def load_nlp(model: str):
+    """To load the nlp: `blank:<lang>` for a blank pipeline (with a lookup lemmatizer
+    when spacy-lookups-data is installed), otherwise a spacy model name or path"""
+
+    if not model.startswith("blank:"):
+        return spacy.load(model)
+
+    nlp = spacy.blank(model.split(":", 1)[1])
+    try:
+        nlp.add_pipe("lemmatizer", config={"mode": "lookup"})
+        nlp.initialize()
+    except Exception:
+        # lookup tables are not installed: tokens are not lemmatized
+        nlp.remove_pipe("lemmatizer")
+    return nlp
+
+
+def load_skill_db(
+    path: Optional[str],
+    n_skills: int,
+    seed: int
+):
+    """To load the skill db without network, or generate a synthetic one from `TOKEN_DIST`"""
+
+    registry = DBRegistry(allow_remote=False)
+    if path:
+        registry.set_path("SKILL_DB", path)
+    try:
+        return registry.get("SKILL_DB"), str(registry.find("SKILL_DB"))
+    except FileNotFoundError:
+        if path:
+            raise
+    return make_skill_db(registry.get("TOKEN_DIST"), n_skills, seed), f"synthetic:{n_skills}:{seed}"
+
+
+def _timed(func, repeat: int = 1):
+    """best wall time of `repeat` calls, and the result of the last call"""
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_build(
+    nlp,
+    skills_db: dict,
+    repeat: int = 1
+) -> dict:
+    """Build time of each matcher of `Matchers.load_matchers` and of the fuzzy index"""
+
+    matchers = Matchers(nlp, skills_db, PhraseMatcher)
+    results = {}
+    for matcher_name, get_matcher in matchers.dict_matcher.items():
+        results[matcher_name] = {"seconds": _timed(get_matcher, repeat)[0]}
+    results["fuzzy_matcher"] = {
+        "seconds": _timed(lambda: FuzzyPhraseMatcher(skills_db), repeat)[0]
+    }
+    results["total"] = {"seconds": sum(result["seconds"] for result in results.values())}
+    return results
+
+
+def bench_corpus(
+    skill_extractor: SkillExtractor,
+    profiler: Profiler,
+    corpus: List[str],
+    batch_size: int,
+    repeat: int = 1
+) -> dict:
+    """Per-stage times and end-to-end throughput of `annotate` and `annotate_batch` on a corpus"""
+
+    # per-stage times, measured by the profiler
+    profiler.reset()
+    elapsed, _ = _timed(lambda: [skill_extractor.annotate(text) for text in corpus])
+    report = profiler.report()
+
+    stages = {
+        stage: {
+            "mean_ms": summary["mean"] * 1000,
+            "p50_ms": summary["p50"] * 1000,
+            "p99_ms": summary["p99"] * 1000,
+        }
+        for stage, summary in report["stages"].items()
+    }
+    candidates = {name: summary["mean"] for name, summary in report["counts"].items()}
+
+    # end-to-end throughput, without profiling
+    skill_extractor.profiler = None
+    annotate_elapsed, _ = _timed(
+        lambda: [skill_extractor.annotate(text) for text in corpus], repeat)
+    batch_elapsed, _ = _timed(
+        lambda: list(skill_extractor.annotate_batch(corpus, batch_size=batch_size)), repeat)
+    skill_extractor.profiler = profiler
+
+    return {
+        "n_docs": len(corpus),
+        "stages": stages,
+        "candidates_per_doc": candidates,
+        "annotate": {"docs_per_sec": len(corpus) / annotate_elapsed},
+        "annotate_batch": {"docs_per_sec": len(corpus) / batch_elapsed},
+    }
+
+
+def bench_pruning(
+    nlp,
+    skills_db: dict,
+    corpus: List[str],
+    fuzzy: bool,
+    repeat: int = 1
+) -> dict:
+    """Parse time and `annotate` throughput with all the components of nlp and with the
+    components the annotations depend on only (see `prune_pipeline`), and whether the
+    annotations are identical"""
+
+    report = pruning_report(nlp, texts=corpus, repeat=repeat)
+    print(f"pruning: kept {report['kept']}, disabled {report['disabled']}")
+
+    results = {
+        "kept": report["kept"],
+        "disabled": report["disabled"],
+        "parse": {
+            "full_seconds": report["full_seconds"],
+            "pruned_seconds": report["pruned_seconds"],
+            "speedup": report["speedup"],
+        },
+    }
+    annotations = {}
+    for name, prune_pipes in (("full", False), ("pruned", True)):
+        skill_extractor = SkillExtractor(
+            nlp, skills_db, PhraseMatcher, fuzzy_func=fuzzy, prune_pipes=prune_pipes)
+        elapsed, annotations[name] = _timed(
+            lambda: [skill_extractor.annotate(text) for text in corpus], repeat)
+        results[f"annotate_{name}"] = {"docs_per_sec": len(corpus) / elapsed}
+    results["annotate_speedup"] = (
+        results["annotate_pruned"]["docs_per_sec"] / results["annotate_full"]["docs_per_sec"])
+    results["identical"] = annotations["full"] == annotations["pruned"]
+    return results
+
+
+def bench_reannotate(
+    skill_extractor: SkillExtractor,
+    corpus: List[str],
+    batch_size: int,
+    repeat: int = 1
+) -> dict:
+    """Throughput of `annotate_batch` writing a corpus store and of `reannotate` reading it,
+    against `annotate_batch` alone, and whether the annotations are identical"""
+
+    nlp = skill_extractor.nlp
+    with tempfile.TemporaryDirectory() as path:
+        # documents are appended to a store: a new store for each repeat
+        stores = iter(CorpusStore(f"{path}/{i}", nlp) for i in range(repeat))
+        store_elapsed, annotations = _timed(
+            lambda: list(skill_extractor.annotate_batch(
+                corpus, batch_size=batch_size, corpus_store=next(stores))), repeat)
+        reannotate_elapsed, reannotations = _timed(
+            lambda: list(skill_extractor.reannotate(CorpusStore(f"{path}/0", nlp))), repeat)
+    batch_elapsed, _ = _timed(
+        lambda: list(skill_extractor.annotate_batch(corpus, batch_size=batch_size)), repeat)
+
+    return {
+        "annotate_batch": {"docs_per_sec": len(corpus) / batch_elapsed},
+        "annotate_batch_store": {"docs_per_sec": len(corpus) / store_elapsed},
+        "reannotate": {"docs_per_sec": len(corpus) / reannotate_elapsed},
+        "reannotate_speedup": batch_elapsed / reannotate_elapsed,
+        "identical": annotations == reannotations,
+    }
+
+
+def bench_db_delta(
+    nlp,
+    skills_db: dict,
+    fuzzy: bool,
+    repeat: int = 1,
+    n_skills: int = 10
+) -> dict:
+    """Time of `apply_db_delta` removing and adding back `n_skills` skills,
+    against building the extractor on the skill db"""
+
+    build_elapsed, skill_extractor = _timed(
+        lambda: SkillExtractor(nlp, skills_db, PhraseMatcher, fuzzy_func=fuzzy), repeat)
+    delta = {skill_id: skills_db[skill_id] for skill_id in list(skills_db)[:n_skills]}
+
+    def remove_and_add():
+        skill_extractor.apply_db_delta(removed=list(delta))
+        skill_extractor.apply_db_delta(added=delta)
+
+    delta_elapsed, _ = _timed(remove_and_add, repeat)
+    return {
+        "build": {"seconds": build_elapsed},
+        "delta": {"seconds": delta_elapsed},
+        "delta_speedup": build_elapsed / delta_elapsed,
+    }
+
+
+def _peak_mb(func) -> float:
+    """peak memory allocated by a call, traced by tracemalloc (slow: not timed)"""
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_chunking(
+    skill_extractor: SkillExtractor,
+    skills_db: dict,
+    n_words: int,
+    seed: int = 0,
+    repeat: int = 1
+) -> dict:
+    """Time and peak memory of `annotate` on a long document, whole and window by window
+    (see `DocumentChunker`), and whether the matches are the same"""
+
+    def annotates(section):
+        # lemmas split by the tokenizer (e.g. "id") shift the lemmed view and can make
+        # `Utils.compute_w_ratio` fail: such postings are left out of the document
+        try:
+            skill_extractor.annotate(section)
+        except ValueError:
+            return False
+        return True
+
+    # postings of 500 words as the sections of a long document
+    sections = make_corpus(skills_db, n_docs=max(n_words // 500, 1), n_words=500, seed=seed)
+    text = "\n\n".join(section for section in sections if annotates(section))
+    chunker = DocumentChunker(max_tokens=1000, overlap=32)
+
+    whole_elapsed, whole = _timed(lambda: skill_extractor.annotate(text), repeat)
+    chunked_elapsed, chunked = _timed(lambda: skill_extractor.annotate(text, chunker=chunker), repeat)
+
+    def matches(annotations):
+        return {
+            (match_type, match["skill_id"], tuple(match["doc_node_id"]))
+            for match_type in MATCH_TYPES
+            for match in annotations["results"][match_type]
+        }
+
+    return {
+        "whole": {
+            "seconds": whole_elapsed,
+            "peak_mb": _peak_mb(lambda: skill_extractor.annotate(text)),
+        },
+        "chunked": {
+            "seconds": chunked_elapsed,
+            "peak_mb": _peak_mb(lambda: skill_extractor.annotate(text, chunker=chunker)),
+        },
+        "identical": matches(whole) == matches(chunked),
+    }
+
+
+def run(args) -> dict:
+
+    nlp = load_nlp(args.model)
+    skills_db, skills_db_name = load_skill_db(args.skills_db, args.n_skills, args.seed)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "spacy": spacy.__version__,
+            "model": args.model,
+            "pipeline": nlp.pipe_names,
+            "skills_db": skills_db_name,
+            "n_skills": len(skills_db),
+            "seed": args.seed,
+            "fuzzy": args.fuzzy,
+        },
+    }
+
+    print(f"skill db {skills_db_name} ({len(skills_db)} skills), model {args.model}")
+    results["build"] = bench_build(nlp, skills_db, args.repeat)
+
+    profiler = Profiler()
+    skill_extractor = SkillExtractor(
+        nlp, skills_db, PhraseMatcher, fuzzy_func=args.fuzzy, profiler=profiler)
+
+    results["lengths"] = {}
+    for n_words in args.lengths:
+        print(f"benchmarking documents of {n_words} words ...")
+        corpus = make_corpus(skills_db, n_docs=args.n_docs, n_words=n_words, seed=args.seed)
+        results["lengths"][str(n_words)] = bench_corpus(
+            skill_extractor, profiler, corpus, args.batch_size, args.repeat)
+
+    print("benchmarking the pruned pipeline ...")
+    corpus = make_corpus(skills_db, n_docs=args.n_docs, n_words=args.lengths[0], seed=args.seed)
+    results["pruning"] = bench_pruning(nlp, skills_db, corpus, args.fuzzy, args.repeat)
+
+    skill_extractor.profiler = None
+    print(f"benchmarking a document of {args.long_words} words ...")
+    results["chunking"] = bench_chunking(
+        skill_extractor, skills_db, args.long_words, args.seed, args.repeat)
+
+    print("benchmarking the corpus store ...")
+    results["reannotate"] = bench_reannotate(skill_extractor, corpus, args.batch_size, args.repeat)
+
+    print("benchmarking skill db deltas ...")
+    results["db_delta"] = bench_db_delta(nlp, skills_db, args.fuzzy, args.repeat)
+
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """To flatten nested results into {"lengths.200.annotate.docs_per_sec": value}"""
+
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    tolerance: float
+) -> List[str]:
+    """To compare results with a baseline
+
+    Returns
+    -------
+    List[str]
+        returns the metrics that regressed by more than `tolerance` (relative)
+    """
+
+    current = flatten({k: v for k, v in results.items() if k != "meta"})
+    previous = flatten({k: v for k, v in baseline.items() if k != "meta"})
+
+    regressions = []
+    print(f"{'metric':<60}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name in sorted(current.keys() & previous.keys()):
+        old, new = previous[name], current[name]
+        if old == 0 or name.endswith(NOT_COMPARED) or ".candidates_per_doc." in name:
+            continue
+        change = new / old - 1
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = " !" if worse > tolerance else ""
+        print(f"{name:<60}{old:>12.4g}{new:>12.4g}{change:>+8.0%}{flag}")
+        if flag:
+            regressions.append(name)
+
+    if baseline.get("meta") != results.get("meta"):
+        print("warning: the baseline was run with another setup "
+              f"({baseline.get('meta')})", file=sys.stderr)
+    return regressions
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark the SkillNer matching pipeline on a synthetic job-posting corpus."
+    )
+    parser.add_argument("-o", "--output", help="where to save the results (json)")
+    parser.add_argument("--baseline", help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative change reported as a regression, by default 0.2")
+    parser.add_argument("--model", default="blank:en",
+                        help="spacy model name or path, or blank:<lang>, by default blank:en")
+    parser.add_argument("--skills-db", help="skill db file, by default SKILL_DB if found offline, "
+                        "otherwise a synthetic db generated from TOKEN_DIST")
+    parser.add_argument("--n-skills", type=int, default=5000, help="size of the synthetic skill db")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[50, 200, 1000],
+                        help="document lengths in words")
+    parser.add_argument("--n-docs", type=int, default=100, help="documents per length")
+    parser.add_argument("--long-words", type=int, default=20000,
+                        help="length in words of the long document annotated window by window")
+    parser.add_argument("--batch-size", type=int, default=64, help="batch size of annotate_batch")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="repeats of the build and throughput benchmarks, the best time is kept")
+    parser.add_argument("--fuzzy", action="store_true", help="enable the fuzzy phrase matcher")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Examples
+    --------
+    $ python -m benchmarks.run --fuzzy -o before.json
+    $ python -m benchmarks.run --fuzzy -o after.json --baseline before.json
+    """
+
+    args = get_parser().parse_args(argv)
+
+    # similarity warnings of pipelines without vectors
+    warnings.filterwarnings("ignore", message=r"\[W00[78]\]")
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=2)
+        print(f"results saved in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.tolerance:.0%}")
+            return 1
+    else:
+        for n_words, result in results["lengths"].items():
+            print(
+                f"{n_words:>6} words: annotate {result['annotate']['docs_per_sec']:.1f} docs/sec, "
+                f"annotate_batch {result['annotate_batch']['docs_per_sec']:.1f} docs/sec"
+            )
+        pruning = results["pruning"]
+        print(
+            f"pruned pipeline: parse x{pruning['parse']['speedup']:.2f}, "
+            f"annotate x{pruning['annotate_speedup']:.2f}, identical annotations: {pruning['identical']}"
+        )
+        reannotate = results["reannotate"]
+        print(
+            f"reannotate from the corpus store: x{reannotate['reannotate_speedup']:.2f} "
+            f"over annotate_batch, identical annotations: {reannotate['identical']}"
+        )
+        chunking = results["chunking"]
+        print(
+            f"long document: whole {chunking['whole']['seconds']:.2f}s "
+            f"{chunking['whole']['peak_mb']:.0f} MB, chunked {chunking['chunked']['seconds']:.2f}s "
+            f"{chunking['chunked']['peak_mb']:.0f} MB, same matches: {chunking['identical']}"
+        )
+        db_delta = results["db_delta"]
+        print(
+            f"skill db delta: {db_delta['delta']['seconds'] * 1000:.1f} ms, "
+            f"x{db_delta['delta_speedup']:.0f} over building the extractor"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
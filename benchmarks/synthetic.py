@@ -0,0 +1,187 @@
+# native packs
+import random
+import string
+from typing import Dict, List
+# installed packs
+#
+# my packs
+from skillNer_custom.cleaner import stem_text
+
+
+SKILL_TYPES = ["Hard Skill", "Soft Skill", "Certification"]
+
+# words of job postings that are not skills
+FILLER = (
+    "we are looking for a motivated candidate with solid experience in and the ability "
+    "to work with our team you will be responsible for our clients strong knowledge of "
+    "years of experience is a plus must have good understanding of will join nice to have"
+).split()
+
+# noise found in real postings: punctuation, numbers, urls, symbols
+NOISE = ["!", "-", "/", "(", ")", "...", "3+", "$100k", "e-mail", "U.S.", "www.example.com", "&", ":"]
+
+
+def make_skill_db(
+    token_dist: Dict[str, int],
+    n_skills: int = 5000,
+    seed: int = 0
+) -> dict:
+    """To generate a synthetic skill db, in the format of `skill_db_relax_20.json`,
+    from the words of a token distribution. Used when no skill db is available offline.
+
+    Parameters
+    ----------
+    token_dist : Dict[str, int]
+        token distribution, e.g. `TOKEN_DIST`
+    n_skills : int, optional
+        number of skills, by default 5000
+    seed : int, optional
+        seed of the random generator, by default 0
+
+    Returns
+    -------
+    dict
+        returns the skill db
+    """
+
+    rnd = random.Random(seed)
+    words = sorted(
+        token for token in token_dist
+        if token.isalpha() and token.isascii() and len(token) > 2
+    )
+
+    skills_db = {}
+    seen = set()
+    while len(skills_db) < n_skills:
+        skill_len = rnd.choice([1, 1, 2, 2, 2, 3, 3, 4])
+        tokens = rnd.sample(words, skill_len)
+        full = " ".join(tokens)
+        if full in seen:
+            continue
+        seen.add(full)
+
+        skill_name = " ".join(token.capitalize() for token in tokens)
+        high_forms = {"full": full}
+        low_forms = []
+
+        # same surface forms as `SkillRelaxDBGenerator`
+        stemmed_tokens = [stem_text(token) for token in tokens]
+        if skill_len == 1:
+            low_forms.append(stemmed_tokens[0])
+        elif skill_len == 2:
+            low_forms.append(" ".join(stemmed_tokens))
+            low_forms.append(" ".join(stemmed_tokens[::-1]))
+        if skill_len > 1 and rnd.random() < 0.1:
+            abv = "".join(token[0] for token in tokens).upper()
+            high_forms["abv"] = abv
+            skill_name = f"{skill_name} ({abv})"
+
+        skill_id = f"KS{len(skills_db):06d}"
+        skills_db[skill_id] = {
+            "skill_name": skill_name,
+            "skill_type": rnd.choice(SKILL_TYPES),
+            "skill_len": skill_len,
+            "high_surfce_forms": high_forms,
+            "low_surface_forms": low_forms,
+            "match_on_tokens": skill_len > 2,
+        }
+
+    return skills_db
+
+
+def add_typo(
+    word: str,
+    rnd: random.Random
+) -> str:
+    """To add a typo to a word: deletion, substitution, transposition or insertion"""
+
+    if len(word) < 4:
+        return word
+
+    i = rnd.randrange(1, len(word) - 1)
+    kind = rnd.randrange(4)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rnd.choice(string.ascii_lowercase) + word[i + 1:]
+    if kind == 2:
+        return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+    return word[:i] + rnd.choice(string.ascii_lowercase) + word[i:]
+
+
+def make_posting(
+    skills: List[dict],
+    n_words: int,
+    rnd: random.Random,
+    skill_rate: float = 0.3,
+    typo_rate: float = 0.1,
+    abv_rate: float = 0.3,
+    noise_rate: float = 0.05
+) -> str:
+    """To generate one synthetic job posting of about `n_words` words"""
+
+    words = []
+    while len(words) < n_words:
+        draw = rnd.random()
+        if draw < skill_rate:
+            skill = rnd.choice(skills)
+            forms = skill["high_surfce_forms"]
+            if "abv" in forms and rnd.random() < abv_rate:
+                mention = [forms["abv"]]
+            else:
+                mention = skill["skill_name"].split(" (")[0].split()
+                if rnd.random() < typo_rate:
+                    i = rnd.randrange(len(mention))
+                    mention[i] = add_typo(mention[i], rnd)
+                if rnd.random() < 0.5:
+                    mention = [token.lower() for token in mention]
+            words.extend(mention)
+        elif draw < skill_rate + noise_rate:
+            words.append(rnd.choice(NOISE))
+        else:
+            words.append(rnd.choice(FILLER))
+
+        # sentence boundaries
+        if rnd.random() < 0.08:
+            words[-1] += rnd.choice([".", ",", ";"])
+
+    return " ".join(words)
+
+
+def make_corpus(
+    skills_db: dict,
+    n_docs: int = 100,
+    n_words: int = 200,
+    seed: int = 0,
+    **posting_params
+) -> List[str]:
+    """To generate a deterministic corpus of synthetic job postings mentioning skills of the db,
+    with injected typos, abbreviations and noise.
+
+    Parameters
+    ----------
+    skills_db : dict
+        the skill db
+    n_docs : int, optional
+        number of postings, by default 100
+    n_words : int, optional
+        length of a posting in words, by default 200
+    seed : int, optional
+        seed of the random generator, by default 0
+    **posting_params
+        rates passed to `make_posting` (skill_rate, typo_rate, abv_rate, noise_rate)
+
+    Returns
+    -------
+    List[str]
+        returns the postings
+
+    Examples
+    --------
+    >>> from benchmarks.synthetic import make_corpus
+    >>> corpus = make_corpus(SKILL_DB, n_docs=2, n_words=20, seed=1)
+    """
+
+    rnd = random.Random(seed)
+    skills = [skills_db[skill_id] for skill_id in sorted(skills_db)]
+    return [make_posting(skills, n_words, rnd, **posting_params) for _ in range(n_docs)]
@@ -38,7 +38,7 @@ setup(
         "Topic :: Text Processing :: Linguistic",
     ],
     python_requires=">=3.8",
-    packages=find_packages(exclude=["tests*", "examples*"]),
+    packages=find_packages(exclude=["tests*", "examples*", "benchmarks*"]),
     include_package_data=True,
     # Nếu bạn muốn các file JSON trong SkillNER/data được cài đặt cùng package,
     # chúng ta liệt kê chúng trong `data_files`. Lưu ý: `data_files` sẽ cài
@@ -60,12 +60,20 @@ setup(
             "flake8",
             "pytest",
         ],
+        # đọc / ghi Parquet với skillner-extract
+        "parquet": [
+            "pyarrow",
+        ],
     },
     entry_points={
-        # Nếu muốn CLI, bật phần bên dưới và tạo module skillNer.cli:main
-        # "console_scripts": [
-        #     "skillner-extract = skillNer.cli:main",
-        # ],
+        "console_scripts": [
+            "skillner-extract = skillNer_custom.cli:main",
+            "skillner-serve = skillNer_custom.server:main",
+        ],
+        # `nlp.add_pipe("skillner")` and `spacy.load` without importing the package
+        "spacy_factories": [
+            "skillner = skillNer_custom.component:make_skillner",
+        ],
     },
     keywords="skill extraction, ner, spacy, job title extraction",
     license="MIT",
@@ -0,0 +1,218 @@
+# native packs
+import os
+import io
+import json
+import pickle
+import hashlib
+from typing import Optional
+# installed packs
+import spacy
+from spacy.vocab import Vocab
+# my packs
+from skillNer_custom.matcher_class import Matchers
+from skillNer_custom.fuzzy_matcher import FuzzyPhraseMatcher
+
+
+# bump when the content of the bundle changes
+BUNDLE_FORMAT_VERSION = 2
+
+
+def skills_db_fingerprint(skills_db) -> str:
+    """To get a hash that changes whenever the content of a skill db changes.
+
+    Parameters
+    ----------
+    skills_db : dict
+        the skill db
+
+    Returns
+    -------
+    str
+        returns the sha256 of the db content
+    """
+
+    # db views know how to hash themselves without materializing the db
+    if hasattr(skills_db, "fingerprint"):
+        return skills_db.fingerprint()
+
+    content = json.dumps(skills_db, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# pickle the nlp vocab by reference: it is shared with the running nlp
+class _BundlePickler(pickle.Pickler):
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Vocab):
+            return "vocab"
+        return None
+
+
+class _BundleUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, vocab):
+        super().__init__(file)
+        self.vocab = vocab
+
+    def persistent_load(self, pid):
+        if pid == "vocab":
+            return self.vocab
+        raise pickle.UnpicklingError(f"unknown persistent id {pid}")
+
+
+class MatcherBundle:
+    """Build-once artifact holding the loaded matchers and the fuzzy index.
+
+    The bundle is stored on disk together with a key made of the skill db hash,
+    the spacy version and the nlp model. It is rebuilt automatically when the key
+    does not match anymore, for instance after updating the skill db.
+    """
+
+    def __init__(
+        self,
+        nlp,
+        skills_db: dict,
+        phraseMatcher,
+        path: str = None
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        nlp : [type]
+            NLP object loaded from spacy
+        skills_db : dict
+            A skill database that serves as a lookup table to annotate text
+        phraseMatcher : [type]
+            a phraseMatcher loaded using spacy
+        path : str | None
+            where to store the bundle on disk, None when the bundle is only built in memory
+
+        Examples
+        --------
+        >>> from skillNer_custom.bundle_class import MatcherBundle
+        >>> bundle = MatcherBundle(nlp, SKILL_DB, PhraseMatcher, "skill_db_relax_20.bundle")
+        >>> loaded = bundle.load_or_build()
+        loading matchers bundle skill_db_relax_20.bundle ...
+        >>> loaded.keys()
+        dict_keys(['matchers', 'fuzzy_matcher'])
+        """
+
+        # params
+        self.nlp = nlp
+        self.skills_db = skills_db
+        self.phraseMatcher = phraseMatcher
+        self.path = path
+
+        # key of the bundle, computed once
+        self._key = None
+        return
+
+    def key(self) -> str:
+        """To get the key identifying the content of the bundle
+
+        Returns
+        -------
+        str
+            returns a hash of the skill db, the spacy version and the nlp model
+        """
+
+        if self._key is None:
+            meta = self.nlp.meta
+            parts = [
+                str(BUNDLE_FORMAT_VERSION),
+                spacy.__version__,
+                f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}",
+                skills_db_fingerprint(self.skills_db),
+            ]
+            self._key = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+        return self._key
+
+    def build(self) -> dict:
+        """To build the matchers and the fuzzy index from the skill db
+
+        Returns
+        -------
+        dict
+            returns a dict with the loaded `matchers` and the `fuzzy_matcher`
+        """
+
+        return {
+            "matchers": Matchers(
+                self.nlp,
+                self.skills_db,
+                self.phraseMatcher,
+            ).load_matchers(),
+            "fuzzy_matcher": FuzzyPhraseMatcher(self.skills_db),
+        }
+
+    def save(
+        self,
+        bundle: dict
+    ):
+        """To save a bundle on disk. The file is replaced atomically
+        so that concurrent workers never read a partial bundle.
+
+        Parameters
+        ----------
+        bundle : dict
+            a bundle as returned by `.build()`
+        """
+
+        # the key is written first so that a stale bundle is detected
+        # without unpickling the matchers
+        buffer = io.BytesIO()
+        pickler = _BundlePickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.dump(self.key())
+        pickler.dump(bundle)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(buffer.getvalue())
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Optional[dict]:
+        """To load the bundle from disk
+
+        Returns
+        -------
+        dict | None
+            returns the bundle, or None if it is missing or out of date
+        """
+
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, "rb") as fp:
+                unpickler = _BundleUnpickler(fp, self.nlp.vocab)
+                if unpickler.load() != self.key():
+                    return None
+                bundle = unpickler.load()
+        except Exception:
+            # unreadable bundle (e.g. pickled by another spacy version)
+            return None
+
+        # the db is not stored in the bundle
+        bundle["fuzzy_matcher"].skills_db = self.skills_db
+        return bundle
+
+    def load_or_build(self) -> dict:
+        """To load the bundle from disk, or build and save it if it is missing or out of date
+
+        Returns
+        -------
+        dict
+            returns a dict with the loaded `matchers` and the `fuzzy_matcher`
+        """
+
+        bundle = self.load()
+        if bundle is not None:
+            print(f"loading matchers bundle {self.path} ...")
+            return bundle
+
+        print(f"building matchers bundle {self.path} ...")
+        bundle = self.build()
+        self.save(bundle)
+        return bundle
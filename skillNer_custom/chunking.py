@@ -0,0 +1,297 @@
+# native packs
+import re
+import multiprocessing
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Tuple
+# installed packs
+#
+# my packs
+from skillNer_custom.text_class import Text
+from skillNer_custom.profiler import NULL_RECORD
+
+
+# fields of the annotations holding matches
+MATCH_TYPES = ("full_matches", "ngram_scored", "fuzzy_matches")
+
+# strength of a cut between two tokens, from what separates them in the raw text
+NO_CUT = -1
+WORD = 0
+SENTENCE = 1
+SECTION = 2
+
+SENTENCE_END = re.compile(r"[.!?;:]\s|\n")
+SECTION_END = re.compile(r"\n[^\S\n]*\n")
+
+# extractor of the processes annotating windows, forked by `DocumentChunker.annotate_windows`
+_EXTRACTOR = None
+
+
+def _annotate_window(
+    window_text: str,
+    tresh: float
+) -> dict:
+    nlp = _EXTRACTOR.nlp
+    doc = nlp(window_text)
+    return _EXTRACTOR._annotate_text_obj(Text(doc.text, nlp, doc=doc), tresh)["results"]
+
+
+class DocumentChunker:
+    """Splits long documents in overlapping windows, see `SkillExtractor.annotate(chunker=...)`.
+
+    Annotating a document builds matrices and loops over all its tokens at once: long
+    documents (scraped pages, CVs) are annotated window by window instead, so memory only
+    depends on the size of a window. The transformed text is cut between sections (blank
+    lines) first, then between sentences, then between words, into cores of at most
+    `max_tokens - 2 * overlap` tokens. The window of a core has `overlap` more tokens on
+    each side: matches near the edges of a core see the same context as in the whole text.
+
+    A match is kept by the window whose core holds its first token. Cores follow each other,
+    so the owner of a match of the overlap between two windows is the window the match is
+    the furthest from the edge of (the core boundary is the middle of the overlap).
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        overlap: int = 50,
+        n_process: int = 1,
+        batch_size: int = 8
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        max_tokens : int, optional
+            max number of tokens of a window, longer documents are chunked, by default 2000
+        overlap : int, optional
+            tokens of context added on each side of a core, it must be longer than the
+            longest skill and at most a quarter of `max_tokens`, by default 50
+        n_process : int, optional
+            number of processes annotating the windows, forked from the current process
+            (they share the extractor), by default 1: windows are annotated in this process
+        batch_size : int, optional
+            number of windows parsed together by `nlp.pipe` with one process, by default 8
+
+        Examples
+        --------
+        >>> from skillNer_custom.chunking import DocumentChunker
+        >>> chunker = DocumentChunker(max_tokens=1000, overlap=32, n_process=4)
+        >>> annotations = skill_extractor.annotate(cv_text, chunker=chunker)
+        """
+
+        if overlap < 0 or 4 * overlap > max_tokens:
+            raise ValueError(
+                f"overlap ({overlap}) must be between 0 and a quarter of max_tokens ({max_tokens})")
+
+        # params
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.n_process = n_process
+        self.batch_size = batch_size
+        return
+
+    @staticmethod
+    def cut_strengths(
+        text: str,
+        doc
+    ) -> List[int]:
+        """To get how well the transformed text can be cut before each token
+
+        Parameters
+        ----------
+        text : str
+            the raw text
+        doc : spacy.tokens.Doc
+            the tokens of the transformed text, `nlp.make_doc(Text.transform(text))`
+
+        Returns
+        -------
+        List[int]
+            returns SECTION, SENTENCE or WORD for each token, from the raw text between its
+            word and the previous one, NO_CUT within a word: a window cut there would not be
+            tokenized the same
+        """
+
+        _, word_spans = Text.cleaner.clean_with_offsets(text)
+        word_starts = []
+        pointer = 0
+        for word in doc.text.split(" "):
+            word_starts.append(pointer)
+            pointer += len(word) + 1
+
+        strengths = []
+        previous_word = None
+        for token in doc:
+            word_index = bisect_right(word_starts, token.idx) - 1
+            if previous_word is None:
+                strength = SECTION
+            elif word_index == previous_word or token.idx != word_starts[word_index]:
+                strength = NO_CUT
+            else:
+                gap = text[word_spans[previous_word][1]:word_spans[word_index][0]]
+                if SECTION_END.search(gap):
+                    strength = SECTION
+                elif SENTENCE_END.search(gap):
+                    strength = SENTENCE
+                else:
+                    strength = WORD
+            strengths.append(strength)
+            previous_word = word_index
+        return strengths
+
+    def split(
+        self,
+        strengths: List[int]
+    ) -> List[Tuple[int, int, int, int]]:
+        """To split a document in windows
+
+        Parameters
+        ----------
+        strengths : List[int]
+            the cut strength before each token, see `.cut_strengths()`
+
+        Returns
+        -------
+        List[Tuple[int, int, int, int]]
+            returns the (window start, core start, core end, window end) token positions,
+            cores follow each other and cover the document
+        """
+
+        n_tokens = len(strengths)
+        max_core = self.max_tokens - 2 * self.overlap
+
+        def can_cut(position):
+            return position >= n_tokens or strengths[position] != NO_CUT
+
+        windows = []
+        core_start = 0
+        while core_start < n_tokens:
+            if n_tokens - core_start <= max_core:
+                core_end = n_tokens
+            else:
+                # strongest cut of the second half of the core, the latest one on ties
+                core_end = max(
+                    range(core_start + max_core // 2, core_start + max_core + 1),
+                    key=lambda position: (strengths[position], position)
+                )
+                if strengths[core_end] == NO_CUT:
+                    # a single word longer than half a core: cut after it
+                    core_end = next(
+                        (position for position in range(core_start + max_core, n_tokens)
+                         if can_cut(position)),
+                        n_tokens
+                    )
+
+            window_start = max(core_start - self.overlap, 0)
+            while not can_cut(window_start):
+                window_start -= 1
+            window_end = min(core_end + self.overlap, n_tokens)
+            while not can_cut(window_end):
+                window_end += 1
+
+            windows.append((window_start, core_start, core_end, window_end))
+            core_start = core_end
+        return windows
+
+    def annotate_windows(
+        self,
+        skill_extractor,
+        window_texts: Iterable[str],
+        tresh: float,
+        record=NULL_RECORD
+    ) -> Iterator[dict]:
+        """To annotate the windows of a document, with `n_process` processes
+
+        Parameters
+        ----------
+        skill_extractor : SkillExtractor
+            the extractor
+        window_texts : Iterable[str]
+            the transformed text of each window
+        tresh : float
+            score treshold of ngram_scored and fuzzy matches
+        record : DocRecord, optional
+            where the stages are measured (see `Profiler`), with one process
+
+        Yields
+        ------
+        dict
+            the `results` of the annotations of each window, in order
+        """
+
+        nlp = skill_extractor.nlp
+        if self.n_process <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for doc in nlp.pipe(window_texts, batch_size=self.batch_size):
+                record.lap("parse")
+                window_obj = Text(doc.text, nlp, doc=doc)
+                record.lap("text")
+                yield skill_extractor._annotate_text_obj(window_obj, tresh, record)["results"]
+            return
+
+        global _EXTRACTOR
+        # forked under the lock of the matchers: workers do not inherit it locked
+        # by another thread, and the db does not change meanwhile
+        with skill_extractor._lock:
+            _EXTRACTOR = skill_extractor
+            try:
+                pool = ProcessPoolExecutor(
+                    self.n_process, mp_context=multiprocessing.get_context("fork"))
+                with pool:
+                    # two windows per process in flight: memory does not depend on the document
+                    pending = deque()
+                    for window_text in window_texts:
+                        if len(pending) >= 2 * self.n_process:
+                            yield pending.popleft().result()
+                        pending.append(pool.submit(_annotate_window, window_text, tresh))
+                    while pending:
+                        yield pending.popleft().result()
+            finally:
+                _EXTRACTOR = None
+        record.lap("windows")
+
+
+def stitch_matches(
+    window_results: Iterable[Tuple[dict, int, int, int]]
+) -> dict:
+    """To merge the matches of the windows of a document
+
+    Parameters
+    ----------
+    window_results : Iterable[Tuple[dict, int, int, int]]
+        the `results` of the annotations of each window, with its window start and its core,
+        in the order of the document. It can be a generator: windows are not kept
+
+    Returns
+    -------
+    dict
+        returns the `results` of the document: matches of each window moved to their
+        position in the document, kept by the window whose core holds their first token.
+        A match of a skill overlapping a match of the same skill and type kept by the
+        previous window is dropped (both windows saw it, with a different extent).
+    """
+
+    results = {match_type: [] for match_type in MATCH_TYPES}
+    # (match type, skill id) -> last token of its last match, and the window of that match
+    last_matches = {}
+
+    for window, (window_matches, window_start, core_start, core_end) in enumerate(window_results):
+        for match_type in MATCH_TYPES:
+            for match in window_matches[match_type]:
+                ids = [window_start + i for i in match["doc_node_id"]]
+                if not core_start <= ids[0] < core_end:
+                    continue
+
+                key = (match_type, match["skill_id"])
+                last = last_matches.get(key)
+                if last is not None and last[1] != window and ids[0] <= last[0]:
+                    continue
+                last_matches[key] = (max(ids), window)
+
+                match = dict(match)
+                match["doc_node_id"] = ids
+                results[match_type].append(match)
+
+    # windows are in the order of the document: matches keep the order of the matchers
+    return results
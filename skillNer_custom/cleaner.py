@@ -1,10 +1,11 @@
 # installed packs
-from nltk.stem import PorterStemmer
 # import en_core_web_lg
 # native packs
-from typing import List
+import re
+from typing import Dict, List, Set, Tuple
 # my pack
 from skillNer_custom.general_params import S_GRAM_REDUNDANT, LIST_PUNCTUATIONS
+from skillNer_custom.lexical_cache import LEXICAL_CACHE
 
 
 # load nlp
@@ -87,10 +88,14 @@ def remove_redundant(
     return text.strip()
 
 
+# default stemmer, its stems are memoized in LEXICAL_CACHE
+DEFAULT_STEMMER = LEXICAL_CACHE.stemmer
+
+
 # stem using a predefined stemer
 def stem_text(
     text: str,
-    stemmer=PorterStemmer(),
+    stemmer=DEFAULT_STEMMER,
 ) -> str:
     """To stem a text 
 
@@ -114,6 +119,9 @@ def stem_text(
     you have profession experi build react apps, you are familiar with version control use git and github
     """
 
+    if stemmer is DEFAULT_STEMMER:
+        return LEXICAL_CACHE.stem_text(text)
+
     return " ".join([stemmer.stem(word) for word in text.split(" ")])
 
 
@@ -146,8 +154,7 @@ def lem_text(
     you have professional experience building react app , you be familiar with version control use git and GitHub
     """
 
-    doc = nlp(text)
-    return ' '.join([token.lemma_ for token in doc])
+    return LEXICAL_CACHE.lem_text(text, nlp)
 
 
 # remove extra space
@@ -233,6 +240,80 @@ def find_index_phrase(
     return []
 
 
+# compile phrases to find them all in one pass
+def compile_phrases(
+    phrases: List[str],
+) -> Dict[int, Set[Tuple[str, ...]]]:
+    """Function to compile phrases into sets of word tuples keyed by their number of words.
+
+    Parameters
+    ----------
+    phrases : List[str]
+        the phrases, e.g. S_GRAM_REDUNDANT
+
+    Returns
+    -------
+    Dict[int, Set[Tuple[str, ...]]]
+        returns the compiled phrases, to be used with `find_index_phrases`
+
+    Examples
+    --------
+    >>> from SkillNer.cleaner import compile_phrases
+    >>> compile_phrases(["of the", "you have", "no"])
+    {2: {('of', 'the'), ('you', 'have')}, 1: {('no',)}}
+    """
+
+    compiled = {}
+    for phrase in phrases:
+        words = tuple(phrase.split())
+        if words:
+            compiled.setdefault(len(words), set()).add(words)
+
+    return compiled
+
+
+# find indexes of all occurrences of compiled phrases in a list of words
+def find_index_phrases(
+    words: List[str],
+    compiled_phrases: Dict[int, Set[Tuple[str, ...]]],
+) -> List[int]:
+    """Function to determine the indexes of words belonging to any occurrence of any phrase.
+    The words are scanned once, whatever the number of phrases.
+
+    Parameters
+    ----------
+    words : List[str]
+        the words of the text
+    compiled_phrases : Dict[int, Set[Tuple[str, ...]]]
+        phrases compiled with `compile_phrases`
+
+    Returns
+    -------
+    List[int]
+        returns the sorted indexes of the words covered by a phrase.
+
+    Examples
+    --------
+    >>> from SkillNer.cleaner import compile_phrases, find_index_phrases
+    >>> phrases = compile_phrases(["of the", "you have"])
+    >>> words = "you have knowledge of the tools of the trade".split(" ")
+    >>> find_index_phrases(words, phrases)
+    [0, 1, 3, 4, 6, 7]
+    """
+
+    lengths = sorted(compiled_phrases)
+    covered = bytearray(len(words))
+
+    for i in range(len(words)):
+        for n in lengths:
+            if i + n > len(words):
+                break
+            if tuple(words[i:i + n]) in compiled_phrases[n]:
+                covered[i:i + n] = b"\x01" * n
+
+    return [i for i, is_covered in enumerate(covered) if is_covered]
+
+
 class Cleaner:
     """A class to build pipelines to clean text.
     """
@@ -260,6 +341,35 @@ class Cleaner:
         self.exclude_cleaning_functions = exclude_cleaning_function
         self.to_lowercase = to_lowercase
 
+        # cleaning operations of the pipeline, in order
+        # if exclude_cleaning_functions was provided then include-cleaning_functions will be ignoned
+        if len(exclude_cleaning_function):
+            self.cleaning_names = [
+                name for name in dict_cleaning_functions.keys()
+                if name not in exclude_cleaning_function
+            ]
+        else:
+            self.cleaning_names = [
+                name for name in dict_cleaning_functions.keys()
+                if name in include_cleaning_functions
+            ]
+
+        # punctuation and extra space removal are compiled:
+        # - a translate table maps all punctuations to a space in one pass
+        # - a regex finds the words (runs of non-space non-punctuation chars) with their offsets
+        # (with no step at all, the text is returned as is)
+        self.compiled = bool(self.cleaning_names) and \
+            set(self.cleaning_names) <= {"remove_punctuation", "remove_extra_space"}
+        self.translate_table = None
+        self.word_pattern = None
+        if self.compiled:
+            separators = ""
+            if "remove_punctuation" in self.cleaning_names:
+                self.translate_table = str.maketrans({punc: " " for punc in LIST_PUNCTUATIONS})
+                separators = "".join(re.escape(punc) for punc in LIST_PUNCTUATIONS)
+            if "remove_extra_space" in self.cleaning_names:
+                self.word_pattern = re.compile(f"[^\\s{separators}]+")
+
     def __call__(
         self,
         text: str
@@ -292,15 +402,59 @@ class Cleaner:
         if(self.to_lowercase):
             text = text.lower()
 
-        # perform cleaning while ignoring exclude_cleaning_functions
-        if len(self.exclude_cleaning_functions):
-            for cleaning_name in dict_cleaning_functions.keys():
-                if cleaning_name not in self.exclude_cleaning_functions:
-                    text = dict_cleaning_functions[cleaning_name](text)
-        # if exclude_cleaning_functions was provided then include-cleaning_functions will be ignoned
-        else:
-            for cleaning_name in dict_cleaning_functions.keys():
-                if cleaning_name in self.include_cleaning_functions:
-                    text = dict_cleaning_functions[cleaning_name](text)
+        # compiled pipeline
+        if self.compiled:
+            if self.translate_table is not None:
+                text = text.translate(self.translate_table)
+            if self.word_pattern is not None:
+                return " ".join(text.split())
+            return text.strip()
+
+        # perform cleaning step by step
+        for cleaning_name in self.cleaning_names:
+            text = dict_cleaning_functions[cleaning_name](text)
 
         return text
+
+    def clean_with_offsets(
+        self,
+        text: str
+    ) -> Tuple[str, List[Tuple[int, int]]]:
+        """To clean a text and get, for each word of the cleaned text, its position in the original text.
+        Both come from a single pass over the text. Only available for pipelines made of
+        `remove_punctuation` and `remove_extra_space`.
+
+        Parameters
+        ----------
+        text : str
+            text to clean
+
+        Returns
+        -------
+        Tuple[str, List[Tuple[int, int]]]
+            returns the cleaned text and the (start, end) character positions of its words in `text`
+
+        Examples
+        -------
+        >>> from skillNer.cleaner import Cleaner
+        >>> cleaner = Cleaner(
+                        to_lowercase=False,
+                        include_cleaning_functions=["remove_punctuation", "remove_extra_space"]
+                    )
+        >>> cleaner.clean_with_offsets("Python,  SQL (AWS)!")
+        ('Python SQL AWS', [(0, 6), (9, 12), (14, 17)])
+        """
+
+        if self.word_pattern is None:
+            raise ValueError(
+                f"offsets are not available for the cleaning operations {self.cleaning_names}")
+
+        lowered = text.lower() if self.to_lowercase else text
+        if len(lowered) == len(text):
+            matches = list(self.word_pattern.finditer(lowered))
+            return " ".join([match.group() for match in matches]), [match.span() for match in matches]
+
+        # lower casing changed the length of the text (rare unicode chars)
+        cleaned = self(text)
+        matches = list(self.word_pattern.finditer(text))
+        return cleaned, [match.span() for match in matches]
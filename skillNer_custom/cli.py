@@ -0,0 +1,524 @@
+# native packs
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+import contextlib
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+# installed packs
+import numpy as np
+# my packs
+#
+
+
+# formats inferred from the file suffix
+INPUT_FORMATS = {".jsonl": "jsonl", ".json": "jsonl", ".csv": "csv", ".parquet": "parquet"}
+OUTPUT_FORMATS = {".jsonl": "jsonl", ".json": "jsonl", ".parquet": "parquet"}
+
+# extractor of the current process, built once by `_init_worker`
+_EXTRACTOR = None
+_TRESH = 0.5
+# near-duplicate index of the current process, None when disabled
+_DEDUP = None
+# parsed corpus store of the current process, None when disabled
+_STORE = None
+_REANNOTATE = False
+
+
+# ==============================
+# Input
+# ==============================
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "parquet files need pyarrow: `pip install pyarrow` "
+            "or `pip install skillner-custom[parquet]`"
+        )
+    return pyarrow
+
+
+def read_records(
+    path: str,
+    input_format: str
+) -> Iterator[dict]:
+    """To read job postings one by one from a JSONL, CSV or Parquet file
+
+    Parameters
+    ----------
+    path : str
+        path of the file, "-" to read from stdin
+    input_format : str in ["jsonl", "csv", "parquet"]
+        format of the file
+
+    Yields
+    ------
+    dict
+        the records, in the order of the file
+    """
+
+    if input_format == "parquet":
+        pyarrow = _require_pyarrow()
+        source = io.BytesIO(sys.stdin.buffer.read()) if path == "-" else path
+        parquet_file = pyarrow.parquet.ParquetFile(source)
+        for batch in parquet_file.iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    fp = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    try:
+        if input_format == "csv":
+            yield from csv.DictReader(fp)
+        else:
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+
+def iter_chunks(
+    records: Iterator[dict],
+    text_field: str,
+    id_field: Optional[str],
+    chunk_size: int,
+    start_offset: int = 0
+) -> Iterator[List[Tuple[int, object, str]]]:
+    """To group records in chunks of (offset, id, text), skipping the first `start_offset` records"""
+
+    chunk = []
+    for offset, record in enumerate(records):
+        if offset < start_offset:
+            continue
+        text = record.get(text_field) or ""
+        record_id = record.get(id_field) if id_field else None
+        chunk.append((offset, record_id, str(text)))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ==============================
+# Workers
+# ==============================
+
+def _init_worker(config: dict):
+    """To build the skill extractor once per process"""
+
+    global _EXTRACTOR, _TRESH, _DEDUP, _STORE, _REANNOTATE
+
+    import spacy
+    from spacy.matcher import PhraseMatcher
+    from skillNer_custom.db_registry import DB_REGISTRY
+    from skillNer_custom.skill_extractor_class import SkillExtractor
+    from skillNer_custom.result_cache import ResultCache
+    from skillNer_custom.dedup import NearDuplicateIndex
+    from skillNer_custom.corpus_store import CorpusStore
+
+    if config["skills_db"]:
+        DB_REGISTRY.set_path("SKILL_DB", config["skills_db"])
+
+    # stdout may be the output : loading messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        nlp = spacy.load(config["model"])
+        _EXTRACTOR = SkillExtractor(
+            nlp,
+            DB_REGISTRY.get("SKILL_DB"),
+            PhraseMatcher,
+            fuzzy_func=config["fuzzy"],
+            matchers_bundle=config["matchers_bundle"],
+            result_cache=ResultCache(config["result_cache"]) if config["result_cache"] else None,
+        )
+    _TRESH = config["tresh"]
+    if config["dedup"]:
+        _DEDUP = NearDuplicateIndex(threshold=config["dedup"])
+    if config.get("corpus_store"):
+        _STORE = CorpusStore(config["corpus_store"], nlp)
+    _REANNOTATE = config.get("reannotate", False)
+
+
+def _stored_docs(chunk: List[Tuple[int, object, str]]) -> Optional[list]:
+    """To get the stored docs of a chunk, None when a record is not stored or its text changed"""
+
+    docs = []
+    for offset, _, text in chunk:
+        doc = _STORE.get(offset)
+        if doc is None or doc.user_data.get("text") != text:
+            return None
+        docs.append(doc)
+    return docs
+
+
+def _annotate_chunk(chunk: List[Tuple[int, object, str]]) -> Tuple[List[dict], int]:
+    texts = [text for _, _, text in chunk]
+    n_skipped = _DEDUP.n_skipped if _DEDUP else 0
+
+    docs = _stored_docs(chunk) if _REANNOTATE else None
+    if docs is not None:
+        # only the matchers run
+        annotations = list(_EXTRACTOR.reannotate(docs, tresh=_TRESH))
+    else:
+        # the chunk is parsed, and stored as one shard
+        if _STORE is not None:
+            _STORE.next_offset = chunk[0][0]
+        # consumed in full: the shard is written once the generator is exhausted
+        annotations = list(_EXTRACTOR.annotate_batch(
+            texts, tresh=_TRESH, batch_size=len(texts), dedup=_DEDUP, corpus_store=_STORE))
+    rows = [
+        {"offset": offset, "id": record_id, "annotations": annotation}
+        for (offset, record_id, _), annotation in zip(chunk, annotations)
+    ]
+    return rows, (_DEDUP.n_skipped - n_skipped if _DEDUP else 0)
+
+
+def annotate_chunks(
+    chunks: Iterator[list],
+    config: dict,
+    workers: int,
+    max_pending: int
+) -> Iterator[Tuple[List[dict], int]]:
+    """To annotate chunks across a process pool, results are yielded in the input order,
+    with the number of near-duplicates of the chunk.
+
+    At most `max_pending` chunks are in flight: the input is not read further until
+    the oldest chunk is annotated and written, which bounds the memory used.
+    """
+
+    if workers <= 1:
+        _init_worker(config)
+        for chunk in chunks:
+            yield _annotate_chunk(chunk)
+        return
+
+    if config.get("preload"):
+        # built once here, shared with the forked workers
+        from skillNer_custom.preload import fork_executor
+        pool = fork_executor(workers, _init_worker, (config,))
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(config,))
+    with pool:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_annotate_chunk, chunk))
+        while pending:
+            yield pending.popleft().result()
+
+
+# ==============================
+# Output
+# ==============================
+
+def _to_json(obj):
+    # numpy scalars in scores
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj)} is not JSON serializable")
+
+
+class JsonlSink:
+    """Streaming JSONL output. Its state is the size of the file,
+    on resume the file is truncated to the last checkpoint."""
+
+    def __init__(
+        self,
+        path: str,
+        state: Optional[dict] = None
+    ):
+        self.path = path
+
+        if path == "-":
+            self.fp = sys.stdout
+            self.state = {}
+            return
+
+        if state is not None and not os.path.exists(path):
+            # the output was removed since the checkpoint: it is written again from scratch
+            print(f"{path} was not found, it is written from the resumed record", file=sys.stderr)
+            state = None
+
+        if state is None:
+            self.fp = open(path, "w", encoding="utf-8")
+        else:
+            # drop lines written after the last checkpoint
+            self.fp = open(path, "r+", encoding="utf-8")
+            self.fp.seek(state["size"])
+            self.fp.truncate()
+        self.state = state or {"size": 0}
+
+    def write(self, rows: List[dict]):
+        for row in rows:
+            self.fp.write(json.dumps(row, default=_to_json, ensure_ascii=False) + "\n")
+
+    def commit(self) -> dict:
+        if self.fp.closed:
+            return self.state
+        self.fp.flush()
+        if self.fp is sys.stdout:
+            return {}
+        os.fsync(self.fp.fileno())
+        self.state = {"size": self.fp.tell()}
+        return self.state
+
+    def pending(self) -> int:
+        return 0
+
+    def close(self):
+        self.commit()
+        if self.fp is not sys.stdout:
+            self.fp.close()
+
+
+class ParquetSink:
+    """Parquet output, written as a folder of part files named by their first record offset.
+    Annotations are stored as JSON strings. On resume, parts after the last checkpoint are removed."""
+
+    def __init__(
+        self,
+        path: str,
+        state: Optional[dict] = None,
+        rows_per_part: int = 10000
+    ):
+        self.pyarrow = _require_pyarrow()
+        if path == "-":
+            raise ValueError("parquet output needs a folder, not stdout")
+
+        self.path = Path(path)
+        self.rows_per_part = rows_per_part
+        self.rows = []
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        if state is not None:
+            for part in self.path.glob("part-*.parquet"):
+                if part.name not in state["parts"]:
+                    part.unlink()
+        self.parts = list(state["parts"]) if state else []
+
+    def write(self, rows: List[dict]):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.rows_per_part:
+            self._write_part()
+
+    def _write_part(self):
+        if not self.rows:
+            return
+        table = self.pyarrow.table({
+            "offset": [row["offset"] for row in self.rows],
+            "id": [None if row["id"] is None else str(row["id"]) for row in self.rows],
+            "annotations": [
+                json.dumps(row["annotations"], default=_to_json, ensure_ascii=False)
+                for row in self.rows
+            ],
+        })
+        name = f"part-{self.rows[0]['offset']:012d}.parquet"
+        tmp_path = self.path / f"{name}.tmp"
+        self.pyarrow.parquet.write_table(table, tmp_path)
+        os.replace(tmp_path, self.path / name)
+        self.parts.append(name)
+        self.rows = []
+
+    def commit(self) -> dict:
+        # only rows written in parts are covered by the checkpoint
+        return {"parts": list(self.parts)}
+
+    def pending(self) -> int:
+        return len(self.rows)
+
+    def close(self):
+        self._write_part()
+
+
+# ==============================
+# Checkpoints
+# ==============================
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # replaced atomically : a crash never leaves a partial checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump(checkpoint, fp)
+    os.replace(tmp_path, path)
+
+
+# ==============================
+# Main
+# ==============================
+
+def _infer_format(path: str, formats: dict, default: str) -> str:
+    if path == "-":
+        return default
+    return formats.get(Path(path).suffix.lower(), default)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="skillner-extract",
+        description="Annotate skills in job postings (JSONL / CSV / Parquet) with SkillExtractor."
+    )
+    parser.add_argument("input", help="input file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file (JSONL) or folder (Parquet), '-' for stdout")
+    parser.add_argument("--input-format", choices=["jsonl", "csv", "parquet"],
+                        help="by default inferred from the input suffix, jsonl for stdin")
+    parser.add_argument("--output-format", choices=["jsonl", "parquet"],
+                        help="by default inferred from the output suffix, jsonl for stdout")
+    parser.add_argument("--text-field", default="description",
+                        help="field holding the text of a record")
+    parser.add_argument("--id-field", help="field copied as `id` in the output")
+    parser.add_argument("--model", default="en_core_web_lg", help="spacy model to load")
+    parser.add_argument("--skills-db", help="skill db file (json or .skdb), by default SKILL_DB")
+    parser.add_argument("--matchers-bundle", help="path of the matchers bundle (see MatcherBundle)")
+    parser.add_argument("--fuzzy", action="store_true", help="enable the fuzzy phrase matcher")
+    parser.add_argument("--dedup", type=float, metavar="THRESHOLD",
+                        help="only annotate the differing segments of near-duplicate postings, "
+                        "THRESHOLD is their min similarity, e.g. 0.8 (see NearDuplicateIndex). "
+                        "Each worker detects the near-duplicates of the postings it annotates: "
+                        "with several workers, which records get approximate annotations depends "
+                        "on how chunks are scheduled, use --workers 1 for a reproducible output")
+    parser.add_argument("--result-cache",
+                        help="sqlite file caching the annotations of already seen texts, "
+                        "shared by the workers (see ResultCache)")
+    parser.add_argument("--corpus-store",
+                        help="folder storing the parsed postings (see CorpusStore), "
+                        "to annotate them again with --reannotate without parsing them")
+    parser.add_argument("--reannotate", action="store_true",
+                        help="read the parsed postings from --corpus-store instead of parsing them, "
+                        "e.g. after refreshing the skill db. Postings missing from the store "
+                        "(or whose text changed) are parsed and stored")
+    parser.add_argument("--tresh", type=float, default=0.5, help="score treshold")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes")
+    parser.add_argument("--preload", action="store_true",
+                        help="build the extractor once and fork the workers from it: "
+                        "they share its memory instead of building their own (see preload.py)")
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="number of records sent to a worker at once")
+    parser.add_argument("--max-pending", type=int,
+                        help="max number of chunks in flight, by default 2 * workers")
+    parser.add_argument("--checkpoint", help="checkpoint file, by default <output>.ckpt")
+    parser.add_argument("--resume", action="store_true",
+                        help="resume from the checkpoint of a previous run")
+    parser.add_argument("--progress-every", type=float, default=10.,
+                        help="seconds between two progress reports on stderr")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of `skillner-extract`
+
+    Examples
+    --------
+    $ skillner-extract postings.jsonl -o skills.jsonl --workers 8 --id-field job_id
+    $ cat postings.csv | skillner-extract - --input-format csv > skills.jsonl
+    $ skillner-extract postings.parquet -o skills.parquet --resume
+    $ skillner-extract postings.jsonl -o skills.jsonl --corpus-store postings.store
+    $ skillner-extract postings.jsonl -o skills_v2.jsonl --corpus-store postings.store \\
+        --skills-db skill_db_v2.json --reannotate
+    """
+
+    args = get_parser().parse_args(argv)
+
+    input_format = args.input_format or _infer_format(args.input, INPUT_FORMATS, "jsonl")
+    output_format = args.output_format or _infer_format(args.output, OUTPUT_FORMATS, "jsonl")
+    max_pending = args.max_pending or 2 * max(args.workers, 1)
+
+    # checkpoints need an output to resume into
+    checkpoint_path = args.checkpoint
+    if checkpoint_path is None and args.output != "-":
+        checkpoint_path = f"{args.output}.ckpt"
+    if args.resume and checkpoint_path is None:
+        print("--resume needs --checkpoint or --output", file=sys.stderr)
+        return 2
+    if args.reannotate and not args.corpus_store:
+        print("--reannotate needs --corpus-store", file=sys.stderr)
+        return 2
+
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume else None
+    start_offset = checkpoint["offset"] if checkpoint else 0
+    sink_state = checkpoint["sink"] if checkpoint else None
+
+    if output_format == "parquet":
+        sink = ParquetSink(args.output, sink_state)
+    else:
+        sink = JsonlSink(args.output, sink_state)
+
+    config = {
+        "model": args.model,
+        "skills_db": args.skills_db,
+        "matchers_bundle": args.matchers_bundle,
+        "fuzzy": args.fuzzy,
+        "tresh": args.tresh,
+        "result_cache": args.result_cache,
+        "dedup": args.dedup,
+        "corpus_store": args.corpus_store,
+        "reannotate": args.reannotate,
+        "preload": args.preload,
+    }
+
+    records = read_records(args.input, input_format)
+    chunks = iter_chunks(records, args.text_field, args.id_field, args.chunk_size, start_offset)
+
+    if start_offset:
+        print(f"resuming from record {start_offset} ...", file=sys.stderr)
+
+    n_done = 0
+    n_skipped = 0
+    next_offset = start_offset
+    start = last_report = time.perf_counter()
+    try:
+        for rows, n_near_duplicates in annotate_chunks(chunks, config, args.workers, max_pending):
+            sink.write(rows)
+            n_done += len(rows)
+            n_skipped += n_near_duplicates
+            next_offset = rows[-1]["offset"] + 1
+
+            # parquet rows waiting for their part are not checkpointed yet
+            if checkpoint_path and not sink.pending():
+                save_checkpoint(checkpoint_path, {"offset": next_offset, "sink": sink.commit()})
+
+            now = time.perf_counter()
+            if now - last_report >= args.progress_every:
+                last_report = now
+                print(
+                    f"{next_offset} records ({n_done / (now - start):.1f} records/sec)",
+                    file=sys.stderr
+                )
+    finally:
+        sink.close()
+
+    if checkpoint_path:
+        save_checkpoint(checkpoint_path, {"offset": next_offset, "sink": sink.commit()})
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"annotated {n_done} records in {elapsed:.2f}s "
+        f"({n_done / elapsed if elapsed else 0.:.1f} records/sec)",
+        file=sys.stderr
+    )
+    if args.dedup:
+        print(f"{n_skipped} near-duplicate records skipped", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# native packs
+import json
+from pathlib import Path
+from typing import Optional
+# installed packs
+from spacy.language import Language
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc, SpanGroup
+# my packs
+from skillNer_custom.text_class import Text
+from skillNer_custom.pipe_pruning import PrunedPipeline
+
+
+# annotations of the doc, in the format of `SkillExtractor.annotate`
+if not Doc.has_extension("skills"):
+    Doc.set_extension("skills", default=None)
+
+# match types written in the span group, in this order
+MATCH_TYPES = ("full_matches", "ngram_scored", "fuzzy_matches")
+
+SKILLS_DB_FILE = "skills_db.json"
+BUNDLE_FILE = "matchers.bundle"
+CONFIG_FILE = "cfg.json"
+
+
+class SkillNerComponent:
+    """spaCy pipeline component annotating skills, see the `skillner` factory.
+
+    The component reuses the parse of the pipeline: the text is not parsed again,
+    only the transformed text is tokenized (see `Text.from_doc`). Then the matchers
+    run as in `SkillExtractor.annotate`. The matches are written to
+
+    - `doc.spans[spans_key]`: one span per match, labelled with the match type,
+      the skill id is its `kb_id_`
+    - `doc._.skills`: the annotations, in the format of `SkillExtractor.annotate`
+
+    Lemmas are the ones of the pipeline, computed on the raw text (cased, in context),
+    while `SkillExtractor.annotate` lemmatizes the lower cased text: low surface and token
+    matches may differ slightly. The matchers are built on first use, or loaded with `from_disk`.
+    """
+
+    def __init__(
+        self,
+        nlp: Language,
+        name: str = "skillner",
+        skills_db: Optional[str] = None,
+        fuzzy: bool = False,
+        tresh: float = 0.5,
+        spans_key: str = "skills"
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        nlp : Language
+            the pipeline
+        name : str, optional
+            name of the component, by default "skillner"
+        skills_db : str | None, optional
+            path of the skill db (json or .skdb), by default SKILL_DB of the registry
+        fuzzy : bool, optional
+            enable the fuzzy phrase matcher, by default False
+        tresh : float, optional
+            score treshold of ngram_scored and fuzzy matches, by default 0.5
+        spans_key : str, optional
+            key of the span group of the matches, by default "skills"
+
+        Examples
+        --------
+        >>> import spacy
+        >>> import skillNer_custom.component
+        >>> nlp = spacy.load("en_core_web_lg")
+        >>> nlp.add_pipe("skillner", config={"fuzzy": True})
+        >>> for doc in nlp.pipe(texts, n_process=4):
+        ...     print([(span.text, span.kb_id_) for span in doc.spans["skills"]])
+        >>> nlp.to_disk("en_skillner")
+        """
+
+        # params
+        self.nlp = nlp
+        self.name = name
+        self.cfg = {
+            "skills_db": skills_db,
+            "fuzzy": fuzzy,
+            "tresh": tresh,
+            "spans_key": spans_key,
+        }
+
+        # built lazily, see `.extractor`
+        self.skills_db = None
+        self._extractor = None
+        self._bundle_path = None
+        return
+
+    @property
+    def extractor(self):
+        """The `SkillExtractor` running the matchers, built on first use"""
+
+        if self._extractor is None:
+            # imported here: the extractor imports the whole package
+            from skillNer_custom.skill_extractor_class import SkillExtractor
+
+            if self.skills_db is None:
+                self.skills_db = self._load_skills_db()
+            # the extractor parses small texts (e.g. `Utils` similarities without static
+            # vectors): running the full pipeline there would run the component again
+            self._extractor = SkillExtractor(
+                PrunedPipeline(self.nlp, [self.name]),
+                self.skills_db,
+                PhraseMatcher,
+                fuzzy_func=self.cfg["fuzzy"],
+                matchers_bundle=self._bundle_path,
+            )
+        return self._extractor
+
+    def _load_skills_db(self):
+        from skillNer_custom.db_registry import DB_REGISTRY, DBRegistry
+
+        if self.cfg["skills_db"]:
+            # a registry of its own: the paths of the process-wide registry are left as is
+            registry = DBRegistry(allow_remote=False)
+            registry.set_path("SKILL_DB", self.cfg["skills_db"])
+            return registry.get("SKILL_DB")
+        return DB_REGISTRY.get("SKILL_DB")
+
+    def initialize(
+        self,
+        get_examples=None,
+        *,
+        nlp: Optional[Language] = None
+    ):
+        """To build the matchers, called by `nlp.initialize()`"""
+        self.extractor
+
+    def __call__(self, doc: Doc) -> Doc:
+        extractor = self.extractor
+        text_obj = Text.from_doc(doc, extractor.nlp)
+        annotations = extractor._annotate_text_obj(text_obj, self.cfg["tresh"])
+
+        # positions of the words of the transformed text in the raw text
+        token_spans = text_obj.token_spans()
+        spans = []
+        for match_type in MATCH_TYPES:
+            for match in annotations["results"][match_type]:
+                ids = match["doc_node_id"]
+                span = doc.char_span(
+                    token_spans[ids[0]][0],
+                    token_spans[ids[-1]][1],
+                    label=match["type"],
+                    kb_id=match["skill_id"],
+                    alignment_mode="expand",
+                )
+                if span is not None:
+                    spans.append(span)
+
+        doc.spans[self.cfg["spans_key"]] = SpanGroup(doc, name=self.cfg["spans_key"], spans=spans)
+        doc._.skills = annotations
+        return doc
+
+    # ==============================
+    # Serialization
+    # ==============================
+
+    def to_disk(
+        self,
+        path,
+        *,
+        exclude=tuple()
+    ):
+        """To save the config, the skill db and the matchers bundle in a folder"""
+
+        # the matchers are saved built: loading the pipeline does not build them
+        extractor = self.extractor
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / CONFIG_FILE, "w", encoding="utf-8") as fp:
+            json.dump(self.cfg, fp)
+
+        skills_db = self.skills_db.to_dict() if hasattr(self.skills_db, "to_dict") else self.skills_db
+        with open(path / SKILLS_DB_FILE, "w", encoding="utf-8") as fp:
+            json.dump(skills_db, fp, ensure_ascii=False)
+
+        # keyed on the db as `.from_disk()` loads it back: a json dict, whatever the db was
+        from skillNer_custom.bundle_class import MatcherBundle
+        bundle = MatcherBundle(extractor.nlp, skills_db, PhraseMatcher, str(path / BUNDLE_FILE))
+        bundle.save({"matchers": extractor.matchers, "fuzzy_matcher": extractor.fuzzy_matcher})
+
+    def from_disk(
+        self,
+        path,
+        *,
+        exclude=tuple()
+    ) -> "SkillNerComponent":
+        """To load a component saved with `.to_disk()`, the matchers are loaded on first use"""
+
+        path = Path(path)
+        with open(path / CONFIG_FILE, encoding="utf-8") as fp:
+            self.cfg.update(json.load(fp))
+        with open(path / SKILLS_DB_FILE, encoding="utf-8") as fp:
+            self.skills_db = json.load(fp)
+
+        self._bundle_path = str(path / BUNDLE_FILE)
+        self._extractor = None
+        return self
+
+
+@Language.factory(
+    "skillner",
+    default_config={
+        "skills_db": None,
+        "fuzzy": False,
+        "tresh": 0.5,
+        "spans_key": "skills",
+    },
+)
+def make_skillner(
+    nlp: Language,
+    name: str,
+    skills_db: Optional[str],
+    fuzzy: bool,
+    tresh: float,
+    spans_key: str
+) -> SkillNerComponent:
+    return SkillNerComponent(
+        nlp,
+        name,
+        skills_db=skills_db,
+        fuzzy=fuzzy,
+        tresh=tresh,
+        spans_key=spans_key,
+    )
@@ -0,0 +1,261 @@
+# native packs
+import os
+import re
+import json
+import bisect
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+# installed packs
+import spacy
+import srsly
+from spacy.tokens import Doc, DocBin
+# my packs
+#
+
+
+# bump when the content of the shards changes
+STORE_FORMAT_VERSION = 1
+
+META_FILE = "store.json"
+SHARD_PATTERN = re.compile(r"^shard-(\d{12})-(\d{6})\.shard$")
+
+# attributes of the stored tokens, whitespace is always stored
+DOC_ATTRS = ["ORTH", "LEMMA"]
+
+
+def nlp_fingerprint(nlp) -> str:
+    """To get the id of the tokenizer and lemmatizer of nlp: stored docs are only valid for it
+
+    Returns
+    -------
+    str
+        returns the spacy version and the name and version of the nlp model
+    """
+
+    meta = nlp.meta
+    return f"spacy-{spacy.__version__}|{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+
+def _locate(
+    shards: List[Tuple[int, int, Path]],
+    offset: int
+) -> Optional[int]:
+    # index of the shard holding a document, None when no shard holds it
+    index = bisect.bisect_right([start for start, _, _ in shards], offset) - 1
+    if index >= 0 and offset < shards[index][0] + shards[index][1]:
+        return index
+    return None
+
+
+class CorpusStore:
+    """Parse-once store of a corpus, see `SkillExtractor.annotate_batch(corpus_store=...)`.
+
+    Parsing is the dominant cost of annotating a text. The store keeps what the matchers
+    read from the parse: the tokens and lemmas of the transformed text of each document
+    (see `Text`), with its raw text. Once a corpus is stored, `SkillExtractor.reannotate`
+    runs the matchers on the stored docs without parsing them again, for instance with
+    a refreshed skill db.
+
+    The store is a folder of shards named by the offset of their first document and their
+    number of documents (`shard-<offset>-<n_docs>.shard`): shards written by
+    several processes do not clash, and documents are read back in the order of offsets.
+    The folder also holds the nlp the documents were parsed with: a store is only opened
+    with the same spacy version and model, stored lemmas would differ otherwise.
+
+    A shard is the DocBin of its docs and the column of their raw texts: texts are not
+    stored as user data of the docs, decoding the user data of each doc is slow.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        nlp,
+        shard_size: int = 1000,
+        max_open_shards: int = 2
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        path : str
+            folder of the store, created if missing
+        nlp : [type]
+            An NLP object instanciated from Spacy, the one documents are parsed with
+        shard_size : int, optional
+            number of documents of a shard, by default 1000
+        max_open_shards : int, optional
+            number of shards kept loaded by `.get()`, by default 2
+
+        Examples
+        --------
+        >>> from skillNer_custom.corpus_store import CorpusStore
+        >>> store = CorpusStore("postings.store", nlp)
+        >>> annotations = list(skill_extractor.annotate_batch(postings, corpus_store=store))
+        >>> # ... refresh the skill db ...
+        >>> skill_extractor = SkillExtractor(nlp, new_skills_db, PhraseMatcher)
+        >>> annotations = list(skill_extractor.reannotate(CorpusStore("postings.store", nlp)))
+        """
+
+        # params
+        self.path = Path(path)
+        self.vocab = nlp.vocab
+        self.shard_size = shard_size
+        self.max_open_shards = max_open_shards
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = {"format_version": STORE_FORMAT_VERSION, "nlp": nlp_fingerprint(nlp)}
+        meta_path = self.path / META_FILE
+        if meta_path.exists():
+            with open(meta_path, encoding="utf-8") as fp:
+                stored_meta = json.load(fp)
+            if stored_meta != meta:
+                raise ValueError(
+                    f"the corpus store {self.path} was written with {stored_meta}, "
+                    f"it cannot be used with {meta}"
+                )
+        else:
+            with open(meta_path, "w", encoding="utf-8") as fp:
+                json.dump(meta, fp)
+
+        # documents waiting for their shard: (text, words, spaces, lemmas)
+        self._buffer = []
+        # offset of the next document added
+        self.next_offset = self.end_offset()
+
+        # shards listed and loaded by `.get()`: name -> docs
+        self._listed_shards = None
+        self._open_shards = {}
+        return
+
+    # ==============================
+    # Shards
+    # ==============================
+
+    def shards(self) -> List[Tuple[int, int, Path]]:
+        """To get the shards of the store
+
+        Returns
+        -------
+        List[Tuple[int, int, Path]]
+            returns the (offset, number of documents, path) of the shards, by offset
+        """
+
+        shards = []
+        for shard_path in self.path.iterdir():
+            match = SHARD_PATTERN.match(shard_path.name)
+            if match:
+                shards.append((int(match.group(1)), int(match.group(2)), shard_path))
+        return sorted(shards)
+
+    def end_offset(self) -> int:
+        """To get the offset following the last stored document"""
+        return max((offset + n_docs for offset, n_docs, _ in self.shards()), default=0)
+
+    def __len__(self) -> int:
+        return sum(n_docs for _, n_docs, _ in self.shards())
+
+    def read_shard(
+        self,
+        shard_path: Path
+    ) -> List[Doc]:
+        """To load the docs of a shard, their raw text is `doc.user_data["text"]`"""
+
+        with open(shard_path, "rb") as fp:
+            shard = srsly.msgpack_loads(fp.read())
+        docs = list(DocBin().from_bytes(shard["docs"]).get_docs(self.vocab))
+        for doc, text in zip(docs, shard["texts"]):
+            doc.user_data["text"] = text
+        return docs
+
+    def __iter__(self) -> Iterator[Doc]:
+        """To read the stored docs by offset, see `.read_shard()`"""
+
+        for _, _, shard_path in self.shards():
+            yield from self.read_shard(shard_path)
+
+    def get(
+        self,
+        offset: int
+    ) -> Optional[Doc]:
+        """To get the stored doc of a document by its offset, None when it is not stored"""
+
+        # listed again when the offset is not found: shards may have been added since
+        index = _locate(self._listed_shards or [], offset)
+        if index is None:
+            self._listed_shards = self.shards()
+            index = _locate(self._listed_shards, offset)
+            if index is None:
+                return None
+        start, _, shard_path = self._listed_shards[index]
+
+        docs = self._open_shards.get(shard_path.name)
+        if docs is None:
+            docs = self.read_shard(shard_path)
+            if len(self._open_shards) >= self.max_open_shards:
+                self._open_shards.pop(next(iter(self._open_shards)))
+            self._open_shards[shard_path.name] = docs
+        return docs[offset - start]
+
+    # ==============================
+    # Writing
+    # ==============================
+
+    def add(
+        self,
+        text: str,
+        doc: Doc
+    ):
+        """To store a document, written with its shard (see `.flush()`)
+
+        Parameters
+        ----------
+        text : str
+            the raw text
+        doc : Doc
+            the doc of the transformed text, `Text(text, nlp).views["transformed"]`
+        """
+
+        # the columns only: docs of the pipeline hold tensors
+        self._buffer.append((
+            text,
+            [token.text for token in doc],
+            [bool(token.whitespace_) for token in doc],
+            [token.lemma_ for token in doc],
+        ))
+        if len(self._buffer) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """To write the documents added since the last shard as a new shard"""
+
+        if not self._buffer:
+            return
+
+        doc_bin = DocBin(attrs=DOC_ATTRS)
+        for _, words, spaces, lemmas in self._buffer:
+            doc_bin.add(Doc(self.vocab, words=words, spaces=spaces, lemmas=lemmas))
+        shard = {"docs": doc_bin.to_bytes(), "texts": [text for text, _, _, _ in self._buffer]}
+
+        name = f"shard-{self.next_offset:012d}-{len(self._buffer):06d}.shard"
+        # replaced atomically : readers never see a partial shard
+        tmp_path = self.path / f"{name}.tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(srsly.msgpack_dumps(shard))
+        os.replace(tmp_path, self.path / name)
+
+        # shards of a previous run covered by the new one (e.g. written with another shard size)
+        end = self.next_offset + len(self._buffer)
+        for offset, n_docs, shard_path in self.shards():
+            if shard_path.name != name and offset >= self.next_offset and offset + n_docs <= end:
+                shard_path.unlink()
+        self._listed_shards = None
+        self._open_shards.clear()
+
+        self.next_offset = end
+        self._buffer = []
+
+    def __enter__(self) -> "CorpusStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
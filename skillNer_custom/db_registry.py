@@ -0,0 +1,219 @@
+# native packs
+import os
+import sys
+import json
+import threading
+from pathlib import Path
+from typing import List, Optional
+# installed packs
+#
+# my packs
+#
+
+
+# mapping db name and its file name
+MAPPING_NAME_FILE = {
+    "SKILL_DB": "skill_db_relax_20.json",
+    "JOB_DB": "job_db_relax_20.json",
+    "TOKEN_DIST": "token_dist_skill.json",
+    "TOKEN_DIST_JOB": "token_dist_job.json",
+}
+
+# dbs that can be stored in the binary format of `SkillDBView`
+BINARY_DBS = ("SKILL_DB", "JOB_DB")
+BINARY_SUFFIX = ".skdb"
+
+# environment variable to point to the folder holding the dbs
+ENV_DATA_DIR = "SKILLNER_DATA_DIR"
+
+
+class DBRegistry:
+    """Lazy and cached access to the dbs (skill db, job db, token distributions).
+
+    Nothing is loaded when the registry is created: a db is read from disk the first
+    time it is requested and then kept in memory. The db file is looked up in this order:
+
+    1. the path registered with `.set_path()`
+    2. the folder given by the `SKILLNER_DATA_DIR` environment variable
+    3. the `data_dir` of the registry
+    4. the current working directory
+    5. the data installed with the package (`<sys.prefix>/skillner_data`)
+       and the `data/` folder of a source checkout
+
+    With `prefer_binary`, the compact binary version of the skill and job dbs
+    (`.skdb`, see `SkillDBView`) is looked up before the json one. A db registered
+    with a `.skdb` path is always opened as a memory-mapped `SkillDBView`.
+
+    If the file is not found and `allow_remote` is True, the db is fetched
+    from the remote bucket and saved in the first folder where it is looked up.
+    """
+
+    def __init__(
+        self,
+        data_dir: Optional[str] = None,
+        allow_remote: bool = True,
+        prefer_binary: bool = False
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        data_dir : str, optional
+            folder holding the db files, by default None
+        allow_remote : bool, optional
+            whether to fetch missing dbs from the remote bucket, by default True
+        prefer_binary : bool, optional
+            whether to look for the binary `.skdb` skill and job dbs first, by default False
+
+        Examples
+        --------
+        >>> from skillNer_custom.db_registry import DBRegistry
+        >>> registry = DBRegistry(data_dir="./data", allow_remote=False)
+        >>> SKILL_DB = registry.get("SKILL_DB")
+        """
+
+        # params
+        self.data_dir = data_dir
+        self.allow_remote = allow_remote
+        self.prefer_binary = prefer_binary
+
+        # explicit paths and loaded dbs
+        self.paths = {}
+        self.loaded = {}
+
+        # dbs are loaded at most once, even with threads
+        self._lock = threading.Lock()
+        return
+
+    def set_path(
+        self,
+        db_name: str,
+        path: str
+    ):
+        """To set the file of a db explicitly. A db already loaded is dropped.
+
+        Parameters
+        ----------
+        db_name : str in ["SKILL_DB", "JOB_DB", "TOKEN_DIST", "TOKEN_DIST_JOB"]
+            name of the db
+        path : str
+            path of the db file
+        """
+
+        with self._lock:
+            self.paths[db_name] = path
+            self.loaded.pop(db_name, None)
+
+    def search_dirs(self) -> List[Path]:
+        """To get the folders where db files are looked up, by order of priority
+
+        Returns
+        -------
+        List[Path]
+            returns the list of folders
+        """
+
+        dirs = []
+        if os.environ.get(ENV_DATA_DIR):
+            dirs.append(Path(os.environ[ENV_DATA_DIR]))
+        if self.data_dir:
+            dirs.append(Path(self.data_dir))
+        dirs.append(Path.cwd())
+        dirs.append(Path(sys.prefix) / "skillner_data")
+        dirs.append(Path(__file__).resolve().parent.parent / "data")
+
+        return dirs
+
+    def find(
+        self,
+        db_name: str
+    ) -> Optional[Path]:
+        """To find the file of a db
+
+        Parameters
+        ----------
+        db_name : str
+            name of the db
+
+        Returns
+        -------
+        Path | None
+            returns the path of the db file, None if it was not found
+        """
+
+        if db_name in self.paths:
+            return Path(self.paths[db_name])
+
+        file_names = [MAPPING_NAME_FILE[db_name]]
+        if self.prefer_binary and db_name in BINARY_DBS:
+            file_names.insert(0, str(Path(file_names[0]).with_suffix(BINARY_SUFFIX)))
+
+        for folder in self.search_dirs():
+            for file_name in file_names:
+                path = folder / file_name
+                if path.exists():
+                    return path
+
+        return None
+
+    def get(
+        self,
+        db_name: str
+    ):
+        """To get a db, it is loaded on first access
+
+        Parameters
+        ----------
+        db_name : str in ["SKILL_DB", "JOB_DB", "TOKEN_DIST", "TOKEN_DIST_JOB"]
+            name of the db
+
+        Returns
+        -------
+        dict | SkillDBView
+            returns the db
+        """
+
+        if db_name in self.loaded:
+            return self.loaded[db_name]
+
+        with self._lock:
+            if db_name not in self.loaded:
+                self.loaded[db_name] = self._load(db_name)
+
+        return self.loaded[db_name]
+
+    def _load(
+        self,
+        db_name: str
+    ) -> dict:
+
+        if db_name not in MAPPING_NAME_FILE:
+            raise KeyError(f"unknown db {db_name}")
+
+        path = self.find(db_name)
+        if path is not None and path.suffix == BINARY_SUFFIX:
+            from skillNer_custom.skill_db_view import SkillDBView
+            return SkillDBView(str(path))
+        if path is not None:
+            with open(path, encoding="utf-8") as json_file:
+                return json.load(json_file)
+
+        if not self.allow_remote:
+            raise FileNotFoundError(
+                f"{MAPPING_NAME_FILE[db_name]} was not found in "
+                f"{[str(folder) for folder in self.search_dirs()]}"
+            )
+
+        # fetch remote data and save it
+        from skillNer_custom.network.remote_db import RemoteBucket
+
+        db = RemoteBucket(branch="master").fetch_remote(db_name)
+        path = self.search_dirs()[0] / MAPPING_NAME_FILE[db_name]
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(db, fp)
+
+        return db
+
+
+# registry used by `skillNer_custom.general_params`
+DB_REGISTRY = DBRegistry()
@@ -0,0 +1,317 @@
+# native packs
+import zlib
+from difflib import SequenceMatcher
+from collections import OrderedDict, defaultdict
+from typing import List, Optional, Tuple
+# installed packs
+import numpy as np
+# my packs
+#
+
+
+# prime of the universal hash functions of the min hash: (a * x + b) % MERSENNE_PRIME
+MERSENNE_PRIME = (1 << 31) - 1
+
+# fields of the annotations holding matches
+MATCH_TYPES = ("full_matches", "ngram_scored", "fuzzy_matches")
+
+
+class Representative:
+    """A document annotated in full, whose annotations are reused by its near-duplicates"""
+
+    __slots__ = ("tokens", "shingles", "annotations", "n_members")
+
+    def __init__(
+        self,
+        tokens: List[str],
+        shingles: set
+    ):
+        self.tokens = tokens
+        self.shingles = shingles
+        # set once the representative is annotated
+        self.annotations = None
+        self.n_members = 0
+
+
+class NearDuplicateIndex:
+    """MinHash / LSH index of the documents of a batch run, see `SkillExtractor.annotate_batch(dedup=...)`.
+
+    Documents are compared on their sets of token shingles. The min hash signature of a
+    document is split in `bands`: documents sharing a band are candidates, and a candidate
+    is a near-duplicate when the jaccard similarity of the shingles is at least `threshold`.
+    The first document of a cluster is its representative and is annotated in full.
+    The other members:
+
+    - `mode="segments"`: reuse the matches of the representative lying in the text they share
+      (away from the edits by `margin` tokens) and annotate only the differing segments.
+    - `mode="reuse"`: reuse the matches of the representative lying in the text they share,
+      the differing segments are not annotated.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        mode: str = "segments",
+        margin: int = 4,
+        min_gap: int = 32,
+        max_representatives: int = 100000,
+        seed: int = 0
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        threshold : float, optional
+            min jaccard similarity of the shingles of near-duplicates, by default 0.8
+        num_perm : int, optional
+            length of the min hash signatures, by default 64
+        bands : int, optional
+            number of LSH bands, it must divide `num_perm`, by default 16
+        shingle_size : int, optional
+            number of tokens of a shingle, by default 3
+        mode : str, optional
+            "segments" or "reuse", see the class docstring, by default "segments"
+        margin : int, optional
+            tokens around an edit whose matches are not reused (a skill may cross the edit),
+            by default 4
+        min_gap : int, optional
+            differing segments closer than `min_gap` tokens are annotated together: annotating
+            a text has a fixed cost, about the cost of a few dozen tokens, by default 32
+        max_representatives : int, optional
+            max number of representatives kept, the oldest are dropped first, by default 100000
+        seed : int, optional
+            seed of the hash functions, by default 0
+
+        Examples
+        --------
+        >>> from skillNer_custom.dedup import NearDuplicateIndex
+        >>> dedup = NearDuplicateIndex(threshold=0.9)
+        >>> annotations = list(skill_extractor.annotate_batch(postings, dedup=dedup))
+        >>> dedup.stats()
+        {'n_docs': 10000, 'n_representatives': 3120, 'n_skipped': 6880, 'skipped_rate': 0.688, ...}
+        """
+
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        if mode not in ("segments", "reuse"):
+            raise ValueError(f"unknown mode {mode}, expected 'segments' or 'reuse'")
+
+        # params
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.mode = mode
+        self.margin = margin
+        self.min_gap = min_gap
+        self.max_representatives = max_representatives
+
+        # hash functions of the min hash
+        rnd = np.random.RandomState(seed)
+        self.hash_a = rnd.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.hash_b = rnd.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        # band -> representatives, representatives by insertion order
+        self.buckets = defaultdict(list)
+        self.representatives = OrderedDict()
+
+        self.reset_stats()
+        return
+
+    def reset_stats(self):
+        self.n_docs = 0
+        self.n_skipped = 0
+        self.n_tokens = 0
+        self.n_annotated_tokens = 0
+
+    def shingles(
+        self,
+        tokens: List[str]
+    ) -> set:
+        """To get the shingles of a document, hashed"""
+
+        size = min(self.shingle_size, len(tokens))
+        return {
+            zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8"))
+            for i in range(len(tokens) - size + 1)
+        }
+
+    def signature(
+        self,
+        shingles: set
+    ) -> np.ndarray:
+        """To get the min hash signature of a set of hashed shingles"""
+
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles)) % MERSENNE_PRIME
+        hashes = (np.outer(values, self.hash_a) + self.hash_b) % MERSENNE_PRIME
+        return hashes.min(axis=0)
+
+    def _bands(
+        self,
+        signature: np.ndarray
+    ) -> List[Tuple[int, bytes]]:
+        return [(i, band.tobytes()) for i, band in enumerate(np.split(signature, self.bands))]
+
+    def query(
+        self,
+        tokens: List[str]
+    ) -> Tuple[Optional[Representative], Optional[Representative]]:
+        """To find the representative of a document, the document becomes a representative
+        when it has no near-duplicate
+
+        Parameters
+        ----------
+        tokens : List[str]
+            tokens of the transformed text of the document
+
+        Returns
+        -------
+        Tuple[Optional[Representative], Optional[Representative]]
+            returns (representative, None) for a near-duplicate
+            and (None, new representative) otherwise
+        """
+
+        self.n_docs += 1
+        self.n_tokens += len(tokens)
+        shingles = self.shingles(tokens)
+        if not shingles:
+            self.n_annotated_tokens += len(tokens)
+            return None, Representative(tokens, shingles)
+
+        bands = self._bands(self.signature(shingles))
+
+        # best candidate sharing a band
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band in bands:
+            for candidate in self.buckets.get(band, ()):
+                if id(candidate) in seen:
+                    continue
+                seen.add(id(candidate))
+                similarity = len(shingles & candidate.shingles) / len(shingles | candidate.shingles)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+
+        if best is not None:
+            best.n_members += 1
+            self.n_skipped += 1
+            return best, None
+
+        # new representative
+        self.n_annotated_tokens += len(tokens)
+        representative = Representative(tokens, shingles)
+        self.representatives[id(representative)] = (representative, bands)
+        for band in bands:
+            self.buckets[band].append(representative)
+
+        # drop the oldest representative
+        if len(self.representatives) > self.max_representatives:
+            old, old_bands = self.representatives.popitem(last=False)[1]
+            for band in old_bands:
+                bucket = self.buckets[band]
+                bucket.remove(old)
+                if not bucket:
+                    del self.buckets[band]
+
+        return None, representative
+
+    def diff(
+        self,
+        representative: Representative,
+        tokens: List[str]
+    ) -> Tuple[dict, List[Tuple[int, int]]]:
+        """To align a near-duplicate on its representative
+
+        Parameters
+        ----------
+        representative : Representative
+            the representative of the document
+        tokens : List[str]
+            tokens of the transformed text of the document
+
+        Returns
+        -------
+        Tuple[dict, List[Tuple[int, int]]]
+            returns the position in the document of the tokens of the representative whose
+            matches can be reused, and the (start, end) token segments of the document
+            that differ from the representative (extended by `margin`)
+        """
+
+        margin = self.margin
+        shared = {}
+        segments = []
+        matcher = SequenceMatcher(None, representative.tokens, tokens, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                # keep away from the edits, the edges of the text are safe
+                start = 0 if i1 == 0 and j1 == 0 else margin
+                end = 0 if i2 == len(representative.tokens) and j2 == len(tokens) else margin
+                for k in range(i1 + start, i2 - end):
+                    shared[k] = j1 + k - i1
+            else:
+                segment = (max(j1 - margin, 0), min(j2 + margin, len(tokens)))
+                if segments and segment[0] - segments[-1][1] < self.min_gap:
+                    segments[-1] = (segments[-1][0], max(segments[-1][1], segment[1]))
+                else:
+                    segments.append(segment)
+
+        segments = [(start, end) for start, end in segments if start < end]
+        if self.mode == "segments":
+            # most of the document differs: annotate it in one go
+            if 2 * sum(end - start for start, end in segments) >= len(tokens):
+                segments = [(0, len(tokens))] if tokens else []
+            # merged segments cover shared tokens, they are annotated with the segment
+            covered = set()
+            for start, end in segments:
+                covered.update(range(start, end))
+            shared = {k: j for k, j in shared.items() if j not in covered}
+            self.n_annotated_tokens += sum(end - start for start, end in segments)
+        return shared, segments
+
+    def stats(self) -> dict:
+        """To get the number of skipped documents and tokens"""
+
+        return {
+            "n_docs": self.n_docs,
+            "n_representatives": self.n_docs - self.n_skipped,
+            "n_skipped": self.n_skipped,
+            "skipped_rate": self.n_skipped / self.n_docs if self.n_docs else 0.,
+            "n_tokens": self.n_tokens,
+            "n_annotated_tokens": self.n_annotated_tokens,
+            "annotated_tokens_rate": self.n_annotated_tokens / self.n_tokens if self.n_tokens else 0.,
+        }
+
+
+def shift_matches(
+    annotations: dict,
+    positions: dict
+) -> dict:
+    """To move the matches of annotations to other token positions,
+    matches with a token missing from `positions` are dropped
+
+    Parameters
+    ----------
+    annotations : dict
+        annotations in the format of `SkillExtractor.annotate`
+    positions : dict
+        old token position -> new token position
+
+    Returns
+    -------
+    dict
+        returns the `results` of the moved annotations
+    """
+
+    results = {}
+    for match_type in MATCH_TYPES:
+        results[match_type] = []
+        for match in annotations["results"][match_type]:
+            ids = match["doc_node_id"]
+            if all(i in positions for i in ids):
+                match = dict(match)
+                match["doc_node_id"] = [positions[i] for i in ids]
+                results[match_type].append(match)
+    return results
@@ -37,29 +37,96 @@ class FuzzyPhraseMatcher:
         self.skill_phrases = {}
         # first_char -> [skill_id]
         self.skill_index = defaultdict(list)
+        # (first_char, số token, số ký tự của phrase) -> [(thứ tự, skill_id)]
+        self.length_index = defaultdict(list)
+        # first_char -> các số token có trong index
+        self.token_counts = defaultdict(set)
+        # skill_id -> thứ tự trong bucket (giữ nguyên thứ tự match như trước)
+        self.skill_order = {}
+        # thứ tự của skill thêm tiếp theo
+        self.next_order = 0
 
         for skill_id, skill in skills_db.items():
-            phrase = skill["high_surfce_forms"]["full"].lower()
-            
-            # with open("debug_fuzzy.txt", "a", encoding="utf-8") as f:
-            #     f.write(f"Processing skill_id: {phrase}\n")
-                
-            tokens = phrase.split()
-            # with open("debug_fuzzy_token.txt", "a", encoding="utf-8") as f:
-            #     f.write(f"Processing skill_id:{skill_id} - {tokens}\n")
-            
-            # ❌ chỉ fuzzy multi-token
-            if len(tokens) <= 1:
-                continue
+            self.add_skill(skill_id, skill)
+
+    # ==============================
+    # Cập nhật index (apply_db_delta)
+    # ==============================
+
+    def add_skill(self, skill_id, skill, order=None):
+        """
+        Thêm một skill vào index (bỏ qua skill 1 token).
+
+        order: thứ tự của skill trong bucket, mặc định là sau mọi skill đã có.
+        Skill được sửa giữ lại thứ tự cũ (xem `remove_skill`), như khi build lại từ DB.
+        """
+        phrase = skill["high_surfce_forms"]["full"].lower()
+        tokens = phrase.split()
+
+        # ❌ chỉ fuzzy multi-token
+        if len(tokens) <= 1:
+            return
+
+        self.skill_tokens[skill_id] = tokens
+        self.skill_phrases[skill_id] = phrase
+
+        # index theo ký tự đầu của head token
+        first_char = tokens[0][0]
+        self.skill_index[first_char].append(skill_id)
+
+        # index theo độ dài: chỉ lấy candidate qua được Gate 2 / 2.5
+        if order is None:
+            order = self.next_order
+        self.next_order = max(self.next_order, order + 1)
+        self.skill_order[skill_id] = order
+        self.length_index[(first_char, len(tokens), len(phrase))].append(
+            (order, skill_id)
+        )
+        self.token_counts[first_char].add(len(tokens))
+
+    def remove_skill(self, skill_id):
+        """
+        Xoá một skill khỏi index.
 
-            self.skill_tokens[skill_id] = tokens
-            self.skill_phrases[skill_id] = phrase
+        Trả về thứ tự của skill (để thêm lại skill đã sửa ở đúng chỗ),
+        None nếu skill không có trong index (skill 1 token).
+        """
+        tokens = self.skill_tokens.pop(skill_id, None)
+        if tokens is None:
+            return None
+        phrase = self.skill_phrases.pop(skill_id)
+        order = self.skill_order.pop(skill_id)
+        first_char = tokens[0][0]
+
+        bucket = self.skill_index[first_char]
+        bucket.remove(skill_id)
+        if not bucket:
+            del self.skill_index[first_char]
 
-            # index theo ký tự đầu của head token
-            first_char = tokens[0][0]
-            # if "it" in phrase:
-            #     print("Indexing skill:", skill_id, "->", phrase, "under head char:", first_char)
-            self.skill_index[first_char].append(skill_id)
+        key = (first_char, len(tokens), len(phrase))
+        bucket = self.length_index[key]
+        bucket.remove((order, skill_id))
+        if not bucket:
+            del self.length_index[key]
+            # số token này không còn skill nào với ký tự đầu này
+            if not any(
+                other[0] == first_char and other[1] == len(tokens)
+                for other in self.length_index
+            ):
+                self.token_counts[first_char].discard(len(tokens))
+                if not self.token_counts[first_char]:
+                    del self.token_counts[first_char]
+        return order
+
+    # ==============================
+    # Pickling (matcher bundle)
+    # ==============================
+
+    def __getstate__(self):
+        """skills_db chỉ dùng khi build index -> không pickle"""
+        state = self.__dict__.copy()
+        state["skills_db"] = None
+        return state
 
     # ==============================
     # Utility gates
@@ -82,6 +149,39 @@ class FuzzyPhraseMatcher:
                 return False
         return True
 
+    def _max_char_diff(self, skill_len):
+        """Gate 2 + Gate 2.5: chênh lệch ký tự tối đa theo số token"""
+        if skill_len <= 3:
+            return min(self.max_char_diff, 3)
+        return self.max_char_diff
+
+    def _candidates(self, tokens, cum_len, i):
+        """
+        Candidate cho span bắt đầu tại token i:
+        chỉ các skill cùng ký tự đầu, vừa với text
+        và có độ dài phrase trong ngưỡng max_char_diff.
+        Thứ tự giống bucket theo ký tự đầu.
+        """
+        first_char = tokens[i][0]
+        text_len = len(tokens)
+
+        candidates = []
+        for skill_len in self.token_counts.get(first_char, ()):
+            j = i + skill_len
+            if j > text_len:
+                continue
+
+            # số ký tự của " ".join(tokens[i:j])
+            span_len = cum_len[j] - cum_len[i] + skill_len - 1
+            diff = self._max_char_diff(skill_len)
+            for phrase_len in range(span_len - diff, span_len + diff + 1):
+                candidates.extend(
+                    self.length_index.get((first_char, skill_len, phrase_len), ())
+                )
+
+        candidates.sort()
+        return [skill_id for _, skill_id in candidates]
+
     # ==============================
     # Main matcher
     # ==============================
@@ -91,6 +191,11 @@ class FuzzyPhraseMatcher:
 
         tokens = [str(tok).lower() for tok in text_obj]
         text_len = len(tokens)
+
+        # cum_len[k] = tổng số ký tự của tokens[:k]
+        cum_len = [0]
+        for token in tokens:
+            cum_len.append(cum_len[-1] + len(token))
         # print("Fuzzy matching at token index: ->", tokens)
 
         for i in range(text_len):
@@ -102,8 +207,8 @@ class FuzzyPhraseMatcher:
             if not head_token:
                 continue
             
-            # ===== Candidate pruning theo head-token =====
-            candidates = self.skill_index.get(head_token[0], [])
+            # ===== Candidate pruning theo head-token + độ dài =====
+            candidates = self._candidates(tokens, cum_len, i)
           
             if not candidates:
                 continue
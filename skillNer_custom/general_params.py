@@ -1,11 +1,9 @@
 # native packs
-import os
-import json
-from posixpath import dirname
+#
 # installed packs
 #
 # my packs
-from skillNer_custom.network.remote_db import RemoteBucket
+from skillNer_custom.db_registry import DB_REGISTRY
 
 # mapping skill and color
 SKILL_TO_COLOR = {
@@ -22,41 +20,13 @@ SKILL_TO_COLOR_TAILWIND = {
 }
 
 
-# init remote bucket to fetch db in case they don't exist locally
-bucket = RemoteBucket(
-    branch="master"
-)
-
-# load local data
-# else fetch remote data and save it
-try:
-    with open('skill_db_relax_20.json') as json_file:
-        SKILL_DB = json.load(json_file)
-    with open('job_db_relax_20.json') as json_file:
-        JOB_DB = json.load(json_file)
-except:
-    SKILL_DB = bucket.fetch_remote("SKILL_DB")
-    # dump data
-    with open('skill_db_relax_20.json', 'w') as fp:
-        json.dump(SKILL_DB, fp)
-    JOB_DB = bucket.fetch_remote("JOB_DB")
-    with open('job_db_relax_20.json', 'w') as fp:
-        json.dump(JOB_DB, fp)
+# dbs are loaded lazily on first access (see `DBRegistry`)
+# `from skillNer_custom.general_params import SKILL_DB` keeps working
+def __getattr__(name: str):
+    if name in ("SKILL_DB", "JOB_DB", "TOKEN_DIST", "TOKEN_DIST_JOB"):
+        return DB_REGISTRY.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# load token distribution dict
-try:
-    with open('token_dist_skill.json') as json_file:
-        TOKEN_DIST = json.load(json_file)
-    with open('token_dist_job.json') as json_file:
-        TOKEN_DIST_JOB = json.load(json_file)
-except:
-    TOKEN_DIST = bucket.fetch_remote("TOKEN_DIST")
-    # dump data
-    with open('token_dist_skill.json', 'w') as fp:
-        json.dump(TOKEN_DIST, fp)
-    TOKEN_DIST_JOB = bucket.fetch_remote("TOKEN_DIST_JOB")
-    with open('token_dist_job.json', 'w') as fp:
-        json.dump(TOKEN_DIST_JOB, fp)
 
 # list of punctuation
 LIST_PUNCTUATIONS = ['/', '·', ',', '.',
@@ -0,0 +1,199 @@
+# native packs
+import sys
+import json
+import weakref
+import functools
+from collections import OrderedDict
+# installed packs
+from nltk.stem import PorterStemmer
+# my packs
+#
+
+
+class LexicalCache:
+    """Process-wide memoization of stems and lemmas.
+
+    The vocabulary of job postings is very skewed: most words are repeats, so stems
+    are computed once and then read from a bounded LRU cache. A precomputed table
+    can be seeded from the skill db and `TOKEN_DIST` to avoid even the first computation.
+    Lemmas of whole phrases are memoized per nlp object.
+    """
+
+    def __init__(
+        self,
+        stemmer=None,
+        max_stems: int = 200000,
+        max_lemmas: int = 50000
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        stemmer : stemmer loaded from nltk, optional
+            the stemmer, by default PorterStemmer()
+        max_stems : int, optional
+            max number of stems kept in the LRU cache, by default 200000
+        max_lemmas : int, optional
+            max number of lemmed phrases kept per nlp, by default 50000
+
+        Examples
+        --------
+        >>> from skillNer_custom.lexical_cache import LEXICAL_CACHE
+        >>> LEXICAL_CACHE.stem("annotations")
+        'annot'
+        >>> LEXICAL_CACHE.stats()["stem_hit_rate"]
+        0.0
+        """
+
+        # params
+        self.stemmer = stemmer or PorterStemmer()
+        self.max_lemmas = max_lemmas
+
+        # precomputed stems: word -> stem
+        self.table = {}
+        self.table_hits = 0
+
+        # stems computed on the fly
+        self._cached_stem = functools.lru_cache(maxsize=max_stems)(self._stem)
+
+        # lemmed phrases of each nlp: nlp -> OrderedDict(text -> lemmed text)
+        self._lemmas = weakref.WeakKeyDictionary()
+        self.lemma_hits = 0
+        self.lemma_misses = 0
+        return
+
+    # stems
+    def _stem(
+        self,
+        word: str
+    ) -> str:
+        # interned: the same stem is shared by all the texts
+        return sys.intern(self.stemmer.stem(word))
+
+    def stem(
+        self,
+        word: str
+    ) -> str:
+        """To get the stem of a word"""
+
+        stem = self.table.get(word)
+        if stem is not None:
+            self.table_hits += 1
+            return stem
+        return self._cached_stem(word)
+
+    def stem_text(
+        self,
+        text: str
+    ) -> str:
+        """To stem a text word by word, same as `cleaner.stem_text`"""
+
+        stem = self.stem
+        return " ".join([stem(word) for word in text.split(" ")])
+
+    # lemmas
+    def lem_text(
+        self,
+        text: str,
+        nlp
+    ) -> str:
+        """To lem a text with nlp, same as `cleaner.lem_text`"""
+
+        lemmas = self._lemmas.get(nlp)
+        if lemmas is None:
+            lemmas = self._lemmas[nlp] = OrderedDict()
+
+        lemmed = lemmas.get(text)
+        if lemmed is not None:
+            self.lemma_hits += 1
+            lemmas.move_to_end(text)
+            return lemmed
+
+        self.lemma_misses += 1
+        lemmed = " ".join([token.lemma_ for token in nlp(text)])
+        lemmas[text] = lemmed
+        if len(lemmas) > self.max_lemmas:
+            lemmas.popitem(last=False)
+        return lemmed
+
+    # precomputed table
+    def seed(
+        self,
+        words
+    ):
+        """To precompute the stems of words"""
+
+        for word in words:
+            if word not in self.table:
+                self.table[sys.intern(word)] = self._stem(word)
+
+    def seed_from_skill_db(
+        self,
+        skills_db: dict
+    ):
+        """To precompute the stems of the words of the skills of a db"""
+
+        words = set()
+        for skill in skills_db.values():
+            for form in skill["high_surfce_forms"].values():
+                words.update(form.lower().split(" "))
+        self.seed(sorted(words))
+
+    def seed_from_token_dist(
+        self,
+        token_dist: dict
+    ):
+        """To precompute the stems of the tokens of a token distribution, e.g. `TOKEN_DIST`"""
+
+        self.seed(token_dist.keys())
+
+    def save_table(
+        self,
+        path: str
+    ):
+        """To save the precomputed stems as json"""
+
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.table, fp, ensure_ascii=False)
+
+    def load_table(
+        self,
+        path: str
+    ):
+        """To load precomputed stems saved with `.save_table()`"""
+
+        with open(path, encoding="utf-8") as fp:
+            table = json.load(fp)
+        self.table.update(
+            (sys.intern(word), sys.intern(stem)) for word, stem in table.items())
+
+    # stats
+    def stats(self) -> dict:
+        """To get the hit / miss counts of the caches"""
+
+        info = self._cached_stem.cache_info()
+        stem_lookups = self.table_hits + info.hits + info.misses
+        lemma_lookups = self.lemma_hits + self.lemma_misses
+        return {
+            "table_size": len(self.table),
+            "table_hits": self.table_hits,
+            "stem_cache_hits": info.hits,
+            "stem_cache_misses": info.misses,
+            "stem_cache_size": info.currsize,
+            "stem_hit_rate": (self.table_hits + info.hits) / stem_lookups if stem_lookups else 0.,
+            "lemma_hits": self.lemma_hits,
+            "lemma_misses": self.lemma_misses,
+            "lemma_hit_rate": self.lemma_hits / lemma_lookups if lemma_lookups else 0.,
+        }
+
+    def clear(self):
+        """To drop all cached and precomputed forms"""
+
+        self.table.clear()
+        self._cached_stem.cache_clear()
+        self._lemmas = weakref.WeakKeyDictionary()
+        self.table_hits = self.lemma_hits = self.lemma_misses = 0
+
+
+# cache shared by `Text`, `cleaner` and `skills_processor`
+LEXICAL_CACHE = LexicalCache()
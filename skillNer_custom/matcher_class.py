@@ -42,6 +42,14 @@ class Matchers:
             'low_form_matcher': self.get_low_form_matcher,
             'token_matcher': self.get_token_matcher,
         }
+        # patterns of a skill in each matcher, see `.update_matcher()`
+        self.dict_patterns = {
+            'full_matcher': self.full_patterns,
+            'abv_matcher': self.abv_patterns,
+            'full_uni_matcher': self.full_uni_patterns,
+            'low_form_matcher': self.low_form_patterns,
+            'token_matcher': self.token_patterns,
+        }
 
         return
 
@@ -112,115 +120,119 @@ class Matchers:
     # matchers
     # high confident matchers
     def get_full_matcher(self):
-        # params
-        nlp = self.nlp
-        skills_db = self.skills_db
-        full_matcher = self.phraseMatcher(nlp.vocab, attr="LOWER")
-
-        # populate matcher
-        for key in skills_db:
-            # get skill info
-            skill_id = key
-
-            skill_len = skills_db[key]['skill_len']
-            if skill_len > 1:
-                skill_full_name = skills_db[key]['high_surfce_forms']['full']
-                # add to matcher
-                skill_full_name_spacy = nlp.make_doc(skill_full_name)
-                full_matcher.add(str(skill_id), [skill_full_name_spacy])
-
-        return full_matcher
+        return self._build_matcher(self.full_patterns)
 
     def get_abv_matcher(self):
-        # params
-        nlp = self.nlp
-        skills_db = self.skills_db
-        abv_matcher = self.phraseMatcher(nlp.vocab, attr="LOWER")
-
-        # populate matcher
-        for key in skills_db:
-            # get skill info
-            skill_id = key
-            # check if there is a skill abrv
-            if 'abv' in skills_db[key]['high_surfce_forms'].keys():
-                skill_abv = skills_db[key]['high_surfce_forms']['abv']
-                skill_abv_spacy = nlp.make_doc(skill_abv)
-                abv_matcher.add(str(skill_id), [skill_abv_spacy])
-
-        return abv_matcher
+        return self._build_matcher(self.abv_patterns)
 
     def get_full_uni_matcher(self):
-        # params
-        nlp = self.nlp
-        skills_db = self.skills_db
-        full_uni_matcher = self.phraseMatcher(nlp.vocab, attr="LOWER")
-
-        # populate matcher
-        for key in skills_db:
-            # get skill info
-            skill_id = key
-
-            skill_len = skills_db[key]['skill_len']
-            if skill_len == 1:
-                skill_full_name = skills_db[key]['high_surfce_forms']['full']
-                # add to matcher
-                skill_full_name_spacy = nlp.make_doc(skill_full_name)
-                full_uni_matcher.add(str(skill_id), [skill_full_name_spacy])
-
-        return full_uni_matcher
+        return self._build_matcher(self.full_uni_patterns)
 
     # low confident matchers
     def get_low_form_matcher(self):
-        # params
-        nlp = self.nlp
-        skills_db = self.skills_db
-        low_form_matcher = self.phraseMatcher(nlp.vocab, attr="LOWER")
-
-        # populate matcher
-        for key in skills_db:
-
-            # get skill info
-            skill_id = key
-            skill_len = skills_db[key]['skill_len']
-
-            low_surface_forms = skills_db[key]['low_surface_forms']
-            for form in low_surface_forms:
-                skill_form_spacy = nlp.make_doc(form)
-                low_form_matcher.add(str(skill_id), [skill_form_spacy])
-        return low_form_matcher
+        return self._build_matcher(self.low_form_patterns)
 
     def get_token_matcher(self):
-        # params
+        return self._build_matcher(self.token_patterns)
+
+    # patterns of a skill in each matcher
+    @staticmethod
+    def full_patterns(skill: dict) -> List[str]:
+        if skill['skill_len'] > 1:
+            return [skill['high_surfce_forms']['full']]
+        return []
+
+    @staticmethod
+    def abv_patterns(skill: dict) -> List[str]:
+        # check if there is a skill abrv
+        if 'abv' in skill['high_surfce_forms'].keys():
+            return [skill['high_surfce_forms']['abv']]
+        return []
+
+    @staticmethod
+    def full_uni_patterns(skill: dict) -> List[str]:
+        if skill['skill_len'] == 1:
+            return [skill['high_surfce_forms']['full']]
+        return []
+
+    @staticmethod
+    def low_form_patterns(skill: dict) -> List[str]:
+        return list(skill['low_surface_forms'])
+
+    @staticmethod
+    def token_patterns(skill: dict) -> List[str]:
+        # check if skill accept matches on its unique tokens
+        if not skill['match_on_tokens']:
+            return []
+        # digits are not matched alone
+        return [
+            token for token in skill['high_surfce_forms']['full'].split(' ')
+            if not token.isdigit()
+        ]
+
+    def _add_skills(
+        self,
+        matcher,
+        get_patterns,
+        skills
+    ):
+        # skills: (skill_id, skill) pairs, all the patterns of a skill are added under its id
         nlp = self.nlp
-        skills_db = self.skills_db
-        token_matcher = self.phraseMatcher(nlp.vocab, attr="LOWER")
+        for skill_id, skill in skills:
+            patterns = get_patterns(skill)
+            if patterns:
+                matcher.add(str(skill_id), [nlp.make_doc(pattern) for pattern in patterns])
 
-        # populate matcher
-        for key in skills_db:
-            # get skill info
-            skill_id = key
-            match_on_tokens = skills_db[key]['match_on_tokens']
+    def _build_matcher(self, get_patterns):
+        matcher = self.phraseMatcher(self.nlp.vocab, attr="LOWER")
+        self._add_skills(matcher, get_patterns, self.skills_db.items())
+        return matcher
 
-            if match_on_tokens:  # check if skill accept matches on its unique tokens
-                skill_lemmed = skills_db[key]['high_surfce_forms']['full']
-                skill_lemmed_tokens = skill_lemmed.split(' ')
+    def update_matcher(
+        self,
+        matcher_name: str,
+        matcher,
+        removed: List[str],
+        added: dict
+    ):
+        """To patch a loaded matcher in place: the patterns of the `removed` skills are
+        removed, the patterns of the `added` skills are added (changed skills are in both)
 
-                # add tokens to matcher
-                for token in skill_lemmed_tokens:
-                    # give id that ref 1_gram matching
-                    if token.isdigit():
-                        pass
-                    else:
-                        id_ = skill_id
-                        token_matcher.add(str(id_), [nlp.make_doc(token)])
+        Parameters
+        ----------
+        matcher_name : str
+            name of the matcher, a key of `.load_matchers()`
+        matcher : [type]
+            the loaded matcher
+        removed : List[str]
+            ids of the skills to remove
+        added : dict
+            skill id -> skill, the skills to add
+        """
 
-        return token_matcher
+        for skill_id in removed:
+            if str(skill_id) in matcher:
+                matcher.remove(str(skill_id))
+        self._add_skills(matcher, self.dict_patterns[matcher_name], added.items())
 
 
 class SkillsGetter:
     """Class that gather functions to get the matched skills.
+
+    The text is parsed only once (in `Text`). Matchers run on tokenizer-only
+    views of the text (lemmed, stemmed, abv, ...) built with `nlp.make_doc`.
+    Since all matchers rely on the `LOWER` attribute, which is set by the
+    tokenizer, the matches are the same as when running the full pipeline.
     """
 
+    # how to get the string of each view from a text object
+    dict_views = {
+        "transformed": lambda text_obj: text_obj.transformed_text,
+        "abv": lambda text_obj: text_obj.abv_text,
+        "lemmed": lambda text_obj: text_obj.lemmed(),
+        "stemmed": lambda text_obj: text_obj.stemmed(),
+    }
+
     def __init__(
         self,
         nlp
@@ -230,6 +242,33 @@ class SkillsGetter:
         self.nlp = nlp
         return
 
+    def get_view(
+        self,
+        text_obj: Text,
+        view_name: str
+    ):
+        """To get a tokenized view of the text. Views are cached in the text object
+        so that a view shared by several matchers is tokenized once.
+
+        Parameters
+        ----------
+        text_obj : Text
+            the text object
+        view_name : str
+            name of the view, one of the keys of `SkillsGetter.dict_views`
+
+        Returns
+        -------
+        spacy.tokens.Doc
+            returns the tokenized view
+        """
+
+        if view_name not in text_obj.views:
+            view_text = self.dict_views[view_name](text_obj)
+            text_obj.views[view_name] = self.nlp.make_doc(view_text)
+
+        return text_obj.views[view_name]
+
     def get_full_match_skills(
         self,
         text_obj: Text,
@@ -237,7 +276,7 @@ class SkillsGetter:
     ):
 
         skills = []
-        doc = self.nlp(text_obj.lemmed())
+        doc = self.get_view(text_obj, "lemmed")
 
         for match_id, start, end in matcher(doc):
             id_ = matcher.vocab.strings[match_id]
@@ -260,7 +299,7 @@ class SkillsGetter:
     ):
         skills = []
 
-        doc = self.nlp(text_obj.abv_text)
+        doc = self.get_view(text_obj, "abv")
         for match_id, start, end in matcher(doc):
             id_ = matcher.vocab.strings[match_id]
             if text_obj[start].is_matchable:
@@ -283,7 +322,7 @@ class SkillsGetter:
 
         skills = []
 
-        doc = self.nlp(text_obj.transformed_text)
+        doc = self.get_view(text_obj, "transformed")
         for match_id, start, end in matcher(doc):
             id_ = matcher.vocab.strings[match_id]
             if text_obj[start].is_matchable:
@@ -306,7 +345,7 @@ class SkillsGetter:
         sub_matches = []
         full_matches = []
 
-        doc = self.nlp(text_obj.lemmed())
+        doc = self.get_view(text_obj, "lemmed")
         for match_id, start, end in matcher(doc):
             id_ = matcher.vocab.strings[match_id]
 
@@ -326,7 +365,7 @@ class SkillsGetter:
     ):
 
         skills = []
-        doc = self.nlp(text_obj.stemmed())
+        doc = self.get_view(text_obj, "stemmed")
 
         for match_id, start, end in matcher(doc):
             id_ = matcher.vocab.strings[match_id]
@@ -1,5 +1,7 @@
 # native packs
-import requests
+#
+# installed packs
+# requests is imported when fetching, so that importing this module is cheap
 
 
 MAPPING_NAME_URL = {
@@ -64,6 +66,8 @@ class RemoteBucket:
         >>> buckets.fetch_remote("SKILL_DB")
         ...
         """
+        import requests
+
         # request props
         url = f"{self.end_point}/{MAPPING_NAME_URL[db_name]}"
 
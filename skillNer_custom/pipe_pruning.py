@@ -0,0 +1,352 @@
+# native packs
+import time
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+# installed packs
+import numpy as np
+# my packs
+#
+
+
+# attributes of the pattern / attrs keys of the attribute ruler
+PATTERN_ATTRS = {
+    "TAG": "token.tag",
+    "POS": "token.pos",
+    "MORPH": "token.morph",
+    "LEMMA": "token.lemma",
+    "DEP": "token.dep",
+    "HEAD": "token.head",
+    "ENT_TYPE": "token.ent_type",
+    "ENT_IOB": "token.ent_iob",
+    "SENT_START": "token.is_sent_start",
+    "IS_SENT_START": "token.is_sent_start",
+    "NORM": "token.norm",
+}
+# pattern keys read from the vocab: no component is needed to match them
+LEXICAL_KEYS = {
+    "ORTH", "TEXT", "LOWER", "SHAPE", "PREFIX", "SUFFIX", "LENGTH", "OP",
+    "IS_ALPHA", "IS_ASCII", "IS_DIGIT", "IS_LOWER", "IS_UPPER", "IS_TITLE", "IS_PUNCT",
+    "IS_SPACE", "IS_STOP", "LIKE_NUM", "LIKE_URL", "LIKE_EMAIL",
+}
+
+# sample texts the pruned pipeline is checked on: job posting sentences, raw and transformed
+VERIFY_TEXTS = [
+    "We are looking for a Senior Python Developer with strong experience in AWS, Docker and CI/CD.",
+    "You will be responsible for managing our clients' data pipelines and reporting to the CTO.",
+    "Fluency in both English and French is mandatory; knowledge of SQL is a plus!",
+    "the candidate has 3+ years of experience designing machine learning models and leading teams",
+    "skills required project management agile scrum microsoft excel customer service",
+]
+
+
+def extractor_targets(nlp) -> Tuple[str, ...]:
+    """Attributes of the parsed docs read by `SkillExtractor`
+
+    Returns
+    -------
+    Tuple[str, ...]
+        returns the lemmas, and the tensor when the similarities of `Utils` come from it
+        (the vocab has no static vectors). `is_stop` is lexical: no component sets it.
+    """
+
+    if nlp.vocab.vectors.size:
+        return ("token.lemma",)
+    return ("token.lemma", "doc.tensor")
+
+
+class PrunedPipeline:
+    """The nlp with some components disabled, behaves like the nlp.
+
+    Components are disabled per call (`nlp(text, disable=...)`, `nlp.pipe(texts, disable=...)`):
+    the nlp itself is not modified and can still be used with all its components.
+    """
+
+    def __init__(
+        self,
+        nlp,
+        disable: Sequence[str]
+    ):
+        # params
+        self._nlp = nlp
+        self.disable = list(disable)
+
+    @property
+    def active_pipes(self) -> List[str]:
+        return [name for name in self._nlp.pipe_names if name not in self.disable]
+
+    def __call__(self, text, **kwargs):
+        return self._nlp(text, disable=self.disable + list(kwargs.pop("disable", [])), **kwargs)
+
+    def pipe(self, texts, **kwargs):
+        return self._nlp.pipe(texts, disable=self.disable + list(kwargs.pop("disable", [])), **kwargs)
+
+    def __getattr__(self, attr):
+        # `_nlp` is not set yet while unpickling: no delegation for it and the special names
+        if attr == "_nlp" or (attr.startswith("__") and attr.endswith("__")):
+            raise AttributeError(attr)
+        return getattr(self._nlp, attr)
+
+    def __reduce__(self):
+        return (PrunedPipeline, (self._nlp, self.disable))
+
+    def __repr__(self) -> str:
+        return f"PrunedPipeline({self.active_pipes})"
+
+
+def _unwrap(nlp) -> Tuple[object, List[str]]:
+    # the nlp and the components disabled beforehand
+    if isinstance(nlp, PrunedPipeline):
+        return nlp._nlp, list(nlp.disable)
+    return nlp, []
+
+
+def _pattern_attrs(keys: Iterable[str]) -> Optional[Set[str]]:
+    # None when a key is not known: the component may read / write anything
+    attrs = set()
+    for key in keys:
+        key = str(key).upper()
+        if key in PATTERN_ATTRS:
+            attrs.add(PATTERN_ATTRS[key])
+        elif key not in LEXICAL_KEYS:
+            return None
+    return attrs
+
+
+def component_dependencies(
+    nlp,
+    name: str
+) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+    """To get the attributes a component assigns and requires.
+
+    The factory meta is completed for the components which do not declare
+    their dependencies: the rule lemmatizer reads the pos and morph, the attribute
+    ruler reads and writes the attributes of its patterns.
+
+    Returns
+    -------
+    Tuple[Optional[Set[str]], Optional[Set[str]]]
+        returns the assigned and required attributes, None when they are not known
+    """
+
+    meta = nlp.get_pipe_meta(name)
+    proc = nlp.get_pipe(name)
+    assigns = set(meta.assigns)
+    requires = set(meta.requires)
+
+    if meta.factory == "lemmatizer":
+        mode = getattr(proc, "mode", "rule")
+        if mode == "rule":
+            requires |= {"token.pos", "token.morph"}
+        elif mode == "pos_lookup":
+            requires.add("token.pos")
+        elif mode != "lookup":
+            return assigns, None
+
+    elif meta.factory == "attribute_ruler":
+        pattern_keys = set()
+        attr_keys = set()
+        for pattern in proc.patterns:
+            for token_patterns in pattern["patterns"]:
+                for token_pattern in token_patterns:
+                    pattern_keys.update(token_pattern)
+            attr_keys.update(pattern["attrs"])
+        pattern_attrs = _pattern_attrs(pattern_keys)
+        attrs = _pattern_attrs(attr_keys)
+        return (None if attrs is None else assigns | attrs,
+                None if pattern_attrs is None else requires | pattern_attrs)
+
+    # components of unknown effects are kept with everything before them
+    if not assigns:
+        return None, None
+    return assigns, requires
+
+
+def required_pipes(
+    nlp,
+    targets: Sequence[str]
+) -> List[str]:
+    """To get the components needed to compute some attributes, e.g. `("token.lemma",)`
+
+    Components are walked from the last one: a component is needed when it assigns a needed
+    attribute (or when its effects are not known), its requirements are needed in turn.
+    Embedding layers (tok2vec, transformer) are needed by the components listening to them.
+
+    Parameters
+    ----------
+    nlp : [type]
+        An NLP object instanciated from Spacy, or a `PrunedPipeline`
+    targets : Sequence[str]
+        the needed attributes, e.g. "token.lemma", "doc.tensor"
+
+    Returns
+    -------
+    List[str]
+        returns the names of the needed components, in the order of the pipeline
+    """
+
+    nlp, disabled = _unwrap(nlp)
+    names = [name for name in nlp.pipe_names if name not in disabled]
+
+    needed = set(targets)
+    keep = set()
+    keep_all = False
+    for name in reversed(names):
+        if keep_all:
+            keep.add(name)
+            continue
+        assigns, requires = component_dependencies(nlp, name)
+        if assigns is None or assigns & needed:
+            keep.add(name)
+            if requires is None:
+                keep_all = True
+            else:
+                needed |= requires
+
+    # shared embedding layers
+    changed = True
+    while changed:
+        changed = False
+        for name in names:
+            listeners = getattr(nlp.get_pipe(name), "listening_components", None) or []
+            if name not in keep and keep.intersection(listeners):
+                keep.add(name)
+                changed = True
+
+    return [name for name in names if name in keep]
+
+
+def _same_docs(
+    docs: list,
+    pruned_docs: list,
+    targets: Sequence[str]
+) -> bool:
+    for doc, pruned_doc in zip(docs, pruned_docs):
+        if [t.text for t in doc] != [t.text for t in pruned_doc]:
+            return False
+        if "token.lemma" in targets and [t.lemma_ for t in doc] != [t.lemma_ for t in pruned_doc]:
+            return False
+        if [t.is_stop for t in doc] != [t.is_stop for t in pruned_doc]:
+            return False
+        if "doc.tensor" in targets:
+            if doc.tensor.shape != pruned_doc.tensor.shape:
+                return False
+            if doc.tensor.size and not np.allclose(doc.tensor, pruned_doc.tensor, atol=1e-6):
+                return False
+    return True
+
+
+def _samples(texts: Optional[Sequence[str]]) -> List[str]:
+    # texts as given, and as parsed by `Text` (cleaned, lower cased)
+    from skillNer_custom.text_class import Text
+
+    texts = list(texts or VERIFY_TEXTS)
+    return texts + [Text.transform(text) for text in texts]
+
+
+def pruning_report(
+    nlp,
+    targets: Optional[Sequence[str]] = None,
+    texts: Optional[Sequence[str]] = None,
+    repeat: int = 3
+) -> dict:
+    """To compare the full and the pruned pipeline on texts
+
+    Parameters
+    ----------
+    nlp : [type]
+        An NLP object instanciated from Spacy, or a `PrunedPipeline`
+    targets : Sequence[str], optional
+        the needed attributes, by default the ones of `SkillExtractor` (see `extractor_targets`)
+    texts : Sequence[str], optional
+        texts to parse, by default `VERIFY_TEXTS`
+    repeat : int, optional
+        repeats of the timing, the best time is kept, by default 3
+
+    Returns
+    -------
+    dict
+        returns the components kept and disabled, whether the needed attributes are identical,
+        the parse time of both pipelines and the speedup
+
+    Examples
+    --------
+    >>> from skillNer_custom.pipe_pruning import pruning_report
+    >>> pruning_report(spacy.load("en_core_web_lg"), texts=postings)
+    {'kept': ['tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer'], 'disabled': ['parser', 'senter', 'ner'],
+     'identical': True, 'full_seconds': 3.1, 'pruned_seconds': 1.2, 'speedup': 2.6}
+    """
+
+    base, disabled = _unwrap(nlp)
+    targets = tuple(targets or extractor_targets(base))
+    kept = required_pipes(nlp, targets)
+    pruned_disable = [name for name in base.pipe_names if name not in kept]
+    texts = _samples(texts)
+
+    def parse(disable):
+        best, docs = float("inf"), None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            docs = list(base.pipe(texts, disable=disable))
+            best = min(best, time.perf_counter() - start)
+        return best, docs
+
+    full_seconds, docs = parse(disabled)
+    pruned_seconds, pruned_docs = parse(pruned_disable)
+    return {
+        "kept": kept,
+        "disabled": [name for name in pruned_disable if name not in disabled],
+        "identical": _same_docs(docs, pruned_docs, targets),
+        "full_seconds": full_seconds,
+        "pruned_seconds": pruned_seconds,
+        "speedup": full_seconds / pruned_seconds if pruned_seconds else 1.,
+    }
+
+
+def prune_pipeline(
+    nlp,
+    targets: Optional[Sequence[str]] = None,
+    texts: Optional[Sequence[str]] = None,
+    verify: bool = True
+):
+    """To get the nlp running only the components needed for some attributes
+
+    Parameters
+    ----------
+    nlp : [type]
+        An NLP object instanciated from Spacy, or a `PrunedPipeline`
+    targets : Sequence[str], optional
+        the needed attributes, by default the ones of `SkillExtractor` (see `extractor_targets`)
+    texts : Sequence[str], optional
+        texts the pruned pipeline is checked on, by default `VERIFY_TEXTS`
+    verify : bool, optional
+        whether to check that the needed attributes are identical with and without pruning,
+        the nlp is returned as is when they differ, by default True
+
+    Returns
+    -------
+    PrunedPipeline | nlp
+        returns the pruned pipeline, or `nlp` when no component can be disabled
+
+    Examples
+    --------
+    >>> from skillNer_custom.pipe_pruning import prune_pipeline
+    >>> nlp = prune_pipeline(spacy.load("en_core_web_lg"))
+    >>> nlp
+    PrunedPipeline(['tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer'])
+    """
+
+    base, disabled = _unwrap(nlp)
+    targets = tuple(targets or extractor_targets(base))
+    kept = required_pipes(nlp, targets)
+    pruned_disable = [name for name in base.pipe_names if name not in kept]
+    if len(pruned_disable) == len(disabled):
+        return nlp
+
+    if verify:
+        samples = _samples(texts)
+        docs = list(base.pipe(samples, disable=disabled))
+        pruned_docs = list(base.pipe(samples, disable=pruned_disable))
+        if not _same_docs(docs, pruned_docs, targets):
+            print(f"pipeline not pruned: disabling {pruned_disable} changes {list(targets)}")
+            return nlp
+
+    return PrunedPipeline(base, pruned_disable)
@@ -0,0 +1,155 @@
+# native packs
+import gc
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Union
+# installed packs
+#
+# my packs
+#
+
+
+def freeze() -> int:
+    """To move the objects built so far out of the garbage collector, before forking workers.
+
+    A collection of the garbage collector writes to the header of every tracked object:
+    in forked workers, this copies the pages of the objects inherited from the parent
+    (skill db, fuzzy index, nlp) although they are never modified. Frozen objects are not
+    visited by the collector anymore, their pages stay shared with the parent.
+
+    Returns
+    -------
+    int
+        returns the number of frozen objects
+    """
+
+    # garbage is collected first: it would be kept alive forever otherwise
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+def preload(
+    initializer: Callable,
+    initargs: tuple = ()
+) -> int:
+    """To build the extractor once in the parent process, see `fork_executor`.
+
+    The collector is disabled while the initializer builds the extractor, so no collection
+    runs between the allocations and the freeze, then everything is frozen (see `freeze`)
+    and the collector is restored. Workers forked afterwards share the extractor with the
+    parent instead of building their own.
+
+    Parameters
+    ----------
+    initializer : Callable
+        builds the extractor of the process, e.g. `cli._init_worker`
+    initargs : tuple, optional
+        arguments of the initializer, e.g. `(config,)`
+
+    Returns
+    -------
+    int
+        returns the number of frozen objects
+
+    Examples
+    --------
+    >>> from skillNer_custom import cli
+    >>> from skillNer_custom.preload import preload, post_fork
+    >>> # gunicorn-style servers: build in the master, e.g. in `on_starting`
+    >>> preload(cli._init_worker, (config,))
+    >>> # then re-enable the collector in each worker, e.g. in `post_fork`
+    >>> post_fork()
+    """
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        initializer(*initargs)
+    finally:
+        n_frozen = freeze()
+        # frozen objects are out of later collections: the parent collects its own garbage
+        if was_enabled:
+            gc.enable()
+    # stdout may be the output of the cli
+    print(f"preloaded the skill extractor, {n_frozen} objects frozen", file=sys.stderr)
+    return n_frozen
+
+
+def post_fork(server=None, worker=None):
+    """To re-enable the garbage collector in a worker forked after `preload`,
+    the arguments are the ones of the `post_fork` hook of gunicorn"""
+
+    gc.enable()
+
+
+def fork_executor(
+    workers: int,
+    initializer: Callable,
+    initargs: tuple = ()
+) -> ProcessPoolExecutor:
+    """To get a pool of worker processes sharing an extractor preloaded in this process
+
+    Parameters
+    ----------
+    workers : int
+        number of worker processes
+    initializer : Callable
+        builds the extractor, run once in this process (see `preload`)
+    initargs : tuple, optional
+        arguments of the initializer
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        returns the pool, its workers are forked from this process
+
+    Raises
+    ------
+    ValueError
+        if processes cannot be forked on this platform (e.g. Windows)
+    """
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise ValueError("preloading needs worker processes started with fork")
+
+    preload(initializer, initargs)
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=post_fork,
+    )
+
+
+def memory_usage(pid: Union[int, str] = "self") -> dict:
+    """To get the memory of a process, from `/proc/<pid>/smaps_rollup` (Linux)
+
+    The resident memory (RSS) counts the pages shared with other processes in full, the
+    proportional memory (PSS) divides them by the number of processes sharing them:
+    the PSS of the workers of a pool adds up to the memory they actually use.
+
+    Parameters
+    ----------
+    pid : int | str, optional
+        id of the process, by default the current process
+
+    Returns
+    -------
+    dict
+        returns the rss, pss, shared and private memory in MB
+    """
+
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as fp:
+        for line in fp:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+
+    return {
+        "rss_mb": fields["Rss"] / 1024,
+        "pss_mb": fields["Pss"] / 1024,
+        "shared_mb": (fields["Shared_Clean"] + fields["Shared_Dirty"]) / 1024,
+        "private_mb": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+    }
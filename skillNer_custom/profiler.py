@@ -0,0 +1,249 @@
+# native packs
+import time
+from collections import defaultdict
+from typing import Callable, List, Optional
+# installed packs
+import numpy as np
+# my packs
+#
+
+
+# bins of the latency histograms, in seconds
+LATENCY_BINS = [0, 1e-4, 1e-3, 1e-2, 1e-1, 1, float("inf")]
+LATENCY_LABELS = ["<0.1ms", "0.1-1ms", "1-10ms", "10-100ms", "0.1-1s", ">1s"]
+
+# bins of the size histograms (e.g. conflict-cluster sizes)
+SIZE_BINS = [1, 2, 3, 5, 9, 17, float("inf")]
+SIZE_LABELS = ["1", "2", "3-4", "5-8", "9-16", ">16"]
+
+# bins of the count histograms (e.g. candidates of a stage per document), documents can have none
+COUNT_BINS = [0] + SIZE_BINS
+COUNT_LABELS = ["0"] + SIZE_LABELS
+
+
+class DocRecord:
+    """Measures of the annotation of one document.
+
+    - `stages`: wall time of each stage, in seconds
+    - `counts`: counters, e.g. the number of candidates of each matcher
+    - `sizes`: distributions, e.g. the size of the conflict clusters
+    """
+
+    __slots__ = ("profiler", "stages", "counts", "sizes", "_last")
+
+    def __init__(
+        self,
+        profiler: "Profiler"
+    ):
+        self.profiler = profiler
+        self.stages = {}
+        self.counts = {}
+        self.sizes = defaultdict(list)
+        self._last = time.perf_counter()
+
+    def lap(
+        self,
+        stage: str,
+        count: Optional[int] = None
+    ):
+        """To close a stage: its time is the time elapsed since the previous lap.
+        `count` is stored as the count of the stage (e.g. number of matches)."""
+
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.) + now - self._last
+        self._last = now
+        if count is not None:
+            self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def count(
+        self,
+        name: str,
+        n: int = 1
+    ):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_sizes(
+        self,
+        name: str,
+        sizes: List[int]
+    ):
+        self.sizes[name].extend(sizes)
+
+    def finish(self):
+        """To hand the record to the profiler, once the document is annotated"""
+        self.profiler._collect(self)
+
+
+class _NullRecord:
+    """Record used when profiling is disabled: every measure is a no-op."""
+
+    __slots__ = ()
+
+    def lap(self, stage, count=None):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def add_sizes(self, name, sizes):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_RECORD = _NullRecord()
+
+
+def _summary(values: list, bins: list, labels: list) -> dict:
+    values = np.asarray(values, dtype=float)
+    histogram, _ = np.histogram(values, bins=bins)
+    return {
+        "count": int(values.size),
+        "total": float(values.sum()),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+        "histogram": dict(zip(labels, histogram.tolist())),
+    }
+
+
+class Profiler:
+    """Opt-in instrumentation of `SkillExtractor`.
+
+    Each annotated document produces a `DocRecord` with the wall time of each stage
+    (translation, text, fuzzy, full, abv, full_uni, low, token, n_gram), the number
+    of candidates of each matcher and the size of the conflict clusters.
+    Records are passed to the callbacks and aggregated in `.report()`.
+    """
+
+    def __init__(
+        self,
+        callbacks: List[Callable[[DocRecord], None]] = [],
+        keep_records: bool = True
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        callbacks : List[Callable[[DocRecord], None]], optional
+            functions called with the record of each annotated document, by default []
+        keep_records : bool, optional
+            whether to keep the measures for `.report()`, by default True
+
+        Examples
+        --------
+        >>> from skillNer_custom.profiler import Profiler
+        >>> profiler = Profiler()
+        >>> skill_extractor = SkillExtractor(nlp, SKILL_DB, PhraseMatcher, profiler=profiler)
+        >>> for annotations in skill_extractor.annotate_batch(texts):
+        ...     pass
+        >>> profiler.print_report()
+        stage            count   mean ms    p50 ms    p90 ms    p99 ms    max ms
+        text               157     2.913     2.460     4.871     8.530    10.214
+        ...
+        """
+
+        # params
+        self.callbacks = list(callbacks)
+        self.keep_records = keep_records
+
+        # cache name -> function returning the stats of the cache
+        self.caches = {}
+        self.reset()
+        return
+
+    def reset(self):
+        """To drop the measures collected so far"""
+
+        self.n_docs = 0
+        self.stages = defaultdict(list)
+        self.counts = defaultdict(list)
+        self.sizes = defaultdict(list)
+
+    def add_callback(
+        self,
+        callback: Callable[[DocRecord], None]
+    ):
+        self.callbacks.append(callback)
+
+    def watch_cache(
+        self,
+        name: str,
+        get_stats: Callable[[], dict]
+    ):
+        """To include the stats of a cache (hits, misses, ...) in the report"""
+        self.caches[name] = get_stats
+
+    def start(self) -> DocRecord:
+        """To start measuring the annotation of a document"""
+        return DocRecord(self)
+
+    def _collect(
+        self,
+        record: DocRecord
+    ):
+        self.n_docs += 1
+        if self.keep_records:
+            for stage, elapsed in record.stages.items():
+                self.stages[stage].append(elapsed)
+            for name, n in record.counts.items():
+                self.counts[name].append(n)
+            for name, sizes in record.sizes.items():
+                self.sizes[name].extend(sizes)
+
+        for callback in self.callbacks:
+            callback(record)
+
+    def report(self) -> dict:
+        """To aggregate the measures over the documents annotated so far
+
+        Returns
+        -------
+        dict
+            returns the percentiles and histogram of each stage time (in seconds),
+            of each count (per document) and size, and the stats of the watched caches
+        """
+
+        return {
+            "n_docs": self.n_docs,
+            "stages": {
+                stage: _summary(values, LATENCY_BINS, LATENCY_LABELS)
+                for stage, values in self.stages.items()
+            },
+            "counts": {
+                name: _summary(values, COUNT_BINS, COUNT_LABELS)
+                for name, values in self.counts.items()
+            },
+            "sizes": {
+                name: _summary(values, SIZE_BINS, SIZE_LABELS)
+                for name, values in self.sizes.items() if values
+            },
+            "caches": {
+                name: get_stats() for name, get_stats in self.caches.items()
+            },
+        }
+
+    def print_report(self):
+        """To print the report as tables"""
+
+        report = self.report()
+        print(f"{report['n_docs']} docs")
+
+        columns = ["count", "mean", "p50", "p90", "p99", "max"]
+        print(f"{'stage':<16}{'count':>7}" + "".join(f"{c + ' ms':>10}" for c in columns[1:]))
+        for stage, summary in report["stages"].items():
+            print(f"{stage:<16}{summary['count']:>7}"
+                  + "".join(f"{summary[c] * 1000:>10.3f}" for c in columns[1:]))
+
+        for title in ["counts", "sizes"]:
+            if report[title]:
+                print(f"{title[:-1]:<16}{'total':>7}" + "".join(f"{c:>10}" for c in columns[1:]))
+            for name, summary in report[title].items():
+                print(f"{name:<16}{int(summary['total']):>7}"
+                      + "".join(f"{summary[c]:>10.2f}" for c in columns[1:]))
+
+        for name, stats in report["caches"].items():
+            print(f"cache {name}: {stats}")
@@ -0,0 +1,261 @@
+# native packs
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+# installed packs
+import numpy as np
+# my packs
+#
+
+
+# bump when the format of the annotations changes
+RESULT_FORMAT_VERSION = 1
+
+
+def _to_json(obj):
+    # numpy scalars in scores
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj)} is not JSON serializable")
+
+
+class MemoryBackend:
+    """In-process LRU store of serialized annotations: key -> (version, value)."""
+
+    def __init__(
+        self,
+        max_size: int = 10000
+    ):
+        # params
+        self.max_size = max_size
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        return
+
+    def get(
+        self,
+        key: str
+    ) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(
+        self,
+        key: str,
+        value: str,
+        version: str
+    ):
+        with self.lock:
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def purge(
+        self,
+        version: str
+    ) -> int:
+        """To delete the entries of all other versions"""
+
+        with self.lock:
+            stale = [key for key, entry in self.entries.items() if entry[0] != version]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SQLiteBackend:
+    """On-disk store of serialized annotations, it can be shared by the processes of a machine.
+
+    Each process opens its own connection (the store can be used after a fork).
+    The database is in WAL mode: readers do not block the writer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        timeout: float = 30.
+    ):
+        # params
+        self.path = str(path)
+        self.timeout = timeout
+
+        # connection of the current process
+        self._connection = None
+        self._pid = None
+        self.lock = threading.Lock()
+        return
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS annotations "
+                "(key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL)"
+            )
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(
+        self,
+        key: str
+    ) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM annotations WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(
+        self,
+        key: str,
+        value: str,
+        version: str
+    ):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO annotations (key, version, value) VALUES (?, ?, ?)",
+                (key, version, value)
+            )
+
+    def purge(
+        self,
+        version: str
+    ) -> int:
+        """To delete the entries of all other versions"""
+
+        with self.lock:
+            cursor = self.connection.execute(
+                "DELETE FROM annotations WHERE version != ?", (version,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+
+class ResultCache:
+    """Content-addressed cache of the annotations of `SkillExtractor`.
+
+    The key of a text is a hash of its cleaned version (the text the matchers see),
+    the treshold, the fuzzy flag and the version of the extractor: the matchers bundle key
+    (skill db, spacy version, nlp model). Entries of another version are never hit,
+    they are purged when the cache is bound to a new version.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        purge_stale: bool = True
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        backend : MemoryBackend | SQLiteBackend | str | None, optional
+            where the annotations are stored, a path for a `SQLiteBackend`,
+            by default a `MemoryBackend`
+        purge_stale : bool, optional
+            whether to delete the entries of other versions when the cache is bound
+            to an extractor, by default True
+
+        Examples
+        --------
+        >>> from skillNer_custom.result_cache import ResultCache
+        >>> result_cache = ResultCache("annotations.sqlite")
+        >>> skill_extractor = SkillExtractor(nlp, SKILL_DB, PhraseMatcher, result_cache=result_cache)
+        >>> annotations = skill_extractor.annotate(text)
+        >>> annotations = skill_extractor.annotate(text)
+        >>> result_cache.stats()
+        {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'size': 1}
+        """
+
+        if backend is None:
+            backend = MemoryBackend()
+        elif isinstance(backend, (str, os.PathLike)):
+            backend = SQLiteBackend(backend)
+
+        # params
+        self.backend = backend
+        self.purge_stale = purge_stale
+
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        return
+
+    def bind(
+        self,
+        version: str
+    ):
+        """To set the version of the extractor using the cache"""
+
+        if version == self.version:
+            return
+        self.version = version
+        if self.purge_stale:
+            self.backend.purge(version)
+
+    def key(
+        self,
+        clean_text: str,
+        tresh: float,
+        fuzzy: bool,
+        source: str = "text"
+    ) -> str:
+        """To get the key of a text: sha256 of the version, parameters and cleaned text.
+        `source` tells raw texts ("text") from texts parsed beforehand ("doc")."""
+
+        content = f"{RESULT_FORMAT_VERSION}|{self.version}|{tresh!r}|{bool(fuzzy)}|{clean_text}"
+        if source != "text":
+            content = f"{source}|{content}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        key: str
+    ) -> Optional[dict]:
+        """To get the annotations of a key, None when they are not cached"""
+
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(
+        self,
+        key: str,
+        annotations: dict
+    ):
+        self.backend.set(key, json.dumps(annotations, default=_to_json), self.version)
+
+    def stats(self) -> dict:
+        """To get the hit / miss counts of the cache"""
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.,
+            "size": len(self.backend),
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = 0
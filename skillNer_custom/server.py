@@ -0,0 +1,491 @@
+# native packs
+import sys
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+# installed packs
+import numpy as np
+# my packs
+from skillNer_custom import cli
+
+
+# status line of the responses
+HTTP_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+# ==============================
+# Workers
+# ==============================
+
+class TextError(Exception):
+    """A text of a micro-batch failed, the message is the repr of its error"""
+
+
+def _annotate_texts(
+    texts: List[str],
+    tresh: float
+) -> list:
+    """To annotate a micro-batch with the extractor of the current process
+
+    Returns
+    -------
+    list
+        returns the annotations of each text, or a `TextError` for the texts that fail:
+        a failing text does not fail the texts batched with it
+    """
+
+    try:
+        annotations = list(cli._EXTRACTOR.annotate_batch(texts, tresh=tresh, batch_size=len(texts)))
+    except Exception:
+        # annotated one by one to find the texts that fail
+        annotations = []
+        for text in texts:
+            try:
+                annotations.extend(cli._EXTRACTOR.annotate_batch([text], tresh=tresh, batch_size=1))
+            except Exception as error:
+                annotations.append(TextError(repr(error)))
+
+    # numpy scalars are converted before going back to the event loop
+    return [
+        annotation if isinstance(annotation, TextError)
+        else json.loads(json.dumps(annotation, default=cli._to_json))
+        for annotation in annotations
+    ]
+
+
+class _Request:
+    """A text waiting for its annotations"""
+
+    __slots__ = ("text", "tresh", "future", "arrival")
+
+    def __init__(self, text: str, tresh: float, future: asyncio.Future):
+        self.text = text
+        self.tresh = tresh
+        self.future = future
+        self.arrival = time.perf_counter()
+
+
+class BatchingServer:
+    """Asyncio HTTP service annotating texts with `SkillExtractor`.
+
+    Incoming texts are queued and grouped in micro-batches: a batch is sent to the workers
+    once it has `max_batch_size` texts, or once its oldest text waited `max_latency` seconds.
+    Each batch goes through `annotate_batch` (`nlp.pipe` + matchers) in a worker, and the
+    annotations are fanned back out to the requests.
+
+    Endpoints:
+
+    - `POST /annotate` with `{"text": ..., "tresh": 0.5}` or `{"texts": [...]}`
+    - `GET /metrics`: queue depth, batches in flight, batch sizes and p50/p99 latencies
+    - `GET /health`
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        workers: int = 1,
+        max_batch_size: int = 32,
+        max_latency: float = 0.01,
+        max_queue: int = 1024,
+        max_body: int = 1 << 20,
+        latency_window: int = 10000
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        config : dict
+            config of the extractor of the workers, see `cli._init_worker`
+        workers : int, optional
+            number of worker processes, 1 to annotate in a thread of this process, by default 1
+        max_batch_size : int, optional
+            max number of texts of a micro-batch, by default 32
+        max_latency : float, optional
+            max time (seconds) a text waits for its batch to fill up, by default 0.01
+        max_queue : int, optional
+            max number of texts waiting for a worker, beyond it requests get a 503, by default 1024
+        max_body : int, optional
+            max size of a request body in bytes, by default 1 MB
+        latency_window : int, optional
+            number of recent requests the latency percentiles are computed on, by default 10000
+
+        Examples
+        --------
+        >>> from skillNer_custom.server import BatchingServer
+        >>> server = BatchingServer({"model": "en_core_web_lg", ...}, workers=4)
+        >>> asyncio.run(server.serve("0.0.0.0", 8000))
+        $ curl -d '{"text": "python developer"}' localhost:8000/annotate
+        """
+
+        # params
+        self.config = config
+        self.workers = max(workers, 1)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.max_queue = max_queue
+        self.max_body = max_body
+
+        self.queue = None
+        self.executor = None
+        # one batch per worker in flight, the next batches are formed meanwhile
+        self.slots = None
+
+        # metrics
+        self.started = time.time()
+        self.n_requests = 0
+        self.n_texts = 0
+        self.n_rejected = 0
+        self.n_batches = 0
+        self.n_in_flight = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.batch_sizes = deque(maxlen=latency_window)
+        return
+
+    # ==============================
+    # Batching
+    # ==============================
+
+    def _new_executor(
+        self,
+        restart: bool = False
+    ):
+        if self.workers > 1 and self.config.get("preload"):
+            from skillNer_custom.preload import fork_executor, post_fork
+            if restart:
+                # restarted workers: the extractor is already preloaded here
+                return ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("fork"),
+                    initializer=post_fork)
+            # built once here, shared with the forked workers
+            return fork_executor(self.workers, cli._init_worker, (self.config,))
+        if self.workers > 1:
+            return ProcessPoolExecutor(
+                self.workers, initializer=cli._init_worker, initargs=(self.config,))
+        # texts are annotated in a thread: the event loop keeps answering meanwhile
+        cli._init_worker(self.config)
+        return ThreadPoolExecutor(1)
+
+    def start(self):
+        """To start the workers and the batching loop, in the running event loop"""
+
+        self.executor = self._new_executor()
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def stop(self):
+        self._batcher.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def annotate(
+        self,
+        texts: List[str],
+        tresh: float = 0.5
+    ) -> List[dict]:
+        """To annotate texts through the micro-batches
+
+        Raises
+        ------
+        OverflowError
+            when the queue is full
+        """
+
+        if self.queue.qsize() + len(texts) > self.max_queue:
+            self.n_rejected += 1
+            raise OverflowError("too many pending texts")
+
+        loop = asyncio.get_running_loop()
+        requests = [_Request(text, tresh, loop.create_future()) for text in texts]
+        for request in requests:
+            self.queue.put_nowait(request)
+        self.n_texts += len(texts)
+        return list(await asyncio.gather(*[request.future for request in requests]))
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # wait for a worker, then for the first text of the batch
+            await self.slots.acquire()
+            batch = [await self.queue.get()]
+
+            # fill the batch until it is full or its first text waited too long
+            deadline = batch[0].arrival + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # texts annotated together share the treshold
+            by_tresh = {}
+            for request in batch:
+                by_tresh.setdefault(request.tresh, []).append(request)
+            for i, (tresh, requests) in enumerate(by_tresh.items()):
+                if i:
+                    await self.slots.acquire()
+                loop.create_task(self._run_batch(requests, tresh))
+
+    async def _run_batch(
+        self,
+        requests: List[_Request],
+        tresh: float
+    ):
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        self.n_in_flight += 1
+        try:
+            annotations = await loop.run_in_executor(
+                executor, _annotate_texts, [request.text for request in requests], tresh)
+        except BrokenProcessPool as error:
+            # a worker died (e.g. killed): the pool is restarted once for the batches in flight
+            if self.executor is executor:
+                print(f"a worker died ({error}), restarting the workers", file=sys.stderr)
+                executor.shutdown(wait=False)
+                self.executor = self._new_executor(restart=True)
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(error)
+            return
+        except Exception as error:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(error)
+            return
+        finally:
+            self.n_in_flight -= 1
+            self.slots.release()
+
+        now = time.perf_counter()
+        self.n_batches += 1
+        self.batch_sizes.append(len(requests))
+        for request, annotation in zip(requests, annotations):
+            self.latencies.append(now - request.arrival)
+            if request.future.done():
+                continue
+            if isinstance(annotation, TextError):
+                request.future.set_exception(annotation)
+            else:
+                request.future.set_result(annotation)
+
+    def metrics(self) -> dict:
+        """To get the metrics of the service"""
+
+        latencies = np.asarray(self.latencies, dtype=float) * 1000
+        return {
+            "uptime": time.time() - self.started,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "batches_in_flight": self.n_in_flight,
+            "workers": self.workers,
+            "requests": self.n_requests,
+            "texts": self.n_texts,
+            "rejected": self.n_rejected,
+            "batches": self.n_batches,
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies.size else 0.,
+            "latency_p99_ms": float(np.percentile(latencies, 99)) if latencies.size else 0.,
+        }
+
+    # ==============================
+    # HTTP
+    # ==============================
+
+    async def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000
+    ):
+        """To serve until cancelled"""
+
+        self.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"serving on http://{host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ):
+        # keep-alive connections: requests are answered one after the other
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    await self._respond(writer, 413, {"error": "body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._route(method, path.split("?", 1)[0], body)
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version.strip() == "HTTP/1.1"
+                )
+                await self._respond(writer, status, payload, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(
+        self,
+        method: str,
+        path: str,
+        body: bytes
+    ):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path != "/annotate":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        self.n_requests += 1
+        try:
+            data = json.loads(body)
+            texts = data["texts"] if "texts" in data else [data["text"]]
+            tresh = float(data.get("tresh", self.config.get("tresh", 0.5)))
+            if not all(isinstance(text, str) for text in texts):
+                raise TypeError("texts must be strings")
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return 400, {"error": f"expected {{'text': str}} or {{'texts': [str]}} ({error})"}
+
+        try:
+            annotations = await self.annotate(texts, tresh)
+        except OverflowError as error:
+            return 503, {"error": str(error)}
+        except BrokenProcessPool:
+            return 503, {"error": "a worker died, the workers are restarted"}
+        except TextError as error:
+            return 500, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": repr(error)}
+
+        if "texts" in data:
+            return 200, {"annotations": annotations}
+        return 200, annotations[0]
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: dict,
+        close: bool = False
+    ):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="skillner-serve",
+        description="Serve SkillExtractor over HTTP, with requests grouped in micro-batches."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="by default 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="by default 8000")
+    parser.add_argument("--model", default="en_core_web_lg", help="spacy model to load")
+    parser.add_argument("--skills-db", help="skill db file (json or .skdb), by default SKILL_DB")
+    parser.add_argument("--matchers-bundle", help="path of the matchers bundle (see MatcherBundle)")
+    parser.add_argument("--fuzzy", action="store_true", help="enable the fuzzy phrase matcher")
+    parser.add_argument("--tresh", type=float, default=0.5, help="default score treshold")
+    parser.add_argument("--result-cache",
+                        help="sqlite file caching the annotations of already seen texts (see ResultCache)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes, 1 to annotate in a thread of the server, by default 1")
+    parser.add_argument("--preload", action="store_true",
+                        help="build the extractor once and fork the workers from it: "
+                        "they share its memory instead of building their own (see preload.py)")
+    parser.add_argument("--max-batch-size", type=int, default=32,
+                        help="max texts per micro-batch, by default 32")
+    parser.add_argument("--max-latency", type=float, default=10.,
+                        help="max time in ms a text waits for its micro-batch to fill up, by default 10")
+    parser.add_argument("--max-queue", type=int, default=1024,
+                        help="max pending texts, beyond it requests get a 503, by default 1024")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of `skillner-serve`
+
+    Examples
+    --------
+    $ skillner-serve --workers 4 --max-batch-size 64 --max-latency 20
+    $ curl -d '{"texts": ["python developer", "sql"]}' localhost:8000/annotate
+    $ curl localhost:8000/metrics
+    """
+
+    args = get_parser().parse_args(argv)
+
+    config = {
+        "model": args.model,
+        "skills_db": args.skills_db,
+        "matchers_bundle": args.matchers_bundle,
+        "fuzzy": args.fuzzy,
+        "tresh": args.tresh,
+        "result_cache": args.result_cache,
+        "dedup": None,
+        "corpus_store": None,
+        "reannotate": False,
+        "preload": args.preload,
+    }
+    server = BatchingServer(
+        config,
+        workers=args.workers,
+        max_batch_size=args.max_batch_size,
+        max_latency=args.max_latency / 1000,
+        max_queue=args.max_queue,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+# native packs
+import mmap
+import struct
+import json
+import hashlib
+from collections.abc import Mapping, ItemsView, ValuesView
+from typing import Iterable, Iterator, Optional
+# installed packs
+import numpy as np
+# my packs
+#
+
+
+# binary format
+# -------------
+# header: magic, version, counts and the byte offset of each section
+# sections (8 bytes aligned, little endian):
+#   str_offsets   uint64[n_strings + 1]  offsets of strings in str_blob
+#   str_blob      utf-8 bytes of all the interned strings
+#   columns       int32[N_COLUMNS, n_skills]  string ids / ints, -1 when missing
+#   low_offsets   uint64[n_skills + 1]  offsets of the low surface forms of each skill
+#   low_forms     int32[n_low]  string ids of low surface forms
+#   sorted_index  int32[n_skills]  skill indexes sorted by skill id (binary search)
+MAGIC = b"SKNRDB\x00\x01"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ6Q")
+
+COLUMNS = [
+    "skill_id",
+    "skill_name",
+    "skill_type",
+    "skill_len",
+    "full",
+    "abv",
+    "match_on_tokens",
+]
+COL = {name: i for i, name in enumerate(COLUMNS)}
+
+# keys allowed in `high_surfce_forms`
+HIGH_SURFACE_FORMS = ["full", "abv"]
+
+
+def _align(buffer: bytearray):
+    buffer.extend(b"\x00" * (-len(buffer) % 8))
+
+
+def write_skill_db(
+    skills_db: dict,
+    path: str
+):
+    """To write a skill db in the compact binary format read by `SkillDBView`.
+    Strings are interned in a single table and skills are stored as columns of integers.
+
+    Parameters
+    ----------
+    skills_db : dict
+        the skill db, in the format of `skill_db_relax_20.json`
+    path : str
+        where to write the binary db
+
+    Examples
+    --------
+    >>> from skillNer_custom.skill_db_view import write_skill_db, SkillDBView
+    >>> write_skill_db(SKILL_DB, "skill_db_relax_20.skdb")
+    >>> skills_db = SkillDBView("skill_db_relax_20.skdb")
+    """
+
+    # string table
+    string_ids = {}
+    strings = []
+
+    def intern(string) -> int:
+        if string is None:
+            return -1
+        if string not in string_ids:
+            string_ids[string] = len(strings)
+            strings.append(string)
+        return string_ids[string]
+
+    n_skills = len(skills_db)
+    columns = np.full((len(COLUMNS), n_skills), -1, dtype="<i4")
+    low_offsets = [0]
+    low_forms = []
+
+    for i, (skill_id, skill) in enumerate(skills_db.items()):
+        high_forms = skill["high_surfce_forms"]
+        unknown = set(high_forms) - set(HIGH_SURFACE_FORMS)
+        if unknown:
+            raise ValueError(
+                f"skill {skill_id}: unsupported high surface forms {sorted(unknown)}")
+
+        columns[COL["skill_id"], i] = intern(skill_id)
+        columns[COL["skill_name"], i] = intern(skill["skill_name"])
+        columns[COL["skill_type"], i] = intern(skill["skill_type"])
+        columns[COL["skill_len"], i] = skill["skill_len"]
+        columns[COL["full"], i] = intern(high_forms.get("full"))
+        columns[COL["abv"], i] = intern(high_forms.get("abv"))
+        columns[COL["match_on_tokens"], i] = int(skill["match_on_tokens"])
+
+        low_forms.extend(intern(form) for form in skill["low_surface_forms"])
+        low_offsets.append(len(low_forms))
+
+    encoded = [string.encode("utf-8") for string in strings]
+    str_offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    str_offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    sorted_index = np.array(
+        sorted(range(n_skills), key=lambda i: encoded[columns[COL["skill_id"], i]]),
+        dtype="<i4"
+    )
+
+    # assemble sections after the header
+    body = bytearray()
+    section_offsets = []
+    sections = [
+        str_offsets.tobytes(),
+        b"".join(encoded),
+        columns.tobytes(),
+        np.array(low_offsets, dtype="<u8").tobytes(),
+        np.array(low_forms, dtype="<i4").tobytes(),
+        sorted_index.tobytes(),
+    ]
+    for section in sections:
+        section_offsets.append(HEADER.size + len(body))
+        body.extend(section)
+        _align(body)
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(COLUMNS),
+        n_skills, len(strings), len(low_forms),
+        *section_offsets
+    )
+
+    with open(path, "wb") as fp:
+        fp.write(header)
+        fp.write(body)
+
+
+class SkillDBView(Mapping):
+    """Read-only view of a binary skill db written by `write_skill_db`.
+
+    The file is memory-mapped: processes opening the same file share the same
+    physical pages instead of holding their own copy of the db.
+    The view behaves like the dict of `skill_db_relax_20.json`, i.e. `db[skill_id]`
+    returns a dict with `skill_name`, `skill_type`, `skill_len`, `high_surfce_forms`,
+    `low_surface_forms` and `match_on_tokens`.
+    """
+
+    def __init__(
+        self,
+        path: str
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        path : str
+            path of the binary db
+
+        Examples
+        --------
+        >>> from skillNer_custom.skill_db_view import SkillDBView
+        >>> skills_db = SkillDBView("skill_db_relax_20.skdb")
+        >>> skills_db["KS125LS6N7WP4S6SFTCK"]["skill_name"]
+        'Python (Programming Language)'
+        """
+
+        self.path = path
+
+        with open(path, "rb") as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, n_columns, n_skills, n_strings, n_low,
+         *offsets) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or n_columns != len(COLUMNS):
+            raise ValueError(f"{path} is not a skill db of format version {FORMAT_VERSION}")
+
+        (off_str_offsets, off_blob, off_columns,
+         off_low_offsets, off_low_forms, off_sorted) = offsets
+
+        # arrays are views on the mapped file, nothing is copied
+        self._str_offsets = np.frombuffer(
+            self._mm, dtype="<u8", count=n_strings + 1, offset=off_str_offsets)
+        self._blob_offset = off_blob
+        self._columns = np.frombuffer(
+            self._mm, dtype="<i4", count=len(COLUMNS) * n_skills,
+            offset=off_columns).reshape(len(COLUMNS), n_skills)
+        self._low_offsets = np.frombuffer(
+            self._mm, dtype="<u8", count=n_skills + 1, offset=off_low_offsets)
+        self._low_forms = np.frombuffer(
+            self._mm, dtype="<i4", count=n_low, offset=off_low_forms)
+        self._sorted_index = np.frombuffer(
+            self._mm, dtype="<i4", count=n_skills, offset=off_sorted)
+
+        self._n_skills = n_skills
+        self._fingerprint = None
+        return
+
+    # strings
+    def string(
+        self,
+        string_id: int
+    ) -> str:
+        """To get an interned string by its id"""
+
+        start = self._blob_offset + int(self._str_offsets[string_id])
+        end = self._blob_offset + int(self._str_offsets[string_id + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    # skills by integer index
+    def skill_id(
+        self,
+        index: int
+    ) -> str:
+        """To get the skill id of the skill at a given index"""
+
+        return self.string(self._columns[COL["skill_id"], index])
+
+    def index(
+        self,
+        skill_id: str
+    ) -> int:
+        """To get the integer index of a skill id
+
+        Raises
+        ------
+        KeyError
+            if the skill id is not in the db
+        """
+
+        # binary search over skills sorted by id
+        target = skill_id.encode("utf-8")
+        low, high = 0, self._n_skills
+        while low < high:
+            middle = (low + high) // 2
+            index = int(self._sorted_index[middle])
+            string_id = self._columns[COL["skill_id"], index]
+            start = self._blob_offset + int(self._str_offsets[string_id])
+            end = self._blob_offset + int(self._str_offsets[string_id + 1])
+            current = self._mm[start:end]
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle
+            else:
+                return index
+
+        raise KeyError(skill_id)
+
+    def record(
+        self,
+        index: int
+    ) -> dict:
+        """To get the skill at a given index, in the format of the json db"""
+
+        columns = self._columns
+        high_forms = {}
+        for form in HIGH_SURFACE_FORMS:
+            string_id = columns[COL[form], index]
+            if string_id >= 0:
+                high_forms[form] = self.string(string_id)
+
+        low_start = int(self._low_offsets[index])
+        low_end = int(self._low_offsets[index + 1])
+
+        return {
+            "skill_name": self.string(columns[COL["skill_name"], index]),
+            "skill_type": self.string(columns[COL["skill_type"], index]),
+            "skill_len": int(columns[COL["skill_len"], index]),
+            "high_surfce_forms": high_forms,
+            "low_surface_forms": [
+                self.string(string_id)
+                for string_id in self._low_forms[low_start:low_end]
+            ],
+            "match_on_tokens": bool(columns[COL["match_on_tokens"], index]),
+        }
+
+    # mapping interface
+    def __getitem__(
+        self,
+        skill_id: str
+    ) -> dict:
+        return self.record(self.index(skill_id))
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._n_skills):
+            yield self.skill_id(index)
+
+    def __len__(self) -> int:
+        return self._n_skills
+
+    def items(self):
+        return _SkillDBItemsView(self)
+
+    def values(self):
+        return _SkillDBValuesView(self)
+
+    def __reduce__(self):
+        # reopen the mapped file when unpickled (e.g. sent to a worker process)
+        return (SkillDBView, (self.path,))
+
+    def fingerprint(self) -> str:
+        """To get the sha256 of the db file, see `skills_db_fingerprint`"""
+
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha256(self._mm).hexdigest()
+        return self._fingerprint
+
+    def to_dict(self) -> dict:
+        """To materialize the db as a dict, in the format of the json db"""
+
+        return dict(self.items())
+
+
+# going through the whole db by index avoids a binary search per skill
+class _SkillDBItemsView(ItemsView):
+
+    def __iter__(self):
+        view = self._mapping
+        for index in range(len(view)):
+            yield view.skill_id(index), view.record(index)
+
+
+class _SkillDBValuesView(ValuesView):
+
+    def __iter__(self):
+        view = self._mapping
+        for index in range(len(view)):
+            yield view.record(index)
+
+
+class SkillDBOverlay(Mapping):
+    """Skill db patched by a delta, see `SkillExtractor.apply_db_delta`.
+
+    The base db (a dict or a `SkillDBView`) is not copied nor modified: the overlay holds
+    the added and changed skills and the removed skill ids. It behaves like the patched db,
+    skills are iterated in the order of the base db, then the added skills.
+    """
+
+    def __init__(
+        self,
+        base,
+        updates: Optional[dict] = None,
+        removed: Iterable[str] = ()
+    ):
+        """Constructor of the class
+
+        Parameters
+        ----------
+        base : dict | SkillDBView
+            the skill db the delta applies to
+        updates : dict, optional
+            the added and changed skills, by skill id
+        removed : Iterable[str], optional
+            the removed skill ids
+
+        Examples
+        --------
+        >>> from skillNer_custom.skill_db_view import SkillDBView, SkillDBOverlay
+        >>> skills_db = SkillDBOverlay(SkillDBView("skill_db_relax_20.skdb"))
+        >>> skills_db = skills_db.apply(added={"KSNEW": new_skill}, removed=["KS125LS6N7WP4S6SFTCK"])
+        """
+
+        # params
+        self.base = base
+        self.updates = dict(updates or {})
+        self.removed = set(removed)
+
+        # skills not in the base db, in the order they were added
+        self._added = [skill_id for skill_id in self.updates if skill_id not in base]
+        self._fingerprint = None
+        return
+
+    def apply(
+        self,
+        added: Optional[dict] = None,
+        removed: Iterable[str] = (),
+        changed: Optional[dict] = None
+    ) -> "SkillDBOverlay":
+        """To get a new overlay with a delta applied, the overlay itself is not modified
+
+        Parameters
+        ----------
+        added : dict, optional
+            the new skills, by skill id
+        removed : Iterable[str], optional
+            the ids of the removed skills
+        changed : dict, optional
+            the new content of existing skills, by skill id
+
+        Returns
+        -------
+        SkillDBOverlay
+            returns the patched db, on the same base db
+        """
+
+        updates = dict(self.updates)
+        removed_ids = set(self.removed)
+        for skill_id in removed:
+            updates.pop(skill_id, None)
+            if skill_id in self.base:
+                removed_ids.add(skill_id)
+        for skill_id, skill in {**(changed or {}), **(added or {})}.items():
+            updates[skill_id] = skill
+            removed_ids.discard(skill_id)
+
+        overlay = SkillDBOverlay(self.base, updates, removed_ids)
+        # keep the skills added before first
+        overlay._added = (
+            [skill_id for skill_id in self._added if skill_id in updates]
+            + [skill_id for skill_id in overlay._added if skill_id not in self._added]
+        )
+        return overlay
+
+    # mapping interface
+    def __getitem__(
+        self,
+        skill_id: str
+    ) -> dict:
+        if skill_id in self.updates:
+            return self.updates[skill_id]
+        if skill_id in self.removed:
+            raise KeyError(skill_id)
+        return self.base[skill_id]
+
+    def __contains__(
+        self,
+        skill_id
+    ) -> bool:
+        if skill_id in self.updates:
+            return True
+        return skill_id not in self.removed and skill_id in self.base
+
+    def __iter__(self) -> Iterator[str]:
+        for skill_id in self.base:
+            if skill_id not in self.removed:
+                yield skill_id
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + len(self._added)
+
+    def items(self):
+        return _SkillDBOverlayItemsView(self)
+
+    def fingerprint(self) -> str:
+        """To get a hash of the base db and of the delta, see `skills_db_fingerprint`"""
+
+        # imported here: the bundle imports the matchers
+        from skillNer_custom.bundle_class import skills_db_fingerprint
+
+        if self._fingerprint is None:
+            delta = json.dumps(
+                {"updates": self.updates, "removed": sorted(self.removed), "added": self._added},
+                sort_keys=True, ensure_ascii=False
+            )
+            content = skills_db_fingerprint(self.base) + "|" + delta
+            self._fingerprint = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def to_dict(self) -> dict:
+        """To materialize the patched db as a dict, in the format of the json db"""
+
+        return dict(self.items())
+
+
+# the items of the base db are read in one pass (no lookup per skill for a `SkillDBView`)
+class _SkillDBOverlayItemsView(ItemsView):
+
+    def __iter__(self):
+        overlay = self._mapping
+        for skill_id, skill in overlay.base.items():
+            if skill_id in overlay.removed:
+                continue
+            yield skill_id, overlay.updates.get(skill_id, skill)
+        for skill_id in overlay._added:
+            yield skill_id, overlay.updates[skill_id]
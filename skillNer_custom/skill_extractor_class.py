@@ -1,17 +1,25 @@
 # native packs
-#
+import time
+import threading
+from typing import Iterable, Iterator, Optional, Union
 # installed packs
 from spacy import displacy
+from spacy.tokens import Doc
 
 # my packs
 from skillNer_custom.text_class import Text
 from skillNer_custom.matcher_class import Matchers, SkillsGetter
 from skillNer_custom.utils import Utils
+from skillNer_custom.profiler import NULL_RECORD
 from skillNer_custom.general_params import SKILL_TO_COLOR
 
 from skillNer_custom.visualizer.html_elements import DOM, render_phrase
 from skillNer_custom.visualizer.phrase_class import Phrase
-from skillNer_custom.fuzzy_matcher import FuzzyPhraseMatcher
+from skillNer_custom.bundle_class import MatcherBundle
+from skillNer_custom.dedup import NearDuplicateIndex, shift_matches
+from skillNer_custom.chunking import stitch_matches
+from skillNer_custom.pipe_pruning import prune_pipeline
+from skillNer_custom.skill_db_view import SkillDBOverlay
 
 
 class SkillExtractor:
@@ -42,7 +50,12 @@ class SkillExtractor:
         skills_db,
         phraseMatcher,
         tranlsator_func=False,
-        fuzzy_func=False
+        fuzzy_func=False,
+        matchers_bundle: str = None,
+        one_gram_table=None,
+        profiler=None,
+        result_cache=None,
+        prune_pipes: bool = True
     ):
         """
         Constructor of the class.
@@ -59,48 +72,109 @@ class SkillExtractor:
             Optional translation function.
         fuzzy_func : bool
             Enable fuzzy phrase matcher.
+        matchers_bundle : str | None
+            Path of a prebuilt matchers bundle (see `MatcherBundle`).
+            The bundle is loaded if it matches the skill db and nlp,
+            otherwise it is (re)built and saved at this path.
+        one_gram_table : dict | str | None
+            Precomputed uni-gram similarities, or the path of a table
+            saved with `Utils.save_one_gram_table` (see `Utils.build_one_gram_table`).
+        profiler : Profiler | None
+            Opt-in instrumentation of the stages (see `Profiler`).
+        result_cache : ResultCache | None
+            Opt-in cache of the annotations of already seen texts (see `ResultCache`).
+            Its entries are bound to the matchers bundle key: they are not
+            used anymore once the skill db, spacy or the nlp model change.
+        prune_pipes : bool
+            Run only the components of nlp the annotations depend on (lemmas, and the
+            tensor when the vocab has no vectors), see `prune_pipeline`. The pruned
+            pipeline is checked to give the same tokens, lemmas, stop words and tensor
+            as the full one, otherwise all the components run.
         """
 
         # params
         self.tranlsator_func = tranlsator_func
         self.fuzzy_func = fuzzy_func
-        self.nlp = nlp
+        self.nlp = prune_pipeline(nlp) if prune_pipes else nlp
         self.skills_db = skills_db
         self.phraseMatcher = phraseMatcher
 
         # --------------------------------------------------
-        # Load ALL deterministic matchers
-        # --------------------------------------------------
-        self.matchers = Matchers(
-            self.nlp,
-            self.skills_db,
-            self.phraseMatcher,
-        ).load_matchers()
-
-        # --------------------------------------------------
-        # Load fuzzy phrase matcher
+        # Load ALL deterministic matchers + fuzzy phrase matcher
         # --------------------------------------------------
         # Fuzzy matcher works on PHRASE level
         # and handles typo / noisy spans
-        self.fuzzy_matcher = FuzzyPhraseMatcher(
+        matcher_bundle = MatcherBundle(
+            self.nlp,
             self.skills_db,
+            self.phraseMatcher,
+            matchers_bundle,
         )
+        if matchers_bundle:
+            # load from disk, build once
+            bundle = matcher_bundle.load_or_build()
+        else:
+            bundle = matcher_bundle.build()
+
+        self.matchers = bundle['matchers']
+        # version of the annotations, for the result cache
+        self.result_cache = result_cache
+        if result_cache is not None:
+            result_cache.bind(matcher_bundle.key())
+        self.fuzzy_matcher = bundle['fuzzy_matcher']
 
         # init skill getters (wrappers around spacy matchers)
         self.skill_getters = SkillsGetter(self.nlp)
 
         # init utils (n-gram conflict resolver, scoring, etc.)
-        self.utils = Utils(self.nlp, self.skills_db)
+        self.utils = Utils(self.nlp, self.skills_db, one_gram_table=one_gram_table)
+
+        # per-stage instrumentation, disabled by default
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.watch_cache("one_gram_sim", self.utils.one_gram_sim_stats)
+            if result_cache is not None:
+                profiler.watch_cache("results", result_cache.stats)
+
+        # throughput of the last `.annotate_batch()`
+        self.batch_stats = {}
+        # matching and `.apply_db_delta()` do not interleave
+        self._lock = threading.RLock()
         return
 
+    def __getstate__(self):
+        # locks cannot be pickled : a new one is created
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
     def annotate(
         self,
-        text: str,
-        tresh: float = 0.5
+        text: Union[str, Doc, list],
+        tresh: float = 0.5,
+        chunker=None
     ) -> dict:
         """
         Annotate skills / job titles in input text.
 
+        The input is a raw text, or a text parsed beforehand: a `spacy.tokens.Doc`
+        (e.g. from another spacy pipeline), a list of tokens or a list of (token, lemma)
+        pairs. Parsed inputs are not parsed again and not translated: their tokens
+        and lemmas are reused, see `Text.from_doc`. A list of tokens, or a Doc without
+        lemmas (e.g. from `spacy.blank`), is lemmatized by the pipeline as given (cased,
+        not transformed): low surface and token matches may differ slightly from the
+        ones of the raw text.
+
+        Raw texts longer than `chunker.max_tokens` tokens are annotated window by window
+        when a `DocumentChunker` is given: memory depends on the size of the windows, not
+        on the length of the text. `doc_node_id` are positions in the whole text. Matches
+        near the cuts may differ from the ones of the whole text, chunked annotations are
+        not stored in the result cache.
+
         FUZZY INTEGRATION STRATEGY
         -------------------------
         - Fuzzy matcher runs AFTER full & abv match
@@ -113,12 +187,412 @@ class SkillExtractor:
         - lowSurf overriding fuzzy phrase
         """
 
+        record = self._start_record()
+
+        # parsed beforehand
+        parsed = self._to_doc(text)
+        if parsed is not None:
+            text = parsed.text
+
         # optional translation
-        if self.tranlsator_func:
+        elif self.tranlsator_func:
             text = self.tranlsator_func(text)
+            record.lap('translation')
+
+        # already annotated text
+        cache_key, annotations = self._get_cached(text, tresh, record, parsed)
+        if annotations is not None:
+            record.finish()
+            return annotations
+
+        # long text, annotated window by window
+        if chunker is not None and parsed is None:
+            annotations = self._annotate_chunks(text, tresh, chunker, record)
+            if annotations is not None:
+                record.finish()
+                return annotations
 
         # create text object (tokenized + is_matchable flags)
-        text_obj = Text(text, self.nlp)
+        if parsed is not None:
+            text_obj = Text.from_doc(parsed, self.nlp)
+        else:
+            text_obj = Text(text, self.nlp)
+        record.lap('text')
+
+        annotations = self._annotate_text_obj(text_obj, tresh, record)
+        if cache_key is not None:
+            self.result_cache.set(cache_key, annotations)
+        record.finish()
+        return annotations
+
+    def annotate_batch(
+        self,
+        texts: Iterable[Union[str, Doc, list]],
+        tresh: float = 0.5,
+        batch_size: int = 256,
+        n_process: int = 1,
+        verbose: bool = False,
+        dedup=None,
+        corpus_store=None
+    ) -> Iterator[dict]:
+        """Annotate a stream of texts. Texts are parsed in batches with `nlp.pipe`
+        and then go through the same matchers as `.annotate()`.
+
+        Parameters
+        ----------
+        texts : Iterable[str | Doc | list]
+            The texts to annotate, it can be a generator. As in `.annotate()`, texts parsed
+            beforehand (docs, lists of tokens or (token, lemma) pairs) are not parsed again.
+        tresh : float, optional
+            Score treshold of ngram_scored and fuzzy matches, by default 0.5
+        batch_size : int, optional
+            Number of texts parsed together by `nlp.pipe`, by default 256
+        n_process : int, optional
+            Number of processes used by `nlp.pipe` to parse texts, by default 1
+        verbose : bool, optional
+            Print the throughput once all texts are annotated, by default False
+        dedup : NearDuplicateIndex | bool | None, optional
+            Near-duplicate detection (see `NearDuplicateIndex`): only one text of each cluster
+            of near-duplicates is fully annotated, the others reuse its matches and only
+            their differing segments are annotated. Their annotations are approximate and
+            are not stored in the result cache. True for a `NearDuplicateIndex()` of this call,
+            pass an index to share it across calls (with the same `tresh`), by default None
+        corpus_store : CorpusStore | None, optional
+            Store the parsed texts (see `CorpusStore`), to annotate them again with
+            `.reannotate()` without parsing them. All the texts are parsed then, cached
+            texts and near-duplicates included, by default None
+
+        Yields
+        ------
+        dict
+            the annotations of each text, in the same order as `texts`
+            and in the same format as `.annotate()`.
+            Throughput is tracked in `self.batch_stats`.
+
+        Examples
+        --------
+        >>> texts = (posting["description"] for posting in postings)
+        >>> for annotations in skill_extractor.annotate_batch(texts, n_process=4):
+        ...     save(annotations)
+        >>> skill_extractor.batch_stats
+        {'n_docs': 10000, 'elapsed': 52.3, 'docs_per_sec': 191.2}
+        >>> annotations = list(skill_extractor.annotate_batch(texts, dedup=True))
+        >>> skill_extractor.batch_stats['dedup']['n_skipped']
+        6880
+        >>> store = CorpusStore("postings.store", nlp)
+        >>> annotations = list(skill_extractor.annotate_batch(texts, corpus_store=store))
+        """
+
+        if dedup is True:
+            dedup = NearDuplicateIndex()
+
+        # (transformed text, (raw text, parsed doc, cache key, cached annotations, representative, member))
+        # pairs, transformed text is what Text parses: cached texts, texts parsed beforehand
+        # and near-duplicates are not parsed, unless they are stored
+        store = corpus_store is not None
+
+        def prepare(texts):
+            for text in texts:
+                parsed = self._to_doc(text)
+                if parsed is not None:
+                    text = parsed.text
+                elif self.tranlsator_func:
+                    text = self.tranlsator_func(text)
+
+                cache_key, annotations = self._get_cached(text, tresh, parsed=parsed)
+                if annotations is not None:
+                    to_parse = Text.transform(text) if store and parsed is None else ""
+                    yield to_parse, (text, parsed, cache_key, annotations, None, None)
+                    continue
+
+                transformed = Text.transform(text)
+                to_parse = "" if parsed is not None else transformed
+                if not dedup:
+                    yield to_parse, (text, parsed, cache_key, None, None, None)
+                    continue
+
+                tokens = [token.text for token in self.nlp.make_doc(transformed)]
+                representative, new_representative = dedup.query(tokens)
+                if representative is not None:
+                    yield to_parse if store else "", (
+                        text, parsed, cache_key, None, representative, (transformed, tokens))
+                else:
+                    yield to_parse, (text, parsed, cache_key, None, new_representative, None)
+
+        self.batch_stats = {'n_docs': 0, 'elapsed': 0., 'docs_per_sec': 0.}
+        start = time.perf_counter()
+
+        docs = self.nlp.pipe(
+            prepare(texts),
+            as_tuples=True,
+            batch_size=batch_size,
+            n_process=n_process
+        )
+        # time spent in `nlp.pipe` (translation included) is reported as `parse`
+        record = self._start_record()
+        for doc, (text, parsed, cache_key, annotations, representative, member) in docs:
+            record.lap('parse')
+            if self.result_cache is not None:
+                record.count('cache', int(annotations is not None))
+            if dedup:
+                record.count('near_duplicate', int(member is not None))
+
+            text_obj = None
+            if member is not None:
+                annotations = self._annotate_near_duplicate(
+                    *member, representative, dedup, tresh, record)
+            elif annotations is None:
+                if parsed is not None:
+                    text_obj = Text.from_doc(parsed, self.nlp)
+                else:
+                    text_obj = Text(text, self.nlp, doc=doc)
+                record.lap('text')
+                annotations = self._annotate_text_obj(text_obj, tresh, record)
+                if cache_key is not None:
+                    self.result_cache.set(cache_key, annotations)
+                if representative is not None:
+                    representative.annotations = annotations
+
+            if store:
+                if text_obj is not None:
+                    doc = text_obj.views["transformed"]
+                elif parsed is not None:
+                    doc = Text.from_doc(parsed, self.nlp).views["transformed"]
+                corpus_store.add(text, doc)
+                record.lap('store')
+            record.finish()
+
+            # update throughput before handing the result to the consumer
+            self._update_batch_stats(start)
+
+            yield annotations
+            record = self._start_record()
+
+        if store:
+            corpus_store.flush()
+
+        if dedup:
+            self.batch_stats['dedup'] = dedup.stats()
+
+        if verbose:
+            print(
+                f"annotated {self.batch_stats['n_docs']} docs "
+                f"in {self.batch_stats['elapsed']:.2f}s "
+                f"({self.batch_stats['docs_per_sec']:.1f} docs/sec)"
+            )
+            if dedup:
+                print(f"{dedup.n_skipped} near-duplicate docs skipped")
+
+    def reannotate(
+        self,
+        docs: Iterable[Doc],
+        tresh: float = 0.5,
+        verbose: bool = False
+    ) -> Iterator[dict]:
+        """Annotate texts stored by `.annotate_batch(corpus_store=...)` without parsing them:
+        only the matchers run on the stored tokens and lemmas, for instance after refreshing
+        the skill db. Annotations are the ones `.annotate_batch()` gives with the same nlp.
+
+        Parameters
+        ----------
+        docs : Iterable[Doc]
+            the stored docs, e.g. a `CorpusStore` (read by offset) or some of its docs
+        tresh : float, optional
+            Score treshold of ngram_scored and fuzzy matches, by default 0.5
+        verbose : bool, optional
+            Print the throughput once all texts are annotated, by default False
+
+        Yields
+        ------
+        dict
+            the annotations of each doc, in the same order as `docs`
+            and in the same format as `.annotate()`.
+            Throughput is tracked in `self.batch_stats`.
+
+        Examples
+        --------
+        >>> skill_extractor = SkillExtractor(nlp, new_skills_db, PhraseMatcher)
+        >>> for annotations in skill_extractor.reannotate(CorpusStore("postings.store", nlp)):
+        ...     save(annotations)
+        """
+
+        self.batch_stats = {'n_docs': 0, 'elapsed': 0., 'docs_per_sec': 0.}
+        start = time.perf_counter()
+
+        record = self._start_record()
+        for doc in docs:
+            record.lap('load')
+            text_obj = Text(doc.user_data["text"], self.nlp, doc=doc)
+            record.lap('text')
+            annotations = self._annotate_text_obj(text_obj, tresh, record)
+            record.finish()
+
+            self._update_batch_stats(start)
+
+            yield annotations
+            record = self._start_record()
+
+        if verbose:
+            print(
+                f"reannotated {self.batch_stats['n_docs']} docs "
+                f"in {self.batch_stats['elapsed']:.2f}s "
+                f"({self.batch_stats['docs_per_sec']:.1f} docs/sec)"
+            )
+
+    def _update_batch_stats(self, start: float):
+        """To count an annotated doc in `self.batch_stats`"""
+        elapsed = time.perf_counter() - start
+        self.batch_stats['n_docs'] += 1
+        self.batch_stats['elapsed'] = elapsed
+        self.batch_stats['docs_per_sec'] = self.batch_stats['n_docs'] / elapsed
+
+    def _annotate_near_duplicate(
+        self,
+        transformed_text: str,
+        tokens: list,
+        representative,
+        dedup,
+        tresh: float,
+        record=NULL_RECORD
+    ) -> dict:
+        """Annotate a near-duplicate from the annotations of its representative:
+        matches in the shared text are moved to their position in the near-duplicate,
+        the differing segments are annotated on their own (`dedup.mode == "segments"`)."""
+
+        positions, segments = dedup.diff(representative, tokens)
+        results = shift_matches(representative.annotations, positions)
+        record.lap('near_duplicate')
+
+        if dedup.mode == "segments":
+            for start, end in segments:
+                segment_obj = Text(" ".join(tokens[start:end]), self.nlp)
+                record.lap('text')
+                segment_annotations = self._annotate_text_obj(segment_obj, tresh, record)
+                segment_results = shift_matches(
+                    segment_annotations, {i: start + i for i in range(end - start)})
+                for match_type, matches in segment_results.items():
+                    results[match_type].extend(matches)
+
+            for matches in results.values():
+                matches.sort(key=lambda match: match['doc_node_id'][0])
+
+        return {
+            'text': transformed_text,
+            'results': results
+        }
+
+    def _annotate_chunks(
+        self,
+        text: str,
+        tresh: float,
+        chunker,
+        record=NULL_RECORD
+    ) -> Optional[dict]:
+        """Annotate a long text window by window (see `DocumentChunker`),
+        None when the text fits in a window"""
+
+        transformed_text = Text.transform(text)
+        # only tokenized: the cuts and the positions of the windows
+        tokens = self.nlp.make_doc(transformed_text)
+        if len(tokens) <= chunker.max_tokens:
+            return None
+        windows = chunker.split(chunker.cut_strengths(text, tokens))
+        record.lap('chunk', len(windows))
+
+        # windows are cut between words: they are tokenized as in the whole text
+        window_texts = (
+            transformed_text[tokens[start].idx:tokens[end - 1].idx + len(tokens[end - 1])]
+            for start, _, _, end in windows
+        )
+        window_results = chunker.annotate_windows(self, window_texts, tresh, record)
+
+        return {
+            'text': transformed_text,
+            'results': stitch_matches(
+                (results, start, core_start, core_end)
+                for results, (start, core_start, core_end, _) in zip(window_results, windows)
+            )
+        }
+
+    def _start_record(self):
+        """To start measuring a document, a no-op record when profiling is disabled"""
+        if self.profiler is None:
+            return NULL_RECORD
+        return self.profiler.start()
+
+    def _to_doc(
+        self,
+        text: Union[str, Doc, list]
+    ) -> Optional[Doc]:
+        """To get the doc of a text parsed beforehand, None for a raw text"""
+
+        if isinstance(text, str):
+            return None
+        if isinstance(text, Doc):
+            if text.has_annotation("LEMMA"):
+                return text
+            # no lemmas (e.g. a tokenizer-only pipeline): they are assigned to a copy
+            return self.nlp(Doc(
+                self.nlp.vocab,
+                words=[token.text for token in text],
+                spaces=[bool(token.whitespace_) for token in text]
+            ))
+
+        items = list(text)
+        if items and not isinstance(items[0], str):
+            # (token, lemma) pairs
+            words, lemmas = [list(column) for column in zip(*items)]
+            return Doc(self.nlp.vocab, words=words, lemmas=lemmas)
+        # tokens only: the (pruned) pipeline assigns the lemmas, the tokens are kept
+        return self.nlp(Doc(self.nlp.vocab, words=items))
+
+    def _get_cached(
+        self,
+        text: str,
+        tresh: float,
+        record=NULL_RECORD,
+        parsed: Optional[Doc] = None
+    ):
+        """To look a text up in the result cache
+
+        Returns
+        -------
+        tuple
+            returns the cache key (None without cache) and the cached annotations (None on a miss)
+        """
+
+        if self.result_cache is None:
+            return None, None
+
+        # lemmas of parsed texts may differ from the ones of the nlp: they are cached apart,
+        # keyed on their tokens and lemmas
+        source = "text"
+        if parsed is not None:
+            source = "doc|" + " ".join(f"{token.text}/{token.lemma_}" for token in parsed)
+        cache_key = self.result_cache.key(Text.cleaner(text), tresh, self.fuzzy_func, source=source)
+        annotations = self.result_cache.get(cache_key)
+        record.lap('cache', int(annotations is not None))
+        return cache_key, annotations
+
+    def _annotate_text_obj(
+        self,
+        text_obj: Text,
+        tresh: float,
+        record=NULL_RECORD
+    ) -> dict:
+        """Run the matchers pipeline on a text object. See `.annotate()`.
+        Stages are measured in `record` (see `Profiler`)."""
+
+        # a text is matched against the db before or after a delta, never in between
+        with self._lock:
+            return self._run_matchers(text_obj, tresh, record)
+
+    def _run_matchers(
+        self,
+        text_obj: Text,
+        tresh: float,
+        record=NULL_RECORD
+    ) -> dict:
 
         # --------------------------------------------------
         # 3. FUZZY PHRASE MATCH (TYPO-TOLERANT)
@@ -128,6 +602,7 @@ class SkillExtractor:
         if self.fuzzy_func:
             # fuzzy matcher WILL mark matched tokens as is_matchable = False
             fuzzy_matches = self.fuzzy_matcher.match(text_obj)
+            record.lap('fuzzy', len(fuzzy_matches))
         else:
             fuzzy_matches = []
 
@@ -136,12 +611,14 @@ class SkillExtractor:
         # --------------------------------------------------
         skills_full, text_obj = self.skill_getters.get_full_match_skills(
             text_obj, self.matchers['full_matcher'])
+        record.lap('full', len(skills_full))
 
         # --------------------------------------------------
         # 2. ABBREVIATION MATCH
         # --------------------------------------------------
         skills_abv, text_obj = self.skill_getters.get_abv_match_skills(
             text_obj, self.matchers['abv_matcher'])
+        record.lap('abv', len(skills_abv))
 
         
         # --------------------------------------------------
@@ -149,18 +626,21 @@ class SkillExtractor:
         # --------------------------------------------------
         skills_uni_full, text_obj = self.skill_getters.get_full_uni_match_skills(
             text_obj, self.matchers['full_uni_matcher'])
+        record.lap('full_uni', len(skills_uni_full))
 
         # --------------------------------------------------
         # 5. LOW SURFACE MATCH
         # --------------------------------------------------
         skills_low_form, text_obj = self.skill_getters.get_low_match_skills(
             text_obj, self.matchers['low_form_matcher'])
+        record.lap('low', len(skills_low_form))
 
         # --------------------------------------------------
         # 6. TOKEN MATCH
         # --------------------------------------------------
         skills_on_token = self.skill_getters.get_token_match_skills(
             text_obj, self.matchers['token_matcher'])
+        record.lap('token', len(skills_on_token))
 
         # deterministic matches
         full_sk = skills_full + skills_abv
@@ -171,7 +651,8 @@ class SkillExtractor:
         # --------------------------------------------------
         # 7. N-GRAM SCORING & CONFLICT RESOLUTION
         # --------------------------------------------------
-        process_n_gram = self.utils.process_n_gram(to_process, text_obj)
+        process_n_gram = self.utils.process_n_gram(to_process, text_obj, record)
+        record.lap('n_gram', len(process_n_gram))
 
         return {
             'text': text_obj.transformed_text,
@@ -189,6 +670,112 @@ class SkillExtractor:
         }
 
 
+    def apply_db_delta(
+        self,
+        added: Optional[dict] = None,
+        removed: Optional[Iterable[str]] = None,
+        changed: Optional[dict] = None
+    ) -> dict:
+        """
+        Apply a delta of the skill db without rebuilding the matchers.
+
+        The patterns of the removed and changed skills are removed from the
+        PhraseMatchers, the ones of the added and changed skills are added, and
+        the fuzzy index is patched the same way. The db becomes a `SkillDBOverlay`
+        of the previous one (nothing is copied). Annotations have the same matches
+        as with an extractor built on the patched db (matches of the same words may
+        be listed in another order).
+
+        The delta is applied under the lock of the matchers: texts being annotated
+        by other threads see the db before or after the delta, never in between.
+        Each process applies its own delta (e.g. the workers of `server.py`).
+
+        Parameters
+        ----------
+        added : dict | None
+            New skills by skill id, in the format of the skill db.
+        removed : Iterable[str] | None
+            Ids of the skills to remove.
+        changed : dict | None
+            New content of existing skills by skill id.
+
+        Returns
+        -------
+        dict
+            Number of added, removed and changed skills and elapsed seconds.
+
+        Raises
+        ------
+        ValueError
+            If an added skill is already in the db, or a removed / changed one is not.
+
+        Examples
+        --------
+        >>> skill_extractor.apply_db_delta(
+        ...     added={"KSNEW0000000000000001": new_skill},
+        ...     removed=["KS125LS6N7WP4S6SFTCK"],
+        ... )
+        {'added': 1, 'removed': 1, 'changed': 0, 'elapsed': 0.004}
+        """
+
+        start = time.perf_counter()
+        added = dict(added or {})
+        removed = list(removed or [])
+        changed = dict(changed or {})
+
+        with self._lock:
+            skills_db = self.skills_db
+            existing = [skill_id for skill_id in added if skill_id in skills_db]
+            missing = [
+                skill_id for skill_id in removed + list(changed)
+                if skill_id not in skills_db
+            ]
+            if existing or missing:
+                raise ValueError(
+                    f"invalid skill db delta: already in the db {existing}, "
+                    f"not in the db {missing}"
+                )
+
+            if not isinstance(skills_db, SkillDBOverlay):
+                skills_db = SkillDBOverlay(skills_db)
+            skills_db = skills_db.apply(added=added, removed=removed, changed=changed)
+
+            # phrase matchers: changed skills are removed then added again
+            matchers = Matchers(self.nlp, skills_db, self.phraseMatcher)
+            for matcher_name, matcher in self.matchers.items():
+                matchers.update_matcher(
+                    matcher_name,
+                    matcher,
+                    removed + list(changed),
+                    {**changed, **added},
+                )
+
+            # fuzzy index: changed skills keep their order in the buckets
+            fuzzy_matcher = self.fuzzy_matcher
+            for skill_id in removed:
+                fuzzy_matcher.remove_skill(skill_id)
+            for skill_id, skill in changed.items():
+                fuzzy_matcher.add_skill(skill_id, skill, order=fuzzy_matcher.remove_skill(skill_id))
+            for skill_id, skill in added.items():
+                fuzzy_matcher.add_skill(skill_id, skill)
+            if fuzzy_matcher.skills_db is not None:
+                fuzzy_matcher.skills_db = skills_db
+
+            self.skills_db = skills_db
+            self.utils.skills_db = skills_db
+
+            # cached annotations of the previous db are not used anymore
+            if self.result_cache is not None:
+                self.result_cache.bind(
+                    MatcherBundle(self.nlp, skills_db, self.phraseMatcher).key())
+
+        return {
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed),
+            'elapsed': time.perf_counter() - start,
+        }
+
     def display(
         self,
         results: dict
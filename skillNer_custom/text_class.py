@@ -1,9 +1,12 @@
 # native packs
-from typing import List
+import sys
+from bisect import bisect_right
+from typing import List, Tuple
 # installed packs
 #
 # my packs
-from skillNer_custom.cleaner import Cleaner, stem_text, find_index_phrase
+from skillNer_custom.cleaner import Cleaner, compile_phrases, find_index_phrases
+from skillNer_custom.lexical_cache import LEXICAL_CACHE
 from skillNer_custom.general_params import S_GRAM_REDUNDANT
 
 
@@ -12,6 +15,8 @@ class Word:
     """Main data structure to hold metadata of words
     """
 
+    __slots__ = ("word", "lemmed", "stemmed", "is_stop_word", "is_matchable", "start", "end")
+
     def __init__(
         self,
         word: str
@@ -105,15 +110,95 @@ class Word:
         return len(self.word)
 
 
+# view on a word of a text
+class WordView:
+    """Lightweight view on the word at a given position of a `Text`.
+    It has the same attributes as `Word`, read from (and written to) the columns of the text.
+    """
+
+    __slots__ = ("text", "index")
+
+    def __init__(
+        self,
+        text: "Text",
+        index: int
+    ) -> None:
+        self.text = text
+        self.index = index
+
+    @property
+    def word(self) -> str:
+        return self.text._words[self.index]
+
+    @property
+    def lemmed(self) -> str:
+        return self.text._lemmas[self.index]
+
+    @lemmed.setter
+    def lemmed(self, value: str):
+        self.text._lemmas[self.index] = value
+        self.text._joined.pop("lemmed", None)
+
+    @property
+    def stemmed(self) -> str:
+        return self.text._stems[self.index]
+
+    @stemmed.setter
+    def stemmed(self, value: str):
+        self.text._stems[self.index] = value
+        self.text._joined.pop("stemmed", None)
+
+    @property
+    def is_stop_word(self) -> bool:
+        return bool(self.text._is_stop_word[self.index])
+
+    @is_stop_word.setter
+    def is_stop_word(self, value: bool):
+        self.text._is_stop_word[self.index] = bool(value)
+
+    @property
+    def is_matchable(self) -> bool:
+        return bool(self.text._is_matchable[self.index])
+
+    @is_matchable.setter
+    def is_matchable(self, value: bool):
+        self.text._is_matchable[self.index] = bool(value)
+
+    metadata = Word.metadata
+
+    def __str__(self) -> str:
+        return self.word
+
+    def __len__(self) -> int:
+        return len(self.word)
+
+
 class Text:
     """The main object to store/preprocess a raw text. 
     The object behaviour is like a list according to words.
+
+    Words are stored as columns: interned strings for the surface, lemmed and stemmed
+    forms, and byte arrays for the flags. `text_obj[i]` returns a `WordView` on them.
     """
 
+    # transformed text: punctuation + extra space
+    # lower casing is done afterwards to keep an abv version of text
+    cleaner = Cleaner(
+        include_cleaning_functions=[
+            "remove_punctuation",
+            "remove_extra_space"
+        ],
+        to_lowercase=False
+    )
+
+    # redundant phrases, compiled once to be found in one pass
+    redundant_phrases = compile_phrases(S_GRAM_REDUNDANT)
+
     def __init__(
         self,
         text: str,
-        nlp
+        nlp,
+        doc=None
     ):
         """Constructor of the class
 
@@ -123,6 +208,9 @@ class Text:
             The raw text. It might be for instance a job description.
         nlp : [type]
             An NLP object instanciated from Spacy.
+        doc : spacy.tokens.Doc, optional
+            The doc of `Text.transform(text)` when it was already parsed,
+            for instance by `nlp.pipe`, by default None and the text is parsed with `nlp`
 
         Examples
         --------
@@ -135,49 +223,207 @@ class Text:
         # immutable version of text
         self.immutable_text = text
 
-        # transformed text: lower + punctuation + extra space
+        # abv version keeps the original casing
+        self.abv_text = Text.cleaner(text)
         # this is the version of text that we will be working with
-        cleaner = Cleaner(
-            include_cleaning_functions=[
-                "remove_punctuation",
-                "remove_extra_space"
-            ],
-            to_lowercase=False
-        )
+        self.transformed_text = self.abv_text.lower()
 
-        self.transformed_text = cleaner(text).lower()
-        # abv version
-        self.abv_text = cleaner(text)
+        # construct list of words and create meta data object
+        # this is the only call of the full nlp pipeline per text
+        if doc is None:
+            doc = nlp(self.transformed_text)
 
-        # list that holds all words within text
-        self.list_words = []
+        # tokenized views of the text (lemmed, stemmed, ...) fed to matchers
+        # they are built lazily and cached by `SkillsGetter.get_view`
+        self.views = {"transformed": doc}
 
-        # construct list of words and create meta data object
-        doc = nlp(self.transformed_text)
+        # columns of words: surface, lemmed and stemmed forms, flags
+        self._words = []
+        self._lemmas = []
+        self._stems = []
+        self._is_stop_word = bytearray(len(doc))
+        self._is_matchable = bytearray(len(doc))
 
-        for token in doc:
-            # create word object
-            word = Word(token.text)
+        # stems are memoized across texts
+        stem = LEXICAL_CACHE.stem
 
+        for i, token in enumerate(doc):
             # lem and stem
-            word.lemmed = token.lemma_
-            word.stemmed = stem_text(token.text)
+            self._words.append(sys.intern(token.text))
+            self._lemmas.append(sys.intern(token.lemma_))
+            self._stems.append(stem(token.text))
 
             # stop word and machability
-            word.is_stop_word = token.is_stop
             # a stop word is unmatchable
-            if token.is_stop:
-                word.is_matchable = False
+            is_stop = token.is_stop
+            self._is_stop_word[i] = is_stop
+            self._is_matchable[i] = not is_stop
+
+        # joined lemmed / stemmed text, built once
+        self._joined = {}
+        # start of the words in transformed_text and their span in the raw text, see `.raw_span()`
+        self._word_starts = None
+        self._word_spans = None
+        self._token_spans = None
+
+        # detect unmatchable words: all occurrences of redundant phrases
+        for index in find_index_phrases(self._words, Text.redundant_phrases):
+            self._is_matchable[index] = False
+
+    @classmethod
+    def from_doc(
+        cls,
+        doc,
+        nlp
+    ) -> "Text":
+        """To build a text from a doc of the raw text parsed beforehand, e.g. by a spacy pipeline
+        running the `skillner` component. The transformed text is only tokenized and the lemmas
+        are taken from the tokens of `doc` at the same position in the raw text.
 
-            self.list_words.append(word)
+        Parameters
+        ----------
+        doc : spacy.tokens.Doc
+            the doc of the raw text
+        nlp : [type]
+            An NLP object instanciated from Spacy, only its tokenizer is used
 
-        # detect unmatchable words
-        for redundant_word in S_GRAM_REDUNDANT:
-            list_index = find_index_phrase(
-                phrase=redundant_word, text=self.transformed_text)
+        Returns
+        -------
+        Text
+            returns the text object of `doc.text`
 
-            for index in list_index:
-                self[index].is_matchable = False
+        Examples
+        --------
+        >>> doc = nlp("Fluency in both English, and French!")
+        >>> text_obj = Text.from_doc(doc, nlp)
+        >>> text_obj.lemmed()
+        'fluency in both english and french'
+        """
+
+        text = doc.text
+        abv_text, word_spans = cls.cleaner.clean_with_offsets(text)
+        transformed_doc = nlp.make_doc(abv_text.lower())
+
+        # start of the words in the transformed text
+        word_starts = []
+        pointer = 0
+        for word, (start, end) in zip(abv_text.split(" "), word_spans):
+            word_starts.append(pointer)
+            pointer += end - start + 1
+        raw_starts = [token.idx for token in doc]
+
+        for token in transformed_doc:
+            word_index = bisect_right(word_starts, token.idx) - 1
+            raw_char = word_spans[word_index][0] + token.idx - word_starts[word_index]
+            raw_token = doc[bisect_right(raw_starts, raw_char) - 1]
+            if raw_token.idx == raw_char and raw_token.lower_ == token.text and raw_token.lemma_:
+                token.lemma_ = raw_token.lemma_.lower()
+            else:
+                # the raw token was split by the cleaning (e.g. "e-mail")
+                token.lemma_ = token.text
+
+        text_obj = cls(text, nlp, doc=transformed_doc)
+        text_obj._word_spans = word_spans
+        return text_obj
+
+    # the version of text that is parsed by nlp
+    @staticmethod
+    def transform(text: str) -> str:
+        """To get the transformed version of a raw text: without punctuation and extra spaces, lower cased.
+        This is the text parsed by nlp, it can be used to parse texts beforehand, for instance with `nlp.pipe`.
+
+        Parameters
+        ----------
+        text : str
+            The raw text
+
+        Returns
+        -------
+        str
+            returns the transformed text
+
+        Examples
+        --------
+        >>> from skillNer.text_class import Text
+        >>> Text.transform("Fluency in both English, and French!")
+        'fluency in both english and french'
+        """
+
+        return Text.cleaner(text).lower()
+
+    # map positions in the transformed text back to the raw text
+    @property
+    def word_spans(self) -> List[Tuple[int, int]]:
+        """(start, end) characters in the raw text of each word of `abv_text`, computed on first use"""
+
+        if self._word_spans is None:
+            _, self._word_spans = Text.cleaner.clean_with_offsets(self.immutable_text)
+        return self._word_spans
+
+    def raw_span(
+        self,
+        start: int,
+        end: int
+    ) -> Tuple[int, int]:
+        """To get the position in the raw text of a span of the transformed text
+
+        Parameters
+        ----------
+        start : int
+            start character of the span in `transformed_text`
+        end : int
+            end character (excluded) of the span in `transformed_text`
+
+        Returns
+        -------
+        Tuple[int, int]
+            returns the (start, end) characters of the span in the raw text
+
+        Examples
+        --------
+        >>> text_obj = Text("Python,  SQL (AWS)!", nlp)
+        >>> text_obj.transformed_text
+        'python sql aws'
+        >>> text_obj.raw_span(7, 14)
+        (9, 17)
+        """
+
+        if self._word_starts is None:
+            self._word_starts = []
+            pointer = 0
+            for word in self.transformed_text.split(" "):
+                self._word_starts.append(pointer)
+                pointer += len(word) + 1
+
+        def to_raw(position, word_index):
+            word_start, word_end = self.word_spans[word_index]
+            return min(word_start + position - self._word_starts[word_index], word_end)
+
+        first_word = bisect_right(self._word_starts, start) - 1
+        last_word = bisect_right(self._word_starts, max(end - 1, start)) - 1
+        return to_raw(start, first_word), to_raw(end, last_word)
+
+    def token_spans(self) -> List[Tuple[int, int]]:
+        """To get the position in the raw text of each word (`doc_node_id`) of the text
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            returns the (start, end) characters in the raw text of each word
+
+        Examples
+        --------
+        >>> text_obj = Text("Python,  SQL (AWS)!", nlp)
+        >>> text_obj.token_spans()
+        [(0, 6), (9, 12), (14, 17)]
+        """
+
+        if self._token_spans is None:
+            self._token_spans = [
+                self.raw_span(token.idx, token.idx + len(token))
+                for token in self.views["transformed"]
+            ]
+        return self._token_spans
 
     # return stemmed form of text either as str or list of words
     def stemmed(
@@ -208,12 +454,12 @@ class Text:
         ['fluenci', 'in', 'both', 'english', 'and', 'french', 'is', 'mandatori']
         """
 
-        list_stems = [word.stemmed for word in self.list_words]
-
         if as_list:
-            return list_stems
+            return list(self._stems)
 
-        return " ".join(list_stems)
+        if "stemmed" not in self._joined:
+            self._joined["stemmed"] = " ".join(self._stems)
+        return self._joined["stemmed"]
 
     # return lemmed form of text either as str or list of words
     def lemmed(
@@ -244,12 +490,12 @@ class Text:
         ['fluency', 'in', 'both', 'english', 'and', 'french', 'be', 'mandatory']
         """
 
-        list_lems = [word.lemmed for word in self.list_words]
-
         if as_list:
-            return list_lems
+            return list(self._lemmas)
 
-        return " ".join(list_lems)
+        if "lemmed" not in self._joined:
+            self._joined["lemmed"] = " ".join(self._lemmas)
+        return self._joined["lemmed"]
 
     # return raw version of text when converted to str
     def __str__(self) -> str:
@@ -276,8 +522,8 @@ class Text:
     # get item with []
     def __getitem__(
         self,
-        index: int
-    ) -> Word:
+        index
+    ):
         """To get the word at the specified position by index
 
         Parameters
@@ -287,8 +533,8 @@ class Text:
 
         Returns
         -------
-        Word
-            returns thhe word object in the index-position
+        WordView | List[WordView]
+            returns thhe word object in the index-position, a list of them for a slice
 
         Examples
         --------
@@ -297,11 +543,27 @@ class Text:
         >>> from skillNer.text_class import Text
         >>> text_obj = Text("Fluency in both English and French is mandatory")
         >>> text_obj[3]
-        <skillNer.text_class.Word at 0x1cf13a9bd60>
+        <skillNer.text_class.WordView at 0x1cf13a9bd60>
         >>> print(text_obj[3])
         english
         """
-        return self.list_words[index]
+        if isinstance(index, slice):
+            return [WordView(self, i) for i in range(*index.indices(len(self._words)))]
+
+        if index < 0:
+            index += len(self._words)
+        if not 0 <= index < len(self._words):
+            raise IndexError("text index out of range")
+        return WordView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self._words)):
+            yield WordView(self, index)
+
+    # words as a list of views, kept for compatibility
+    @property
+    def list_words(self) -> List[WordView]:
+        return list(self)
 
     # len of a text is the number of words in it
     def __len__(self) -> int:
@@ -322,7 +584,7 @@ class Text:
         8
         """
 
-        return len(self.list_words)
+        return len(self._words)
 
     # result a list of word object
     # each word contain the info of its start/end position
@@ -3,6 +3,7 @@
 # native packs
 import collections
 import functools
+import json
 import math
 
 # installed packs
@@ -10,55 +11,54 @@ import numpy as np
 import jellyfish
 # my packs
 from skillNer_custom.text_class import Text
-from skillNer_custom.general_params import TOKEN_DIST
+from skillNer_custom.db_registry import DB_REGISTRY
+from skillNer_custom.profiler import NULL_RECORD
+from skillNer_custom.lexical_cache import LEXICAL_CACHE
 from scipy.sparse import csr_matrix
-import pandas as pd
 
 class Utils:
-    def __init__(self, nlp, skills_db):
+    def __init__(self, nlp, skills_db, one_gram_table=None, sim_cache_size=65536):
+        """
+           Parameters
+           ----------
+           nlp : NLP object loaded from spacy
+           skills_db (dict): skill database
+           one_gram_table (dict | str): precomputed one-gram similarities, or the path
+                of a table saved by `.save_one_gram_table()`, by default None
+           sim_cache_size (int): max number of (text, skill) similarities kept in memory
+        """
         self.nlp = nlp
         self.skills_db = skills_db
-        self.token_dist = TOKEN_DIST
         self.sign = functools.partial(math.copysign, 1)
+
+        # precomputed similarities : skill_str -> text_str -> similarity
+        if isinstance(one_gram_table, str):
+            with open(one_gram_table, encoding="utf-8") as fp:
+                one_gram_table = json.load(fp)
+        self.one_gram_table = one_gram_table or {}
+        self.one_gram_table_hits = 0
+
+        # the same (text, skill) pairs recur across documents
+        self.sim_cache_size = sim_cache_size
+        self._one_gram_sim_cached = functools.lru_cache(maxsize=sim_cache_size)(
+            self._one_gram_sim)
         return
 
-    def make_one(self, cluster, len_):
-        a = [1] * len_
-        return [1*(i in cluster) for i, one in enumerate(a)]
+    def __getstate__(self):
+        # the LRU wrapper cannot be pickled : it is rebuilt empty
+        state = self.__dict__.copy()
+        del state['_one_gram_sim_cached']
+        return state
 
-    def split_at_values(self, lst, val):
-        return [i for i, x in enumerate(lst) if x != val]
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._one_gram_sim_cached = functools.lru_cache(maxsize=self.sim_cache_size)(
+            self._one_gram_sim)
 
-    def grouper(self, iterable, dist):
-        prev = None
-        group = []
-        for item in iterable:
-            if prev == None or item - prev <= dist:
-                group.append(item)
-            else:
-                yield group
-                group = [item]
-            prev = item
-        if group:
-            yield group
-
-    def get_clusters(self, co_oc):
-        clusters = []
-        for i,row in enumerate(co_oc.tolil().rows):
-            if len(row)== 0:
-                continue
-            # divide row into clusters deivided by 0 : 0 occurence where clusters refer to token id
-            # example [2,3,0,5,0,0] -> [0,1,3] -> [[0,1],[3]]
-            # clusts = list(self.grouper(self.split_at_values(row, 0), 1))
-            clusts = list(self.grouper(row, 1))
-                # select token relative cluster via its idx
-               # example i==0 => [[0,1],[3]] => a = [0,1]
-            a = [c for c in clusts if i in c][0]
-            if a not in clusters:
-                clusters.append(a)
-                    
-        # return unique clusters [token id]
-        return clusters
+    @property
+    def token_dist(self):
+        # loaded on first access only
+        return DB_REGISTRY.get("TOKEN_DIST")
 
     def get_corpus(self, text, matches):
         """create a corpus matrix which will be used in future computations.
@@ -71,44 +71,177 @@ class Utils:
            Returns
            -------
 
-               corpus : return binary matrix   => (n :skills matched )* (m : tokens in text )  
+               corpus : return binary sparse matrix (csr) => (n :skills matched )* (m : tokens in text )
                                                 1 : skill contains token
                                                 0 : otherwise
                look_up : return a mapper from skill_ids to its equivalent row index in corpus
         """
-        
+
         len_ = len(text)
-        unique_skills = list(set([match['skill_id'] for match in matches]))
-        skill_text_match_bin = [0]*len_
-        match_df = pd.DataFrame(matches)
-        match_df_group = match_df.groupby('skill_id')['doc_node_id']
-        corpus=[]
+
+        # tokens of each skill, skills are sorted by id
+        skill_tokens = collections.defaultdict(set)
+        for match in matches:
+            skill_tokens[match['skill_id']].update(
+                i for i in match['doc_node_id'] if 0 <= i < len_)
+
         look_up = {}
-        on_inds =[]
-        for idx,gr in enumerate(match_df_group):
-            skill_id =gr[0]
-            g=gr[1]
-            skill_text_match_bin = [0]*len_
-            look_up[idx]=skill_id
-            on_inds = [j for sub in g for j in sub]
-            skill_text_match_bin_updated = [(i in on_inds)*1 for i, _ in enumerate(skill_text_match_bin)]
-
-            corpus.append(skill_text_match_bin_updated)
-        return np.array(corpus), look_up
+        indptr = [0]
+        indices = []
+        for idx, skill_id in enumerate(sorted(skill_tokens)):
+            look_up[idx] = skill_id
+            indices.extend(sorted(skill_tokens[skill_id]))
+            indptr.append(len(indices))
+
+        corpus = csr_matrix(
+            (np.ones(len(indices), dtype=np.int64), indices, indptr),
+            shape=(len(look_up), len_)
+        )
+        return corpus, look_up
+
+    def get_clusters(self, corpus):
+        """create spans of tokens that co-occured.
+
+           For each matched token i, its cluster is the run of consecutive tokens
+           containing i among the tokens of all the skills matched on i.
+
+           Parameters
+           ----------
+           corpus (csr_matrix): skills * tokens binary matrix
+
+           Returns
+           -------
+
+               list: return unique clusters as (first token id, last token id)
+        """
+
+        # co-occurence of tokens aij : co-occurence count of token i with token j
+        co_occ = (corpus.T @ corpus).tocsr()
+        co_occ.sort_indices()
+        indptr, indices = co_occ.indptr, co_occ.indices
+        if co_occ.nnz == 0:
+            return []
+
+        # in a sorted row, consecutive token ids share the same (token id - position)
+        rows = np.repeat(np.arange(co_occ.shape[0]), np.diff(indptr))
+        run_key = indices - (np.arange(co_occ.nnz) - indptr[rows])
+
+        # run of the diagonal token of each row
+        diag = indices == rows
+        row_key = np.zeros(co_occ.shape[0], dtype=run_key.dtype)
+        row_key[rows[diag]] = run_key[diag]
+        in_run = run_key == row_key[rows]
+
+        starts = np.full(co_occ.shape[0], co_occ.shape[1])
+        ends = np.full(co_occ.shape[0], -1)
+        np.minimum.at(starts, rows[in_run], indices[in_run])
+        np.maximum.at(ends, rows[in_run], indices[in_run])
+
+        # unique clusters, by order of token id
+        clusters = dict.fromkeys(
+            (int(starts[i]), int(ends[i])) for i in rows[diag])
+        return list(clusters)
 
     def one_gram_sim(self, text_str, skill_str):
+        """similarity of a uni-gram skill with the text token(s) it matched on.
+           Looked up in the precomputed table first, then in the LRU cache."""
+        table_skill = self.one_gram_table.get(skill_str)
+        if table_skill is not None and text_str in table_skill:
+            self.one_gram_table_hits += 1
+            return table_skill[text_str]
+
+        return self._one_gram_sim_cached(text_str, skill_str)
+
+    def _one_gram_sim(self, text_str, skill_str):
         # transform into sentence
         text = text_str + ' ' + skill_str
-        tokens = self.nlp(text)
-        token1, token2 = tokens[0], tokens[1]
         try:
+            if self.nlp.vocab.vectors.size:
+                # static vectors are read from the vocab : tokenizing is enough
+                return self._vocab_sim(self.nlp.make_doc(text))
+            # vectors come from the pipeline (e.g. tok2vec tensors)
+            tokens = self.nlp(text)
+            token1, token2 = tokens[0], tokens[1]
             vec_similarity = token1.similarity(token2)
-            return vec_similarity
+            return float(vec_similarity)
         except:
             # try Levenshtein Distance  if words not found in spacy corpus
             str_distance_similarity = jellyfish.jaro_distance(
                 text_str.lower(), skill_str.lower())
-            return str_distance_similarity
+            return float(str_distance_similarity)
+
+    def _vocab_sim(self, tokens):
+        """cosine similarity of the static vectors of the first two tokens, read from the vocab.
+           Same value as `tokens[0].similarity(tokens[1])` on a tokenized doc, without
+           building the tokens and their vectors nor raising the no-vector warnings."""
+        vocab = self.nlp.vocab
+        # vectors are keyed by an attribute of the tokens (ORTH by default)
+        key1, key2 = tokens.to_array(vocab.vectors.attr)[:2].tolist()
+        if key1 == key2:
+            return 1.0
+        vector1, vector2 = vocab.get_vector(key1), vocab.get_vector(key2)
+        norm1, norm2 = np.sqrt((vector1 ** 2).sum()), np.sqrt((vector2 ** 2).sum())
+        if norm1 == 0 or norm2 == 0:
+            return 0.0
+        return float(np.dot(vector1, vector2) / (norm1 * norm2))
+
+    def one_gram_sim_stats(self) -> dict:
+        """hit / miss counts of the one-gram similarity cache and table"""
+        info = self._one_gram_sim_cached.cache_info()
+        lookups = self.one_gram_table_hits + info.hits + info.misses
+        return {'table_hits': self.one_gram_table_hits,
+                'cache_hits': info.hits,
+                'cache_misses': info.misses,
+                'cache_size': info.currsize,
+                'cache_max_size': info.maxsize,
+                'hit_rate': (self.one_gram_table_hits + info.hits) / lookups if lookups else 0.
+                }
+
+    def build_one_gram_table(self, words=None) -> dict:
+        """precompute the similarity of uni-gram skills with the words they match on.
+
+           A uni-gram skill matches a word of the text when the stem of the word is one of its
+           low surface forms, and the similarity is then looked up with the word itself:
+           the table holds the similarity of each skill with the `words` whose stem is
+           one of its low forms. `words` drives the hit rate of the table, give the
+           frequent words of the corpus to annotate.
+
+           Parameters
+           ----------
+           words (Iterable[str]): candidate words of the texts, by default the tokens of `TOKEN_DIST`
+
+           Returns
+           -------
+
+               dict: return the table skill_str -> text_str -> similarity, to pass to `Utils`
+        """
+        if words is None:
+            words = self.token_dist.keys()
+
+        # words of each stem, as in the stemmed view of the texts
+        stem_words = collections.defaultdict(set)
+        for word in words:
+            stem_words[LEXICAL_CACHE.stem(word).lower()].add(word)
+
+        table = {}
+        for skill in self.skills_db.values():
+            if skill['skill_len'] != 1:
+                continue
+            skill_str = skill['high_surfce_forms']['full']
+            table_skill = table.setdefault(skill_str, {})
+            for low_form in skill['low_surface_forms']:
+                for text_str in sorted(stem_words.get(low_form.lower(), ())):
+                    if text_str not in table_skill:
+                        table_skill[text_str] = self._one_gram_sim(text_str, skill_str)
+            if not table_skill:
+                del table[skill_str]
+        return table
+
+    @staticmethod
+    def save_one_gram_table(table, path):
+        """save a table built by `.build_one_gram_table()` as json"""
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(table, fp, ensure_ascii=False)
 
     def compute_w_ratio(self, skill_id, matched_tokens):
         skill_name = self.skills_db[skill_id]['high_surfce_forms']['full'].split(
@@ -121,27 +254,32 @@ class Utils:
 
         return token_ids/skill_len
 
-    def retain(self, text_obj, span, skill_id, sk_look, corpus):
-        """ add doc here  """
+    def retain(self, text_obj, skill_id, sk_look, span_tokens):
+        """score a skill on a span
+
+           Parameters
+           ----------
+           text_obj (Text): text object
+           skill_id (int): row index of the skill in the corpus
+           sk_look (dict): mapper from row index to skill id
+           span_tokens (list): token ids of the skill inside the span
+
+           Returns
+           -------
+
+               dict: return the scored skill
+        """
         real_id, type_ = sk_look[skill_id].split('_')
 
         # get skill len
         len_ = self.skills_db[real_id]['skill_len']
         # get intersection length of full  skill name  and span tokens
-        len_condition = corpus[skill_id].dot(span)
-
-        # start :to be deleted
-        s_gr = np.array(list(span))*np.array(list(corpus[skill_id]))
-        def condition(x): return x == 1
-
-        s_gr_n = [idx for idx, element in enumerate(
-            s_gr) if condition(element)]
-        # end
+        len_condition = len(span_tokens)
 
         if type_ == 'oneToken':
             # if skill is n_gram (n>2)
             score = self.compute_w_ratio(
-                real_id, [text_obj[ind].lemmed for ind in s_gr_n])
+                real_id, [text_obj[ind].lemmed for ind in span_tokens])
 
         if type_ == 'fullUni':
             score = 1
@@ -149,32 +287,32 @@ class Utils:
         if type_ == 'lowSurf':
             if len_ > 1:
 
-                score = sum(s_gr)
+                score = len_condition
 
             else:
                 # if skill is uni_gram (n=1)
-                text_str = ' '.join([str(text_obj[i])
-                                     for i, val in enumerate(s_gr) if val == 1])
+                text_str = ' '.join([str(text_obj[i]) for i in span_tokens])
                 skill_str = self.skills_db[real_id]['high_surfce_forms']['full']
 
                 score = self.one_gram_sim(text_str, skill_str)
 
         return {'skill_id': real_id,
-                'doc_node_id':  [i for i, val in enumerate(s_gr) if val == 1],
-                'doc_node_value': ' '.join([str(text_obj[i]) for i, val in enumerate(s_gr) if val == 1]),
+                'doc_node_id': span_tokens,
+                'doc_node_value': ' '.join([str(text_obj[i]) for i in span_tokens]),
                 'type': type_,
                 'score': score,
                 'len': len_condition
                 }
     # main functions
 
-    def process_n_gram(self, matches, text_obj: Text):
+    def process_n_gram(self, matches, text_obj: Text, record=NULL_RECORD):
         """apply on conflicted matches to choose which  ones to keep
 
            Parameters
            ----------
            matches (list): list of matches generated by sub matchers
            text_obj (Text): text object 
+           record (DocRecord): where to report the conflict-cluster sizes (see `Profiler`)
 
            Returns
            -------
@@ -189,34 +327,50 @@ class Utils:
         len_ = len(text_tokens)
 
         corpus, look_up = self.get_corpus(text_tokens, matches)
-        corpus_csr = csr_matrix(corpus)
         # generate spans (a span is a list of tokens where one or more skills are matched)
-
-        # co-occurence of tokens aij : co-occurence count of token i with token j
-        # co_occ = np.matmul(corpus.T, corpus)
-        co_occ_csr = corpus_csr.T.dot(corpus_csr)
-        # create spans of tokens that co-occured
-        clusters = self.get_clusters(co_occ_csr)
-
-        # one hot encoding of clusters
-        # example [0,1,2] => [1,1,1,0,0,0] , encoding length  = text length
-        ones = [self.make_one(cluster, len_) for cluster in clusters]
-        # generate list of span and list of skills that have conflict on spans [(span,[skill_id])]
-        spans_conflicts = [(np.array(one), np.array([a_[0] for a_ in np.argwhere(corpus_csr.dot(one) != 0)]))
-                           for one in ones]
+        clusters = self.get_clusters(corpus)
+        if len(clusters) == 0:
+            return []
+        record.add_sizes('cluster_size', [end - start + 1 for start, end in clusters])
+
+        # one hot encoding of clusters : (n : clusters) * (m : tokens in text)
+        # example (0, 2) => [1,1,1,0,0,0] , encoding length  = text length
+        starts = np.array([start for start, _ in clusters])
+        ends = np.array([end for _, end in clusters])
+        lengths = ends - starts + 1
+        spans = csr_matrix(
+            (np.ones(lengths.sum(), dtype=np.int64),
+             np.concatenate([np.arange(start, end + 1) for start, end in clusters]),
+             np.concatenate([[0], np.cumsum(lengths)])),
+            shape=(len(clusters), len_)
+        )
+        # skills that have conflict on each span : (n : skills) * (m : clusters)
+        conflicts = (corpus @ spans.T).tocsc()
+        conflicts.sort_indices()
+
+        # generate list of span and list of (skill_id, skill tokens in span) that have conflict on it
+        spans_conflicts = []
+        for c, (start, end) in enumerate(clusters):
+            skill_ids = conflicts.indices[conflicts.indptr[c]:conflicts.indptr[c + 1]]
+            skills = []
+            for sk_id in skill_ids:
+                row = corpus.indices[corpus.indptr[sk_id]:corpus.indptr[sk_id + 1]]
+                row = row[(row >= start) & (row <= end)]
+                skills.append((int(sk_id), row.tolist()))
+            spans_conflicts.append(((start, end), skills))
 
         # filter and score
         new_spans = []
         for span_conflict in spans_conflicts:
-            span, skill_ids = span_conflict
+            span, skills = span_conflict
             span_scored_skills = []
             types = []
             scores = []
             lens = []
-            for sk_id in skill_ids:
+            for sk_id, span_tokens in skills:
                 # score skill given span
                 scored_sk_obj = self.retain(
-                    text_obj, span, sk_id, look_up, corpus)
+                    text_obj, sk_id, look_up, span_tokens)
                 span_scored_skills.append(scored_sk_obj)
                 types.append(scored_sk_obj['type'])
                 lens.append(scored_sk_obj['len'])
@@ -11,6 +11,8 @@ import json
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
+from skillNer_custom.skill_db_view import write_skill_db
+
 
 class SkillRelaxDBGenerator:
     """
@@ -196,6 +198,25 @@ class SkillRelaxDBGenerator:
         except IOError as e:
             print(f"Lỗi khi lưu file: {str(e)}")
 
+    def save_binary(self, db: Dict[str, Any], output_path: Optional[str] = None):
+        """
+        Lưu new_skill_db ở định dạng nhị phân (.skdb) đọc bằng SkillDBView (mmap, chia sẻ giữa các worker).
+        
+        Parameters:
+        - db: dict skill DB đã relax
+        - output_path: Đường dẫn lưu (mặc định output_path trong __init__ với đuôi .skdb)
+        """
+        if output_path:
+            save_path = Path(output_path).resolve()
+        else:
+            save_path = self.output_path.with_suffix(".skdb")
+
+        try:
+            write_skill_db(db, str(save_path))
+            print(f"File nhị phân đã lưu: {save_path}")
+        except IOError as e:
+            print(f"Lỗi khi lưu file: {str(e)}")
+
     def print_summary(self, db: Dict[str, Any]):
         """In thông tin debug sau khi generate"""
         total_skills = len(db)
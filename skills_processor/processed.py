@@ -12,6 +12,8 @@ from typing import Dict, Optional
 from pathlib import Path
 from nltk.stem import PorterStemmer
 from skillNer_custom.cleaner import Cleaner
+from skillNer_custom.lexical_cache import LEXICAL_CACHE
+from skillNer_custom.pipe_pruning import prune_pipeline
 
 
 class SkillsProcessor:
@@ -47,8 +49,8 @@ class SkillsProcessor:
         if not self.raw_path.exists():
             raise FileNotFoundError(f"Không tìm thấy file raw: {self.raw_path}")
 
-        # Load spaCy
-        self.nlp = spacy.load(spacy_model)
+        # Load spaCy, chỉ chạy các component cần cho lemma (bỏ parser, ner, ...)
+        self.nlp = prune_pipeline(spacy.load(spacy_model), targets=("token.lemma",))
 
         # Cleaner chuẩn SkillNER
         self.skills_cleaner = Cleaner(
@@ -68,13 +70,12 @@ class SkillsProcessor:
         return re.sub(r"\s*\([^)]*\)\s*", "", text).strip()
 
     def stem_text(self, text: str) -> str:
-        """Stem text bằng PorterStemmer"""
-        return " ".join([self.stemmer.stem(word) for word in text.split()])
+        """Stem text bằng PorterStemmer (dùng cache chung LEXICAL_CACHE)"""
+        return " ".join([LEXICAL_CACHE.stem(word) for word in text.split()])
 
     def lem_text(self, text: str) -> str:
-        """Lemmatize text bằng spaCy"""
-        doc = self.nlp(text)
-        return " ".join([token.lemma_ for token in doc])
+        """Lemmatize text bằng spaCy (memo theo cụm trong LEXICAL_CACHE)"""
+        return LEXICAL_CACHE.lem_text(text, self.nlp)
 
     def extract_abbreviation(self, raw_name: str) -> str:
         """